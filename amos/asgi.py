@@ -0,0 +1,19 @@
+"""
+ASGI config for amos project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Station ingest (heartbeats and sightings) is served by async views, so an ASGI server such as uvicorn or daphne
+running this application can take the /station/<code>/heartbeat/ and /station/<code>/sighting/ routes
+while uWSGI keeps serving the rest of the site from amos.wsgi.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'amos.settings')
+
+application = get_asgi_application()
@@ -42,16 +42,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 #    'django_celery_beat',
     'rest_framework',
-    'debug_toolbar',
 ] + [
     'accounts',
     'core',
-    'stations',
-    'meteors',
+    'stations.apps.StationsConfig',
+    'meteors.apps.MeteorsConfig',
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -126,6 +124,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'amos.wsgi.application'
+ASGI_APPLICATION = 'amos.asgi.application'
 
 
 # Database
@@ -143,6 +142,9 @@ DATABASES = {
     }
 }
 
+# Threads running the database work of async views, each keeps its own persistent connection
+DATABASE_POOL_SIZE = 8
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -204,6 +206,11 @@ STATICFILES_FINDERS = (
 MEDIA_ROOT = '/var/www/amos/media/'
 MEDIA_URL = '/media/'
 
+# Rendered station graphs: past windows are kept on disk under MEDIA_ROOT/GRAPH_CACHE_DIRECTORY,
+# current windows in the cache for GRAPH_CACHE_TIMEOUT seconds
+GRAPH_CACHE_DIRECTORY = 'cache'
+GRAPH_CACHE_TIMEOUT = 3600
+
 # CELERY
 #BROKER_URL = 'redis://localhost:6379'
 #CELERY_RESULT_BACKEND = 'redis://localhost:6379'
@@ -214,6 +221,30 @@ MEDIA_URL = '/media/'
 
 DJANGO_CELERY_BEAT_TZ_AWARE = False
 
+CELERY_BEAT_SCHEDULE = {
+    'heartbeat-partitions': {
+        'task': 'stations.tasks.maintain_heartbeat_partitions',
+        'schedule': 86400,
+    },
+    'heartbeat-rollups': {
+        'task': 'stations.tasks.refresh_heartbeat_rollups',
+        'schedule': 60,
+    },
+    'meteor-association': {
+        'task': 'meteors.tasks.associate_recent_sightings',
+        'schedule': 600,
+    },
+}
+
+# Heartbeat table partitioning: months to create in advance, and months to keep attached (None = keep all)
+HEARTBEAT_PARTITIONS_AHEAD = 3
+HEARTBEAT_PARTITIONS_RETAIN = None
+
 if os.environ.get('DJANGO_DEVELOPMENT'):
     DEBUG = True
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# The toolbar middleware is synchronous only, under ASGI every request would pass through a single thread
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
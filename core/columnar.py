@@ -0,0 +1,179 @@
+"""
+Compact columnar encoding of tabular data for client-side rendering.
+
+A table is a set of named parallel columns of equal length. Supported column types:
+
+- time:     datetime64 values, encoded as int64 millisecond deltas from the previous value (the first one from `base`)
+- float32:  floats with NaN (binary) or null (JSON) for missing values
+- uint8:    small integers, e.g. bitmasks or character codes (0 = missing)
+- bool:     booleans packed eight per byte, least significant bit first
+
+JSON output lists numeric columns as plain arrays and byte columns (uint8, bool) as base64 strings.
+Binary output is the magic string, a little-endian uint32 header length, a JSON header describing the columns
+and the raw little-endian column buffers. Each buffer is aligned to 8 bytes, and the column offsets in the header
+are relative to the end of the header.
+
+Both encodings are decoded by static/js/graph.js, decode_json and decode_binary are the same decoders in Python.
+"""
+
+import json
+import base64
+import datetime
+import struct
+import numpy as np
+
+
+MAGIC = b'AMOSCOL1'
+
+DTYPES = {
+    'time':     np.dtype('<i8'),
+    'float32':  np.dtype('<f4'),
+    'uint8':    np.dtype('u1'),
+    'bool':     np.dtype('u1'),
+}
+
+
+def to_milliseconds(values):
+    """ Milliseconds since the epoch of datetime64 values or of (naive UTC or aware) datetimes """
+    values = np.asarray(values)
+    if values.dtype == object:
+        return np.array([
+            round((value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)).timestamp() * 1000)
+            for value in values.ravel()
+        ], dtype=np.int64).reshape(values.shape)
+    return values.astype('datetime64[ms]').astype(np.int64)
+
+
+class Table():
+    def __init__(self, name, base=None):
+        self.name = name
+        self.base = None if base is None else to_milliseconds(base).item()
+        self.length = None
+        self.columns = {}
+        self.types = {}
+        self.meta = {}
+
+    def add(self, name, values, kind, **meta):
+        values = np.asarray(values)
+        if self.length is None:
+            self.length = len(values)
+        elif len(values) != self.length:
+            raise ValueError(f"Column {name} has {len(values)} values, table {self.name} has {self.length}")
+
+        if kind == 'time':
+            ms = to_milliseconds(values)
+            if self.base is None:
+                self.base = int(ms[0]) if len(ms) else 0
+            encoded = np.diff(ms, prepend=self.base)
+        elif kind == 'float32':
+            encoded = np.asarray(values, dtype=float).astype(np.float32)
+        elif kind == 'uint8':
+            encoded = np.asarray(values).astype(np.uint8)
+        elif kind == 'bool':
+            encoded = np.packbits(np.asarray(values, dtype=bool), bitorder='little')
+        else:
+            raise ValueError(f"Unknown column type {kind}")
+
+        self.columns[name] = encoded.astype(DTYPES[kind])
+        self.types[name] = kind
+        if meta:
+            self.meta[name] = meta
+        return self
+
+    def header(self):
+        return {
+            'name': self.name,
+            'length': self.length or 0,
+            'base': self.base,
+            'columns': [
+                dict({'name': name, 'type': self.types[name]}, **self.meta.get(name, {}))
+                for name in self.columns
+            ],
+        }
+
+    def to_json(self, decimals=2):
+        columns = {}
+        for name, values in self.columns.items():
+            kind = self.types[name]
+            if kind in ('uint8', 'bool'):
+                columns[name] = base64.b64encode(values.tobytes()).decode('ascii')
+            elif kind == 'float32':
+                rounded = np.round(values.astype(float), decimals)
+                columns[name] = [None if value != value else value for value in rounded.tolist()]
+            else:
+                columns[name] = values.tolist()
+
+        return dict(self.header(), data=columns)
+
+
+def encode_json(tables, **extra):
+    """ Encode a list of tables as compact JSON text """
+    return json.dumps(dict(extra, tables=[table.to_json() for table in tables]), separators=(',', ':'), allow_nan=False)
+
+
+def encode_binary(tables, **extra):
+    """ Encode a list of tables as a self-describing binary blob """
+    buffers = []
+    offset = 0
+    descriptions = []
+
+    for table in tables:
+        header = table.header()
+        for column in header['columns']:
+            data = table.columns[column['name']].tobytes()
+            column['offset'] = offset
+            column['bytes'] = len(data)
+            padding = -len(data) % 8
+            buffers.append(data + b'\0' * padding)
+            offset += len(data) + padding
+        descriptions.append(header)
+
+    header = json.dumps(dict(extra, tables=descriptions), separators=(',', ':')).encode()
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+    return MAGIC + struct.pack('<I', len(header)) + header + b''.join(buffers)
+
+
+def decode_column(kind, encoded, length, base):
+    """ Values of a column of <kind> from its <encoded> array as stored in a table of <length> rows """
+    if kind == 'time':
+        return (base + np.cumsum(encoded.astype(np.int64))).astype('datetime64[ms]')
+    elif kind == 'bool':
+        return np.unpackbits(encoded.astype(np.uint8), count=length, bitorder='little').astype(bool)
+    else:
+        return encoded
+
+
+def decode_json(text):
+    """ Decode the output of encode_json into {'meta': header, 'tables': {name: {column: values}}} """
+    document = json.loads(text)
+    tables = {}
+    for table in document['tables']:
+        columns = {}
+        for column in table['columns']:
+            kind, data = column['type'], table['data'][column['name']]
+            if kind in ('uint8', 'bool'):
+                encoded = np.frombuffer(base64.b64decode(data), dtype=DTYPES[kind])
+            else:
+                encoded = np.array([np.nan if value is None else value for value in data], dtype=DTYPES[kind])
+            columns[column['name']] = decode_column(kind, encoded, table['length'], table['base'])
+        tables[table['name']] = columns
+    return {'meta': document, 'tables': tables}
+
+
+def decode_binary(blob):
+    """ Decode the output of encode_binary into {'meta': header, 'tables': {name: {column: values}}} """
+    if blob[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a columnar blob")
+
+    length, = struct.unpack_from('<I', blob, len(MAGIC))
+    start = len(MAGIC) + 4 + length
+    document = json.loads(blob[len(MAGIC) + 4:start])
+    tables = {}
+    for table in document['tables']:
+        columns = {}
+        for column in table['columns']:
+            kind = column['type']
+            encoded = np.frombuffer(blob, dtype=DTYPES[kind], count=column['bytes'] // DTYPES[kind].itemsize, offset=start + column['offset'])
+            columns[column['name']] = decode_column(kind, encoded, table['length'], table['base'])
+        tables[table['name']] = columns
+    return {'meta': document, 'tables': tables}
@@ -0,0 +1,48 @@
+"""
+Database access from async views.
+
+The ORM is synchronous, so async views hand their queries to a fixed pool of DATABASE_POOL_SIZE threads.
+Every thread keeps its own persistent connection (CONN_MAX_AGE), which makes the pool a bounded pool of
+database connections: any number of requests can wait on the event loop while at most that many queries run,
+and no request opens a connection of its own.
+"""
+
+import asyncio
+import functools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+
+executor = ThreadPoolExecutor(max_workers=settings.DATABASE_POOL_SIZE, thread_name_prefix='database')
+
+
+def run_with_connection(function, *args, **kwargs):
+    """ Call <function> with a usable connection, dropping it afterwards if it is broken or too old, like a request does """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(function, *args, **kwargs):
+    """ Await function(*args, **kwargs) run in the database thread pool """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(run_with_connection, function, *args, **kwargs))
+
+
+def close_connections():
+    """ Close the connections of all pool threads, e.g. before the database is dropped or on shutdown """
+    barrier = threading.Barrier(settings.DATABASE_POOL_SIZE)
+
+    def close():
+        connections.close_all()
+        # Hold this thread until every thread has taken one task
+        barrier.wait()
+
+    for future in [executor.submit(close) for _ in range(settings.DATABASE_POOL_SIZE)]:
+        future.result()
@@ -0,0 +1,145 @@
+"""
+Streaming export of querysets as CSV or Parquet.
+
+Rows are read with a server-side cursor (QuerySet.iterator) in chunks of `chunk_size` and every chunk is
+encoded and yielded before the next one is read, so memory use does not depend on the size of the export.
+Parquet output requires pyarrow, which is optional.
+"""
+
+import io
+import csv
+import itertools
+
+from django.db import models
+
+from core.loader import field_for
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+FORMAT_CSV = 'csv'
+FORMAT_PARQUET = 'parquet'
+
+CONTENT_TYPES = {
+    FORMAT_CSV: 'text/csv',
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def available_formats():
+    return [FORMAT_CSV] if pyarrow is None else [FORMAT_CSV, FORMAT_PARQUET]
+
+
+def chunks(queryset, columns, chunk_size):
+    """ Iterate over lists of at most <chunk_size> tuples of <columns> read through a server-side cursor """
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_csv(queryset, columns, chunk_size=10000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for chunk in chunks(queryset, columns, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+ARROW_TYPES = {
+    models.AutoField:               lambda: pyarrow.int32(),
+    models.BigIntegerField:         lambda: pyarrow.int64(),
+    models.IntegerField:            lambda: pyarrow.int32(),
+    models.SmallIntegerField:       lambda: pyarrow.int16(),
+    models.FloatField:              lambda: pyarrow.float64(),
+    models.BooleanField:            lambda: pyarrow.bool_(),
+    models.DateTimeField:           lambda: pyarrow.timestamp('us', tz='UTC'),
+    models.DateField:               lambda: pyarrow.date32(),
+}
+
+
+def arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    for cls in type(field).__mro__:
+        if cls in ARROW_TYPES:
+            return ARROW_TYPES[cls]()
+    return pyarrow.string()
+
+
+def arrow_schema(queryset, columns):
+    return pyarrow.schema([pyarrow.field(column, arrow_type(field_for(queryset, column))) for column in columns])
+
+
+class Sink():
+    """ Write-only file that hands out everything written so far, for streaming a ParquetWriter """
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def stream_parquet(queryset, columns, chunk_size=50000):
+    """ Yield a Parquet file with one row group per chunk """
+    if pyarrow is None:
+        raise ExportError("Parquet export requires pyarrow")
+
+    schema = arrow_schema(queryset, columns)
+    sink = Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+
+    for chunk in chunks(queryset, columns, chunk_size):
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream(queryset, columns, format, chunk_size=None):
+    if format == FORMAT_CSV:
+        return stream_csv(queryset, columns, chunk_size or 10000)
+    elif format == FORMAT_PARQUET:
+        if pyarrow is None:
+            raise ExportError("Parquet export requires pyarrow")
+        return stream_parquet(queryset, columns, chunk_size or 50000)
+    else:
+        raise ExportError(f"Unknown export format {format}")
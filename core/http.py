@@ -8,12 +8,20 @@ from matplotlib.backends.backend_agg import FigureCanvasAgg
 matplotlib.use('Agg')
 
 
-class FigurePNGResponse(django.http.HttpResponse):
-    def __init__(self, figure):
-        canvas = FigureCanvasAgg(figure)
-        buf = io.BytesIO()
-        canvas.print_png(buf)
-        pyplot.close(figure)
+def figure_to_png(figure):
+    canvas = FigureCanvasAgg(figure)
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    pyplot.close(figure)
+    return buf.getvalue()
+
 
-        super().__init__(buf.getvalue(), content_type='image/png')
+class PNGResponse(django.http.HttpResponse):
+    def __init__(self, content):
+        super().__init__(content, content_type='image/png')
         self['Content-Length'] = str(len(self.content))
+
+
+class FigurePNGResponse(PNGResponse):
+    def __init__(self, figure):
+        super().__init__(figure_to_png(figure))
@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination over (timestamp, id).
+
+Instead of OFFSET, every page continues from the last row of the previous one:
+
+    WHERE timestamp >= t AND (timestamp > t OR id > i) ORDER BY timestamp, id LIMIT n + 1
+
+so fetching a page only reads the rows of that page from the timestamp index, however deep it is.
+A cursor is the key of a row encoded as "<microseconds since epoch>_<id>", it stays valid when rows are added.
+"""
+
+import datetime
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, id):
+    return f"{(timestamp - EPOCH) // datetime.timedelta(microseconds=1)}_{id}"
+
+
+def decode_cursor(cursor):
+    try:
+        micros, id = cursor.split('_')
+        return EPOCH + datetime.timedelta(microseconds=int(micros)), int(id)
+    except (AttributeError, ValueError, OverflowError) as e:
+        raise InvalidCursor(f"Invalid cursor {cursor!r}") from e
+
+
+class KeysetPage():
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_cursor(self):
+        return self.paginator.cursor(self.object_list[-1]) if self._has_next and self.object_list else None
+
+    def previous_cursor(self):
+        return self.paginator.cursor(self.object_list[0]) if self._has_previous and self.object_list else None
+
+
+class KeysetPaginator():
+    """ Paginates <queryset> by (<field>, id), oldest first, or newest first if <descending> """
+    def __init__(self, queryset, per_page, field='timestamp', descending=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.field = field
+        self.descending = descending
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.id)
+
+    def seek(self, queryset, cursor, forward):
+        """ Rows strictly after (forward) or before the row at <cursor> in the order of the paginator """
+        value, id = decode_cursor(cursor)
+        greater = forward != self.descending
+        op = 'gt' if greater else 'lt'
+        # The redundant inclusive bound lets the database use the index range for the OR
+        return queryset.filter(
+            Q(**{f'{self.field}__{op}e': value}),
+            Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'id__{op}': id}),
+        )
+
+    def ordered(self, queryset, forward):
+        ascending = forward != self.descending
+        return queryset.order_by(*(f if ascending else f'-{f}' for f in (self.field, 'id')))
+
+    def page(self, after=None, before=None):
+        """ The page following cursor <after>, or preceding cursor <before>, or the first page if neither is given """
+        forward = before is None
+        queryset = self.queryset
+        if after is not None:
+            queryset = self.seek(queryset, after, True)
+        elif before is not None:
+            queryset = self.seek(queryset, before, False)
+
+        rows = list(self.ordered(queryset, forward)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return KeysetPage(rows, self, has_next=more, has_previous=after is not None)
+        else:
+            return KeysetPage(rows[::-1], self, has_next=True, has_previous=more)
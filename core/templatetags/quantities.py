@@ -2,11 +2,12 @@ import datetime
 import django
 import math
 import pytz
-import astropy
 
 from astropy.time import Time
 from django.utils.safestring import mark_safe
 
+from core import astronomy
+
 from .utilities import default_string, empty_on_error, graceful
 
 register = django.template.Library()
@@ -125,7 +126,7 @@ def solar_longitude(timestamp: datetime.datetime):
 
 @register.filter
 def solar_declination(timestamp: datetime.datetime):
-    return astropy.coordinates.get_sun(Time(timestamp)).dec.degree
+    return float(astronomy.sun_declination(timestamp))
 
 
 @register.filter
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import datetime
+import numpy as np
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from core import astronomy, columnar
+from core.utils import parse_time
+
+
+class FastEphemerisTest(SimpleTestCase):
+    """ The fast analytic engine must agree with astropy to 0.01° """
+    TOLERANCE = 0.01
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(42)
+        count = 300
+        start = np.datetime64('2000-01-01T00:00:00', 'ns')
+        cls.times = start + (rng.random(count) * 24 * 365.25 * 86400e9).astype('timedelta64[ns]')
+        cls.latitudes = rng.uniform(-70, 70, count)
+        cls.longitudes = rng.uniform(-180, 180, count)
+        cls.heights = rng.uniform(0, 3000, count)
+
+    def assertAgrees(self, function):
+        fast_alt, fast_az = function(self.times, self.latitudes, self.longitudes, self.heights, engine=astronomy.ENGINE_FAST)
+        exact_alt, exact_az = function(self.times, self.latitudes, self.longitudes, self.heights, engine=astronomy.ENGINE_ASTROPY)
+
+        # Azimuth errors are measured along the sky, they diverge near the zenith
+        daz = ((fast_az - exact_az + 180) % 360 - 180) * np.cos(np.radians(exact_alt))
+        self.assertLess(np.max(np.abs(fast_alt - exact_alt)), self.TOLERANCE)
+        self.assertLess(np.max(np.abs(daz)), self.TOLERANCE)
+
+    def test_sun(self):
+        self.assertAgrees(astronomy.sun_alt_az)
+
+    def test_moon(self):
+        self.assertAgrees(astronomy.moon_alt_az)
+
+    def test_broadcasting(self):
+        times = np.datetime64('2021-08-12T22:00:00', 'ns') + np.arange(0, 120, 10).astype('timedelta64[m]')
+        alt, az = astronomy.sun_alt_az(times[:, np.newaxis], np.array([48.37, 49.0]), np.array([17.27, 20.0]))
+        self.assertEqual(alt.shape, (12, 2))
+
+    def test_datetime(self):
+        time = datetime.datetime(2021, 8, 12, 22, 0, tzinfo=datetime.timezone.utc)
+        naive = datetime.datetime(2021, 8, 12, 22, 0)
+        self.assertEqual(astronomy.julian_date(time), astronomy.julian_date(naive))
+        self.assertAlmostEqual(astronomy.julian_date(time), 2459439.4166667, places=6)
+
+
+class ParseTimeTest(SimpleTestCase):
+    def test_parse(self):
+        utc = datetime.timezone.utc
+        self.assertIsNone(parse_time(''))
+        self.assertIsNone(parse_time(None))
+        self.assertEqual(parse_time('2021-08-12'), datetime.datetime(2021, 8, 12, tzinfo=utc))
+        self.assertEqual(parse_time('2021-08-12T22:01:02'), datetime.datetime(2021, 8, 12, 22, 1, 2, tzinfo=utc))
+        self.assertEqual(parse_time('2021-08-12T22:01:02+02:00'), datetime.datetime(2021, 8, 12, 20, 1, 2, tzinfo=utc))
+        with self.assertRaises(ValueError):
+            parse_time('yesterday')
+
+
+class ColumnarTest(SimpleTestCase):
+    """ Tables must decode to the values they were built from """
+    LENGTH = 13
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        start = np.datetime64('2021-08-12T22:00:00.000', 'ms')
+        self.times = start + np.cumsum(rng.integers(0, 60000, self.LENGTH)).astype('timedelta64[ms]')
+        self.floats = rng.uniform(-50, 50, self.LENGTH)
+        self.floats[[2, 7]] = np.nan
+        self.bytes = rng.integers(0, 256, self.LENGTH).astype(np.uint8)
+        self.bools = rng.random(self.LENGTH) < 0.5
+
+        self.tables = [
+            columnar.Table('heartbeats')
+                .add('time', self.times, 'time')
+                .add('temperature', self.floats, 'float32', unit='°C')
+                .add('sensors', self.bytes, 'uint8')
+                .add('automatic', self.bools, 'bool'),
+            columnar.Table('sightings', base=start)
+                .add('time', [datetime.datetime(2021, 8, 12, 23, 0, tzinfo=datetime.timezone.utc), datetime.datetime(2021, 8, 12, 21, 0)], 'time'),
+            columnar.Table('empty').add('time', np.array([], dtype='datetime64[ms]'), 'time'),
+        ]
+
+    def assertDecoded(self, decoded, places):
+        heartbeats = decoded['tables']['heartbeats']
+        np.testing.assert_array_equal(heartbeats['time'], self.times)
+        np.testing.assert_array_almost_equal(heartbeats['temperature'], self.floats, decimal=places)
+        np.testing.assert_array_equal(heartbeats['sensors'], self.bytes)
+        np.testing.assert_array_equal(heartbeats['automatic'], self.bools)
+
+        np.testing.assert_array_equal(
+            decoded['tables']['sightings']['time'],
+            np.array(['2021-08-12T23:00:00', '2021-08-12T21:00:00'], dtype='datetime64[ms]'),
+        )
+        self.assertEqual(len(decoded['tables']['empty']['time']), 0)
+        self.assertEqual(decoded['meta']['tables'][0]['columns'][1]['unit'], '°C')
+        self.assertEqual(decoded['meta']['station'], 'AGO')
+
+    def test_binary(self):
+        blob = columnar.encode_binary(self.tables, station='AGO')
+        self.assertEqual(blob[:len(columnar.MAGIC)], columnar.MAGIC)
+
+        decoded = columnar.decode_binary(blob)
+        self.assertDecoded(decoded, places=4)
+
+        # Typed arrays in the browser need every buffer aligned
+        header, = np.frombuffer(blob, dtype='<u4', count=1, offset=len(columnar.MAGIC))
+        self.assertEqual((len(columnar.MAGIC) + 4 + header) % 8, 0)
+        for table in decoded['meta']['tables']:
+            for column in table['columns']:
+                self.assertEqual(column['offset'] % 8, 0)
+
+    def test_json(self):
+        self.assertDecoded(columnar.decode_json(columnar.encode_json(self.tables, station='AGO')), places=2)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            columnar.Table('mismatch').add('a', [1, 2], 'uint8').add('b', [1], 'uint8')
+        with self.assertRaises(ValueError):
+            columnar.Table('unknown').add('a', [1], 'int16')
+        with self.assertRaises(ValueError):
+            columnar.decode_binary(b'NOTCOLUMNAR')
@@ -1,7 +1,34 @@
 import datetime
 import pytz
 
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_time(value):
+    """ Parse a date or a date and time in UTC, None if <value> is empty """
+    if not value:
+        return None
+
+    time = parse_datetime(value)
+    if time is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"Invalid date or time '{value}'")
+        time = datetime.datetime.combine(date, datetime.time())
+    return time if time.tzinfo else time.replace(tzinfo=pytz.utc)
+
+
+def day_range(date):
+    """ Half-open interval [start, end) of the UTC day <date>, for sargable timestamp filters """
+    start = datetime.datetime.combine(date, datetime.time()).replace(tzinfo=pytz.UTC)
+    return start, start + datetime.timedelta(days=1)
+
+
+def night_range(date):
+    """ Half-open interval [start, end) of the night around the UTC midnight starting <date>, from noon to noon """
+    midnight = datetime.datetime.combine(date, datetime.time()).replace(tzinfo=pytz.UTC)
+    half_day = datetime.timedelta(hours=12)
+    return midnight - half_day, midnight + half_day
 
 
 class DateParser():
@@ -6,6 +6,9 @@ from django.views.generic.list import ListView, BaseListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 from django.urls import reverse
+from django.template.loader import render_to_string
+
+from core.pagination import KeysetPaginator, InvalidCursor
 
 
 class JsonResponseMixin():
@@ -41,6 +44,62 @@ def about(request):
     return render(request, 'core/about.html', {})
 
 
+class KeysetPaginationMixin():
+    """
+    Paginate a ListView by (timestamp, id) cursors passed as ?after= or ?before=, see core.pagination.
+    Adds the URLs of neighbouring pages, keeping the other query parameters, to the context,
+    and of the next rows fragment if the view names its FragmentMixin counterpart in fragment_url_name.
+    """
+    paginate_by = 200
+    paginate_descending = False
+    fragment_url_name = None
+
+    def page_url(self, path, **cursor):
+        query = self.request.GET.copy()
+        for key in ('after', 'before'):
+            query.pop(key, None)
+        query.update(cursor)
+        return f"{path}?{query.urlencode()}"
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, descending=self.paginate_descending)
+        try:
+            page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidCursor as e:
+            raise django.http.Http404(str(e)) from e
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['page_obj']
+        if page is None:
+            return context
+
+        next_cursor, previous_cursor = page.next_cursor(), page.previous_cursor()
+        context.update({
+            'next_page_url': self.page_url(self.request.path, after=next_cursor) if next_cursor else None,
+            'previous_page_url': self.page_url(self.request.path, before=previous_cursor) if previous_cursor else None,
+            'next_fragment_url': None,
+        })
+        if next_cursor and self.fragment_url_name:
+            context['next_fragment_url'] = self.page_url(reverse(self.fragment_url_name, kwargs=self.kwargs), after=next_cursor)
+        return context
+
+
+class FragmentMixin():
+    """
+    Render only the rows of a paginated list as JSON, for loading further pages into a table that is already shown:
+    {"html": <rendered fragment_template_name>, "next": <URL of the next fragment or null>}
+    """
+    fragment_template_name = None
+
+    def render_to_response(self, context, **response_kwargs):
+        return django.http.JsonResponse({
+            'html': render_to_string(self.fragment_template_name, context, request=self.request),
+            'next': context.get('next_page_url'),
+        })
+
+
 class LoginDetailView(LoginRequiredMixin, DetailView):
     pass
 
@@ -2,4 +2,4 @@ from .meteor import MeteorAdmin
 from .sighting import SightingAdmin
 from .frame import FrameAdmin
 from .snapshot import SnapshotAdmin
-# from .shower import ShowerAdmin
+from .shower import ShowerAdmin
@@ -36,15 +36,7 @@ class MeteorAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).with_sightings().with_snapshots().with_subnetwork()
-
-    def sighting_count(self, obj):
-        return obj.sighting_count
-    sighting_count.short_description = 'sighting count'
-
-    def snapshot_count(self, obj):
-        return obj.snapshot_count
-    snapshot_count.short_description = 'snapshot count'
+        return super().get_queryset(request).with_subnetwork()
 
     list_display = ['name', 'timestamp', 'subnetwork', 'sighting_count', 'snapshot_count']
     save_as = True
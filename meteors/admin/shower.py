@@ -0,0 +1,42 @@
+from django.contrib import admin
+
+from meteors.models import Shower
+
+
+@admin.register(Shower)
+class ShowerAdmin(admin.ModelAdmin):
+    fieldsets = (
+        ('Identity',
+            {
+                'fields': (
+                    ('name', 'code'),
+                ),
+            },
+        ),
+        ('Radiant',
+            {
+                'fields': (
+                    ('radiant_right_ascension', 'radiant_declination'),
+                    ('drift_right_ascension', 'drift_declination'),
+                    ('geocentric_velocity',),
+                ),
+            },
+        ),
+        ('Activity',
+            {
+                'fields': (
+                    ('start_solar_longitude', 'peak_solar_longitude', 'end_solar_longitude'),
+                ),
+            },
+        ),
+        ('Association',
+            {
+                'fields': (
+                    ('radius', 'velocity_tolerance'),
+                ),
+            },
+        ),
+    )
+
+    list_display = ['name', 'code', 'radiant_right_ascension', 'radiant_declination', 'peak_solar_longitude', 'geocentric_velocity']
+    ordering = ['peak_solar_longitude']
@@ -24,21 +24,6 @@ class SightingInline(admin.TabularInline):
         },
     }
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).with_lightmax()
-
-    def altitude(self, obj):
-        return obj.altitude
-    altitude.short_description = "altitude"
-
-    def azimuth(self, obj):
-        return obj.azimuth
-    azimuth.short_description = "azimuth"
-
-    def magnitude(self, obj):
-        return obj.magnitude
-    magnitude.short_description = "magnitude"
-
     def has_add_permission(self, request, obj=None):
         return False
 
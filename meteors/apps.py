@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import pre_save, post_save, post_delete
 
 
 class MeteorsConfig(AppConfig):
     name = 'meteors'
+
+    def ready(self):
+        from .models.frame import update_sighting_summary
+        from .models.meteor import remember_meteor, update_meteor_summary
+
+        Frame = self.get_model('Frame')
+        post_save.connect(update_sighting_summary, sender=Frame, dispatch_uid='sighting_summary_save')
+        post_delete.connect(update_sighting_summary, sender=Frame, dispatch_uid='sighting_summary_delete')
+
+        Sighting = self.get_model('Sighting')
+        Snapshot = self.get_model('Snapshot')
+        pre_save.connect(remember_meteor, sender=Sighting, dispatch_uid='meteor_summary_remember')
+        for model in [Sighting, Snapshot]:
+            post_save.connect(update_meteor_summary, sender=model, dispatch_uid=f'meteor_summary_save_{model.__name__}')
+            post_delete.connect(update_meteor_summary, sender=model, dispatch_uid=f'meteor_summary_delete_{model.__name__}')
@@ -0,0 +1,155 @@
+"""
+Association of sightings from different stations of a subnetwork into meteors.
+
+Sightings are swept in time order. For every sighting only the sightings starting within WINDOW seconds of it
+are examined, found by binary search in the sorted timestamps, so a night costs O(n log n + n k)
+with k sightings per window instead of comparing all pairs.
+
+Two sightings from different stations are consistent if they could show the same meteor: every line of sight
+of one of them (first, brightest and last frame) must cross the plane through the other station and its observed
+arc in front of the station, at meteor heights. Lines of sight almost parallel to the plane and sightings
+with too short an arc to define a plane leave the test inconclusive. A pair passes with at least one conclusive pass
+and no conclusive failure. Sightings without frame directions are never associated automatically.
+
+A sighting joins the nearest group in time that has no sighting from its station yet, passes with at least one
+of the group's sightings in its window and fails with none. Sightings that already belong to a meteor are never moved,
+their meteors are groups that may grow, and their sightings without directions are inconclusive.
+"""
+
+import numpy as np
+
+
+WINDOW = 5.0                            # s between the starts of two sightings of the same meteor
+MIN_HEIGHT = 20e3                       # m
+MAX_HEIGHT = 200e3                      # m
+MAX_RANGE = 1500e3                      # m from the station
+MIN_ARC = np.sin(np.radians(0.5))       # shortest arc that defines a plane
+MIN_INCIDENCE = np.sin(np.radians(2))   # smallest angle between a line of sight and a plane it is intersected with
+
+# WGS84
+A = 6378137.0
+E2 = 6.69437999014e-3
+
+FAIL, UNKNOWN, PASS = -1, 0, 1
+
+
+def positions(latitude, longitude, altitude):
+    """ Geocentric cartesian positions (m) of geodetic coordinates in degrees and metres, shape (n, 3) """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    n = A / np.sqrt(1 - E2 * np.sin(lat) ** 2)
+    return np.stack([
+        (n + altitude) * np.cos(lat) * np.cos(lon),
+        (n + altitude) * np.cos(lat) * np.sin(lon),
+        (n * (1 - E2) + altitude) * np.sin(lat),
+    ], axis=-1)
+
+
+def directions(latitude, longitude, altitude, azimuth):
+    """ Geocentric unit vectors of horizontal directions (altitude, azimuth from north to east, in degrees) at observers, shape (n, 3) """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    alt, az = np.radians(altitude), np.radians(azimuth)
+    east = np.stack([-np.sin(lon), np.cos(lon), np.zeros_like(lon)], axis=-1)
+    north = np.stack([-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon), np.cos(lat)], axis=-1)
+    up = np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+    return (np.cos(alt) * np.sin(az))[..., None] * east + (np.cos(alt) * np.cos(az))[..., None] * north + np.sin(alt)[..., None] * up
+
+
+class Observations():
+    """
+    Sightings as parallel arrays, one item per sighting. <rays> has shape (n, 3, 3): the directions of the
+    first, brightest and last frame, NaN where unknown. <meteors> holds existing meteor ids, -1 for none.
+    """
+    def __init__(self, times, stations, subnetworks, meteors, latitude, longitude, altitude, rays):
+        self.times = np.asarray(times, dtype=float)
+        self.stations = np.asarray(stations, dtype=int)
+        self.subnetworks = np.asarray(subnetworks, dtype=int)
+        self.meteors = np.asarray(meteors, dtype=int)
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.positions = positions(latitude, longitude, self.altitude)
+        self.rays = rays
+        self.radius = np.linalg.norm(self.positions, axis=1)
+
+        normals = np.cross(rays[:, 0], rays[:, 2])
+        length = np.linalg.norm(normals, axis=1)
+        self.planar = length >= MIN_ARC
+        self.normals = normals / np.where(self.planar, length, 1)[:, None]
+        self.directed = np.isfinite(rays).all(axis=(1, 2))
+
+    def __len__(self):
+        return len(self.times)
+
+    def crossing(self, planes, observers):
+        """
+        Verdict for every pair planes[k], observers[k]: do the lines of sight of the observer cross the plane of the other sighting
+        in front of the observer and at meteor heights?
+        """
+        normals = self.normals[planes]
+        rays = self.rays[observers]
+        incidence = np.einsum('mk,mrk->mr', normals, rays)
+        usable = (np.abs(incidence) >= MIN_INCIDENCE) & self.planar[planes, None]
+
+        distance = np.einsum('mk,mk->m', normals, self.positions[planes] - self.positions[observers])[:, None] / np.where(usable, incidence, 1)
+        points = self.positions[observers, None, :] + distance[..., None] * rays
+        # Height above the ellipsoid, approximated by the radius at the observer: the error is well below a kilometre at these ranges
+        height = np.linalg.norm(points, axis=2) - self.radius[observers, None] + self.altitude[observers, None]
+        valid = (distance > 0) & (distance < MAX_RANGE) & (height > MIN_HEIGHT) & (height < MAX_HEIGHT)
+
+        conclusive = usable.any(axis=1)
+        passed = (valid | ~usable).all(axis=1)
+        return np.where(conclusive, np.where(passed, PASS, FAIL), UNKNOWN)
+
+    def verdict(self, index, others):
+        """ Verdict for sighting <index> showing the same meteor as each of <others>: FAIL if either test fails, else PASS if either passes """
+        mine = np.full(len(others), index)
+        forward, backward = np.split(self.crossing(np.concatenate([others, mine]), np.concatenate([mine, others])), 2)
+        return np.where((forward == FAIL) | (backward == FAIL), FAIL, np.maximum(forward, backward))
+
+    def cluster(self, window=WINDOW):
+        """
+        Label every sighting with the index of the first sighting of its group, -1 for sightings that cannot be associated.
+        Sightings of the same existing meteor share a label.
+        """
+        order = np.argsort(self.times, kind='stable')
+        times = self.times[order]
+        labels = np.full(len(self), -1)
+        stations = {}
+
+        for meteor in np.unique(self.meteors[self.meteors >= 0]):
+            members = np.flatnonzero(self.meteors == meteor)
+            labels[members] = members[0]
+            stations[members[0]] = set(self.stations[members].tolist())
+
+        starts = np.searchsorted(times, times - window, side='left')
+        ends = np.searchsorted(times, times + window, side='right')
+
+        for position, index in enumerate(order):
+            if self.meteors[index] >= 0 or not self.directed[index] or self.subnetworks[index] < 0:
+                continue
+
+            # Everything already labelled in the window: earlier sightings and existing meteors on both sides
+            others = order[starts[position]:ends[position]]
+            others = others[
+                (others != index) & (labels[others] >= 0) &
+                (self.subnetworks[others] == self.subnetworks[index]) & (self.stations[others] != self.stations[index])
+            ]
+
+            best = None
+            if len(others):
+                verdicts = self.verdict(index, others)
+                gaps = np.abs(self.times[others] - self.times[index])
+                for label in np.unique(labels[others]):
+                    group = labels[others] == label
+                    if self.stations[index] in stations[label] or (verdicts[group] == FAIL).any() or not (verdicts[group] == PASS).any():
+                        continue
+                    gap = gaps[group].min()
+                    if best is None or gap < best[1]:
+                        best = (label, gap)
+
+            if best is None:
+                labels[index] = index
+                stations[index] = {self.stations[index]}
+            else:
+                labels[index] = best[0]
+                stations[best[0]].add(self.stations[index])
+
+        return labels
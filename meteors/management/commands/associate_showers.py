@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import night_range
+from meteors.models import Meteor, Shower
+
+
+class Command(BaseCommand):
+    help = "Assign meteors with orbits to showers again, all of them or those of the given nights"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=datetime.date.fromisoformat, nargs='?', help="first night (YYYY-MM-DD, the date after the evening), default the whole archive")
+        parser.add_argument('end', type=datetime.date.fromisoformat, nargs='?', help="last night, default the first one")
+
+    def handle(self, *args, **options):
+        meteors = Meteor.objects.all()
+        start = options['start']
+        if start is not None:
+            end = options['end'] or start
+            if end < start:
+                raise CommandError("The last night precedes the first one")
+            meteors = meteors.filter(timestamp__gte=night_range(start)[0], timestamp__lt=night_range(end)[1])
+
+        index = Shower.objects.index()
+        count = Meteor.objects.associate_showers(meteors, index)
+        self.stdout.write(self.style.SUCCESS(f"Matched meteors against {len(index)} showers, reassigned {count}"))
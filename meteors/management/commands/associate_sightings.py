@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meteors.models import Meteor, Sighting
+
+
+class Command(BaseCommand):
+    help = "Group unassigned sightings from different stations into meteors, one night at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=datetime.date.fromisoformat, help="first night (YYYY-MM-DD, the date after the evening)")
+        parser.add_argument('end', type=datetime.date.fromisoformat, nargs='?', help="last night, default the first one")
+
+    def handle(self, *args, **options):
+        start = options['start']
+        end = options['end'] or start
+        if end < start:
+            raise CommandError("The last night precedes the first one")
+
+        total = 0
+        date = start
+        while date <= end:
+            count = Meteor.objects.associate(Sighting.objects.for_night(date))
+            total += count
+            self.stdout.write(f"{date}: associated {count} sightings")
+            date += datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Associated {total} sightings"))
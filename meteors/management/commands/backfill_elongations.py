@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from meteors.models import Frame
+
+
+class Command(BaseCommand):
+    help = "Compute missing solar and lunar elongations of frames in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="number of frames computed and updated at once")
+        parser.add_argument('--all', action='store_true', help="recompute the elongations of all frames, not only the missing ones")
+
+    def handle(self, *args, **options):
+        frames = Frame.objects.order_by('id')
+        if not options['all']:
+            frames = frames.without_elongations()
+
+        # Walk by id, frames that cannot be computed (no position or station) stay NULL and must not be selected again
+        last = 0
+        total = 0
+        while True:
+            ids = list(frames.filter(id__gt=last).values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+
+            total += Frame.objects.compute_elongations(Frame.objects.filter(id__in=ids))
+            last = ids[-1]
+            self.stdout.write(f"Updated {total} frames (up to id {last})")
+
+        self.stdout.write(self.style.SUCCESS(f"Computed elongations of {total} frames"))
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meteors import orbit
+from meteors.models import Meteor
+
+
+class Command(BaseCommand):
+    help = "Determine the heliocentric orbits of meteors with solved trajectories, one night at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=datetime.date.fromisoformat, help="first night (YYYY-MM-DD, the date after the evening)")
+        parser.add_argument('end', type=datetime.date.fromisoformat, nargs='?', help="last night, default the first one")
+        parser.add_argument('--clones', type=int, default=orbit.CLONES, help="Monte Carlo clones per meteor for the errors")
+        parser.add_argument('--processes', type=int, default=None, help="number of worker processes, default one per CPU")
+        parser.add_argument('--all', action='store_true', help="compute all orbits again, not only the missing ones")
+
+    def handle(self, *args, **options):
+        start = options['start']
+        end = options['end'] or start
+        if end < start:
+            raise CommandError("The last night precedes the first one")
+
+        total = 0
+        date = start
+        while date <= end:
+            meteors = Meteor.objects.for_night(date)
+            if not options['all']:
+                meteors = meteors.without_orbit()
+            count = Meteor.objects.compute_orbits(meteors, clones=options['clones'], processes=options['processes'])
+            total += count
+            self.stdout.write(f"{date}: computed {count} orbits")
+            date += datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Computed {total} orbits"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meteors.models import Meteor, Sighting
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored frame summaries of sightings and the snapshot and sighting summaries of meteors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sightings', action='store_true', help="only rebuild sighting summaries")
+        parser.add_argument('--meteors', action='store_true', help="only rebuild meteor summaries")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="number of rows updated in a single transaction")
+
+    def rebuild(self, model, chunk_size):
+        ids = list(model.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            with transaction.atomic():
+                model.objects.filter(id__in=chunk).update_summary()
+            self.stdout.write(f"Rebuilt {start + len(chunk)} of {len(ids)} {model._meta.verbose_name_plural}")
+
+    def handle(self, *args, **options):
+        everything = not options['sightings'] and not options['meteors']
+
+        if everything or options['sightings']:
+            self.rebuild(Sighting, options['chunk_size'])
+        if everything or options['meteors']:
+            self.rebuild(Meteor, options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS("Summaries are up to date"))
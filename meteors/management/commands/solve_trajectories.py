@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meteors.models import Meteor
+
+
+class Command(BaseCommand):
+    help = "Triangulate the trajectories of meteors seen from several stations, one night at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=datetime.date.fromisoformat, help="first night (YYYY-MM-DD, the date after the evening)")
+        parser.add_argument('end', type=datetime.date.fromisoformat, nargs='?', help="last night, default the first one")
+        parser.add_argument('--processes', type=int, default=None, help="number of worker processes, default one per CPU")
+        parser.add_argument('--all', action='store_true', help="solve all meteors again, replacing their snapshots, not only the unsolved ones")
+
+    def handle(self, *args, **options):
+        start = options['start']
+        end = options['end'] or start
+        if end < start:
+            raise CommandError("The last night precedes the first one")
+
+        total = 0
+        date = start
+        while date <= end:
+            meteors = Meteor.objects.for_night(date)
+            if not options['all']:
+                meteors = meteors.unsolved()
+            count = Meteor.objects.solve_trajectories(meteors, processes=options['processes'])
+            total += count
+            self.stdout.write(f"{date}: solved {count} meteors")
+            date += datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Solved {total} meteors"))
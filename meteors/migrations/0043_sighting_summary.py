@@ -0,0 +1,96 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+FILL_SUMMARY = """
+UPDATE meteors_sighting AS s SET
+    frame_count = (SELECT count(*) FROM meteors_frame f WHERE f.sighting_id = s.id),
+    first_altitude = (SELECT altitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp LIMIT 1),
+    first_azimuth = (SELECT azimuth FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp LIMIT 1),
+    first_magnitude = (SELECT magnitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp LIMIT 1),
+    last_altitude = (SELECT altitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp DESC LIMIT 1),
+    last_azimuth = (SELECT azimuth FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp DESC LIMIT 1),
+    last_magnitude = (SELECT magnitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY timestamp DESC LIMIT 1),
+    altitude = (SELECT altitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY magnitude LIMIT 1),
+    azimuth = (SELECT azimuth FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY magnitude LIMIT 1),
+    magnitude = (SELECT magnitude FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY magnitude LIMIT 1),
+    angular_speed = (SELECT angular_speed FROM meteors_frame f WHERE f.sighting_id = s.id ORDER BY magnitude LIMIT 1);
+
+UPDATE meteors_sighting SET
+    arc_length = DEGREES(ACOS(LEAST(1.0, GREATEST(-1.0,
+        SIN(RADIANS(first_altitude)) * SIN(RADIANS(last_altitude)) +
+        COS(RADIANS(first_altitude)) * COS(RADIANS(last_altitude)) * COS(RADIANS(first_azimuth - last_azimuth))
+    ))));
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0042_auto_20210125_2259'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sighting',
+            name='altitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='altitude of the brightest frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='angular_speed',
+            field=models.FloatField(blank=True, null=True, verbose_name='angular speed of the brightest frame [°/s]'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='arc_length',
+            field=models.FloatField(blank=True, null=True, verbose_name='arc length between the first and the last frame [°]'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='azimuth',
+            field=models.FloatField(blank=True, null=True, verbose_name='azimuth of the brightest frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='first_altitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='altitude of the first frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='first_azimuth',
+            field=models.FloatField(blank=True, null=True, verbose_name='azimuth of the first frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='first_magnitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='magnitude of the first frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='frame_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='number of frames'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='last_altitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='altitude of the last frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='last_azimuth',
+            field=models.FloatField(blank=True, null=True, verbose_name='azimuth of the last frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='last_magnitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='magnitude of the last frame'),
+        ),
+        migrations.AddField(
+            model_name='sighting',
+            name='magnitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='magnitude of the brightest frame'),
+        ),
+        migrations.RunSQL(FILL_SUMMARY, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+FILL_SUMMARY = """
+UPDATE meteors_meteor AS m SET
+    magnitude = (SELECT magnitude FROM meteors_snapshot s WHERE s.meteor_id = m.id ORDER BY magnitude LIMIT 1),
+    latitude = (SELECT latitude FROM meteors_snapshot s WHERE s.meteor_id = m.id ORDER BY magnitude LIMIT 1),
+    longitude = (SELECT longitude FROM meteors_snapshot s WHERE s.meteor_id = m.id ORDER BY magnitude LIMIT 1),
+    altitude = (SELECT altitude FROM meteors_snapshot s WHERE s.meteor_id = m.id ORDER BY magnitude LIMIT 1),
+    speed = (
+        SELECT SQRT(velocity_x * velocity_x + velocity_y * velocity_y + velocity_z * velocity_z)
+        FROM meteors_snapshot s WHERE s.meteor_id = m.id ORDER BY timestamp LIMIT 1
+    ),
+    sighting_count = (SELECT count(*) FROM meteors_sighting s WHERE s.meteor_id = m.id),
+    snapshot_count = (SELECT count(*) FROM meteors_snapshot s WHERE s.meteor_id = m.id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0043_sighting_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meteor',
+            name='altitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='altitude at the peak'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='latitude at the peak'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='longitude at the peak'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='magnitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='peak absolute magnitude'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='sighting_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='number of sightings'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='snapshot_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='number of snapshots'),
+        ),
+        migrations.AddField(
+            model_name='meteor',
+            name='speed',
+            field=models.FloatField(blank=True, null=True, verbose_name='initial speed'),
+        ),
+        migrations.RunSQL(FILL_SUMMARY, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:34
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0044_meteor_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meteor',
+            index=models.Index(fields=['timestamp'], name='meteor_timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='sighting',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='sighting_timestamp_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshot',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='snapshot_timestamp_brin'),
+        ),
+    ]
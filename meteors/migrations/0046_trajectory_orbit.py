@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0045_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trajectory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('radiant_right_ascension', models.FloatField(blank=True, null=True, verbose_name='geocentric radiant right ascension')),
+                ('radiant_declination', models.FloatField(blank=True, null=True, verbose_name='geocentric radiant declination')),
+                ('geocentric_velocity', models.FloatField(blank=True, null=True, verbose_name='geocentric velocity')),
+                ('semimajor_axis', models.FloatField(blank=True, null=True, verbose_name='semi-major axis')),
+                ('semimajor_axis_error', models.FloatField(blank=True, null=True, verbose_name='semi-major axis error')),
+                ('eccentricity', models.FloatField(blank=True, null=True, verbose_name='eccentricity')),
+                ('eccentricity_error', models.FloatField(blank=True, null=True, verbose_name='eccentricity error')),
+                ('perihelion_distance', models.FloatField(blank=True, null=True, verbose_name='perihelion distance')),
+                ('inclination', models.FloatField(blank=True, null=True, verbose_name='inclination')),
+                ('inclination_error', models.FloatField(blank=True, null=True, verbose_name='inclination error')),
+                ('argument_of_perihelion', models.FloatField(blank=True, null=True, verbose_name='argument of perihelion')),
+                ('longitude_of_ascending_node', models.FloatField(blank=True, null=True, verbose_name='longitude of the ascending node')),
+                ('meteor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trajectory', to='meteors.meteor', verbose_name='meteor')),
+            ],
+            options={
+                'verbose_name': 'heliocentric trajectory',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0046_trajectory_orbit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shower',
+            name='code',
+            field=models.CharField(blank=True, max_length=3, null=True, unique=True, verbose_name='IAU code'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='drift_declination',
+            field=models.FloatField(default=0, help_text='degrees per degree of solar longitude', verbose_name='radiant drift in declination'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='drift_right_ascension',
+            field=models.FloatField(default=0, help_text='degrees per degree of solar longitude', verbose_name='radiant drift in right ascension'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='end_solar_longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='solar longitude of the end of activity'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='geocentric_velocity',
+            field=models.FloatField(blank=True, help_text='m/s', null=True, verbose_name='geocentric velocity'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='peak_solar_longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='solar longitude of the peak'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='radiant_declination',
+            field=models.FloatField(blank=True, help_text='geocentric, at the peak, degrees J2000', null=True, verbose_name='radiant declination'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='radiant_right_ascension',
+            field=models.FloatField(blank=True, help_text='geocentric, at the peak, degrees J2000', null=True, verbose_name='radiant right ascension'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='radius',
+            field=models.FloatField(default=5.0, help_text="largest distance of a member's radiant, degrees", verbose_name='association radius'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='start_solar_longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='solar longitude of the start of activity'),
+        ),
+        migrations.AddField(
+            model_name='shower',
+            name='velocity_tolerance',
+            field=models.FloatField(default=0.2, help_text="largest relative difference of a member's geocentric velocity", verbose_name='velocity tolerance'),
+        ),
+    ]
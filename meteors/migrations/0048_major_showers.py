@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+# Major showers, approximately after the IMO Meteor Shower Calendar:
+# name, IAU code, start, peak and end solar longitude, radiant RA and Dec at the peak, drift in RA and Dec per degree, v_g (km/s)
+SHOWERS = [
+    ('Quadrantids',              'QUA', 276.0, 283.15, 292.0, 230.0, +49.0, 0.80, -0.20, 41),
+    ('Lyrids',                   'LYR',  24.0,  32.32,  40.0, 271.0, +34.0, 1.10,  0.00, 49),
+    ('eta Aquariids',            'ETA',  29.0,  45.50,  67.0, 338.0,  -1.0, 0.90,  0.40, 66),
+    ('alpha Capricornids',       'CAP', 101.0, 127.00, 142.0, 307.0, -10.0, 0.54,  0.25, 23),
+    ('Southern delta Aquariids', 'SDA', 110.0, 127.00, 150.0, 340.0, -16.0, 0.80,  0.18, 41),
+    ('Perseids',                 'PER', 115.0, 140.00, 151.0,  48.0, +58.0, 1.35,  0.12, 59),
+    ('Orionids',                 'ORI', 189.0, 208.00, 225.0,  95.0, +16.0, 0.70,  0.10, 66),
+    ('Draconids',                'DRA', 192.6, 195.40, 196.6, 262.0, +54.0, 0.00,  0.00, 20),
+    ('Leonids',                  'LEO', 223.5, 235.27, 248.0, 152.0, +22.0, 0.70, -0.42, 71),
+    ('Geminids',                 'GEM', 252.0, 262.20, 268.0, 112.0, +33.0, 1.00, -0.15, 35),
+    ('Ursids',                   'URS', 265.0, 270.70, 274.0, 217.0, +76.0, 0.00, -0.30, 33),
+]
+
+
+def add_showers(apps, schema_editor):
+    Shower = apps.get_model('meteors', 'Shower')
+    for name, code, start, peak, end, ra, dec, drift_ra, drift_dec, velocity in SHOWERS:
+        Shower.objects.update_or_create(name=name, defaults=dict(
+            code=code,
+            start_solar_longitude=start, peak_solar_longitude=peak, end_solar_longitude=end,
+            radiant_right_ascension=ra, radiant_declination=dec,
+            drift_right_ascension=drift_ra, drift_declination=drift_dec,
+            geocentric_velocity=velocity * 1000,
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meteors', '0047_shower_radiants'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_showers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def station_foreign_key(timing):
+    """ Set the timing of the foreign key from sightings to the station table, its name was generated by Django """
+    return f"""
+        DO $$
+        DECLARE
+            name text;
+        BEGIN
+            SELECT conname INTO STRICT name FROM pg_constraint
+            WHERE conrelid = 'meteors_sighting'::regclass AND confrelid = 'stations_station'::regclass AND contype = 'f';
+            EXECUTE format('ALTER TABLE meteors_sighting ALTER CONSTRAINT %I DEFERRABLE INITIALLY {timing}', name);
+        END $$
+    """
+
+
+class Migration(migrations.Migration):
+    """ Check the station of a new sighting at the INSERT, like stations 0064 does for heartbeats """
+
+    dependencies = [
+        ('meteors', '0048_major_showers'),
+        ('stations', '0064_heartbeat_station_immediate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(station_foreign_key('IMMEDIATE'), station_foreign_key('DEFERRED')),
+    ]
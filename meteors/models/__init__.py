@@ -3,3 +3,4 @@ from .sighting import Sighting
 from .snapshot import Snapshot
 from .meteor import Meteor
 from .shower import Shower
+from .trajectory import Trajectory
@@ -1,19 +1,120 @@
 import math
+import pytz
+import logging
+import datetime
+import numpy as np
 
+from django.apps import apps
 from django.db import models
 from django.db.models import F, Q, Window, Subquery, OuterRef, Min, Max, Window
 from django.db.models.functions import Lead
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 
-from astropy.coordinates import EarthLocation, AltAz, get_sun, get_moon
+from astropy.coordinates import EarthLocation, AltAz, SkyCoord, get_sun, get_moon, get_body
 from astropy.time import Time
 from astropy import units
 
+import core.loader
 from core.models import none_if_error
+from meteors import ufocapture
+
+log = logging.getLogger(__name__)
+
+
+def elongations(location, timestamps, altitude, azimuth):
+    """
+    Solar and lunar elongations in degrees of many positions (altitude, azimuth) observed from <location>
+    at <timestamps>, computed with a single array-valued Time and AltAz frame. NaN where a position is missing.
+    """
+    time = Time(np.asarray(timestamps, dtype='datetime64[us]'), scale='utc')
+    frame = AltAz(obstime=time, location=location)
+    position = SkyCoord(alt=np.asarray(altitude, dtype=float) * units.deg, az=np.asarray(azimuth, dtype=float) * units.deg, frame=frame)
+    sun = get_sun(time).transform_to(frame)
+    moon = get_body('moon', time).transform_to(frame)
+    return sun.separation(position).degree, moon.separation(position).degree
+
+
+def nan_to_none(value):
+    return None if np.isnan(value) else float(value)
+
+
+class FrameManager(models.Manager):
+    def compute_elongations(self, queryset=None, batch_size=1000):
+        """
+        Compute and store the solar and lunar elongations of all frames in <queryset> (default: all frames)
+        with one vectorized call per station and a bulk update. Returns the number of updated frames.
+        """
+        Station = apps.get_model('stations', 'Station')
+        queryset = self.all() if queryset is None else queryset
+        data = core.loader.load_arrays(queryset, ['id', 'timestamp', 'altitude', 'azimuth', 'sighting__station_id'])
+
+        frames = []
+        stations = data['sighting__station_id']
+        for station in Station.objects.filter(id__in=np.unique(stations[~np.isnan(stations)]).astype(int).tolist()):
+            mask = stations == station.id
+            try:
+                solar, lunar = elongations(station.earth_location(), data['timestamp'][mask], data['altitude'][mask], data['azimuth'][mask])
+            except (TypeError, ValueError, units.UnitsError) as e:
+                log.warning(f"Could not compute elongations for frames from station {station}: {e}")
+                continue
+
+            frames += [
+                self.model(id=id, solar_elongation=nan_to_none(sun), lunar_elongation=nan_to_none(moon))
+                for id, sun, moon in zip(data['id'][mask].tolist(), solar, lunar)
+            ]
+
+        self.bulk_update(frames, ['solar_elongation', 'lunar_elongation'], batch_size=batch_size)
+        return len(frames)
+
+    def bulk_create_from_xml(self, sighting, file):
+        """
+        Parse the UFOAnalyzer record <file> of <sighting>, compute the elongations of all frames at once
+        and insert them with a single query. Raises ufocapture.RecordError if the record is invalid.
+        """
+        track = ufocapture.parse(file)
+        if track is None:
+            return []
+
+        timestamps = track.timestamps()
+        solar = lunar = np.full(len(track), np.nan)
+        if sighting.station is not None:
+            try:
+                solar, lunar = elongations(sighting.station.earth_location(), timestamps, track.altitude, track.azimuth)
+            except (TypeError, ValueError, units.UnitsError) as e:
+                log.warning(f"Could not compute elongations for sighting {sighting.id}: {e}")
+
+        speed = track.angular_speed()
+        times = timestamps.astype(datetime.datetime)
+        frames = [
+            self.model(
+                sighting            = sighting,
+                order               = order,
+                timestamp           = times[order].replace(tzinfo=pytz.utc),
+                x                   = None if np.isnan(track.x[order]) else round(track.x[order]),
+                y                   = None if np.isnan(track.y[order]) else round(track.y[order]),
+                altitude            = nan_to_none(track.altitude[order]),
+                azimuth             = nan_to_none(track.azimuth[order]),
+                magnitude           = nan_to_none(track.magnitude[order]),
+                angular_speed       = nan_to_none(speed[order]),
+                solar_elongation    = nan_to_none(solar[order]),
+                lunar_elongation    = nan_to_none(lunar[order]),
+            ) for order in range(len(track))
+        ]
+        frames = self.bulk_create(frames)
+        sighting.update_summary()
+        return frames
+
+
+def update_sighting_summary(sender, instance, **kwargs):
+    """ Signal receiver that keeps the frame summary of the sighting of a saved or deleted frame up to date """
+    apps.get_model('meteors', 'Sighting').objects.filter(id=instance.sighting_id).update_summary()
 
 
 class FrameQuerySet(models.QuerySet):
+    def without_elongations(self):
+        return self.filter(Q(solar_elongation__isnull=True) | Q(lunar_elongation__isnull=True))
+
     def with_flight_time(self):
         return self.annotate(
             flight_time=F('timestamp') - Window(
@@ -41,7 +142,7 @@ class Frame(models.Model):
                                         )
                                     ]
 
-    objects                         = FrameQuerySet.as_manager()
+    objects                         = FrameManager.from_queryset(FrameQuerySet)()
 
     id                              = models.AutoField(
                                         primary_key         = True,
@@ -1,11 +1,15 @@
 import datetime
+import logging
 import math
+import multiprocessing
+import os
 import pytz
 import numpy as np
 
-from django.db import models
+from django.apps import apps
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models import Prefetch, Window, F, Q, Subquery, OuterRef, Min, Max, Count
-from django.db.models.functions import Lead, Sqrt
+from django.db.models.functions import Coalesce, Lead, Sqrt
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import validate_slug
@@ -13,20 +17,356 @@ from django.utils.decorators import method_decorator
 
 from astropy.coordinates import EarthLocation
 from astropy import units
+from concurrent.futures import ProcessPoolExecutor
 
+import core.loader
 from core.models import none_if_error
+from core.utils import day_range, night_range
+from core import astronomy
+from meteors import association, orbit, triangulation
 from meteors.models import Sighting, Snapshot
 
+log = logging.getLogger(__name__)
+
+
+SUMMARY_FIELDS = [
+    'magnitude', 'latitude', 'longitude', 'altitude', 'speed',
+    'sighting_count', 'snapshot_count',
+]
+
+
+def remember_meteor(sender, instance, **kwargs):
+    """ Signal receiver that remembers which meteor a sighting belonged to before it is saved """
+    instance._previous_meteor_id = None if instance.pk is None else \
+        sender.objects.filter(pk=instance.pk).values_list('meteor_id', flat=True).first()
+
+
+def update_meteor_summary(sender, instance, **kwargs):
+    """ Signal receiver that keeps the summary of the meteor of a saved or deleted snapshot or sighting up to date """
+    ids = {instance.meteor_id, getattr(instance, '_previous_meteor_id', None)} - {None}
+    if ids:
+        Meteor.objects.filter(id__in=ids).update_summary()
+
+
+PROFILE_SUMMARY = 'summary'
+PROFILE_FULL = 'full'
+
+ASSOCIATION_COLUMNS = [
+    'id', 'timestamp', 'station_id', 'station__subnetwork_id', 'meteor_id',
+    'station__latitude', 'station__longitude', 'station__altitude',
+    'first_altitude', 'first_azimuth', 'altitude', 'azimuth', 'last_altitude', 'last_azimuth',
+]
+
+TRIANGULATION_COLUMNS = [
+    'sighting__meteor_id', 'sighting_id', 'sighting__station_id',
+    'sighting__station__latitude', 'sighting__station__longitude',
+    'timestamp', 'altitude', 'azimuth', 'magnitude',
+]
+
+ORBIT_COLUMNS = [
+    'meteor_id', 'timestamp', 'latitude', 'longitude', 'altitude', 'velocity_x', 'velocity_y', 'velocity_z',
+]
+
+SHOWER_COLUMNS = [
+    'id', 'timestamp', 'source_id',
+    'trajectory__radiant_right_ascension', 'trajectory__radiant_declination', 'trajectory__geocentric_velocity',
+]
+
+
+def run_jobs(function, jobs, processes=None):
+    """
+    Results of function(*job) for every job in dict <jobs>, under the same keys, computed in a pool of <processes>
+    worker processes (default: one per CPU, 1 computes in this process). <function> must be importable by the workers.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(jobs) <= 1:
+        return {key: function(*job) for key, job in jobs.items()}
+
+    # Spawned workers import only the module of <function> and never touch the inherited database connection
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {key: pool.submit(function, *job) for key, job in jobs.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def meteor_name(subnetwork_code, timestamp):
+    return f"{subnetwork_code}-{timestamp:%Y%m%d-%H%M%S}-{timestamp.microsecond // 1000:03d}"
+
+
+class MeteorManager(models.Manager):
+    def associate(self, sightings, window=association.WINDOW, batch_size=1000):
+        """
+        Group <sightings> from different stations of a subnetwork into meteors, see meteors.association.
+        Unassigned sightings join existing meteors among <sightings> or form new meteors with each other,
+        sightings already assigned to a meteor are left alone. Returns the number of newly assigned sightings.
+        """
+        data = core.loader.load_arrays(sightings, ASSOCIATION_COLUMNS)
+        if len(data['id']) == 0:
+            return 0
+
+        latitude, longitude = data['station__latitude'], data['station__longitude']
+        rays = np.stack([
+            association.directions(latitude, longitude, data[f'{prefix}altitude'], data[f'{prefix}azimuth'])
+            for prefix in ['first_', '', 'last_']
+        ], axis=1)
+        times = (data['timestamp'] - np.datetime64(0, 'us')) / np.timedelta64(1, 's')
+        observations = association.Observations(
+            times,
+            data['station_id'],
+            np.nan_to_num(data['station__subnetwork_id'], nan=-1),
+            np.nan_to_num(data['meteor_id'], nan=-1),
+            latitude, longitude, data['station__altitude'], rays,
+        )
+        labels = observations.cluster(window)
+
+        Subnetwork = apps.get_model('stations', 'Subnetwork')
+        codes = dict(Subnetwork.objects.values_list('id', 'code'))
+
+        # Existing meteors keep their id, groups of new sightings from at least two stations become new meteors
+        meteor_of = {}
+        created = {}
+        for label in np.unique(labels[labels >= 0]).tolist():
+            group = labels == label
+            existing = observations.meteors[group]
+            if (existing >= 0).any():
+                meteor_of[label] = int(existing.max())
+            elif len(np.unique(observations.stations[group])) >= 2:
+                first = np.flatnonzero(group)[np.argmin(times[group])]
+                timestamp = data['timestamp'][first].astype('datetime64[us]').astype(datetime.datetime).replace(tzinfo=pytz.UTC)
+                subnetwork = observations.subnetworks[first]
+                created[label] = self.model(name=meteor_name(codes[subnetwork], timestamp), timestamp=timestamp, subnetwork_id=subnetwork)
+
+        pending = [
+            (id, label)
+            for id, label, meteor in zip(data['id'].tolist(), labels.tolist(), observations.meteors.tolist())
+            if meteor < 0 and (label in meteor_of or label in created)
+        ]
+        if not pending:
+            return 0
+
+        with transaction.atomic():
+            self.create_named(created, meteor_of, batch_size)
+            meteor_of.update({label: meteor.id for label, meteor in created.items()})
+            ids = [id for id, label in pending]
+            meteors = [meteor_of[label] for id, label in pending]
+            # A single UPDATE from arrays, bulk_update builds a CASE with a branch per row. No signals are sent,
+            # so the summaries are recomputed here. Sightings assigned concurrently since they were loaded are kept.
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE {Sighting._meta.db_table} SET meteor_id = assignment.meteor
+                    FROM UNNEST(%s::integer[], %s::integer[]) AS assignment(id, meteor)
+                    WHERE {Sighting._meta.db_table}.id = assignment.id AND {Sighting._meta.db_table}.meteor_id IS NULL
+                """, [ids, meteors])
+                assigned = cursor.rowcount
+
+            # New meteors whose sightings were taken by a concurrent association are left with fewer than two,
+            # they are dropped and their remaining sighting is unassigned again
+            stray = dict(self.filter(id__in=[meteor.id for meteor in created.values()])
+                .annotate(count=Count('sightings')).filter(count__lt=2).values_list('id', 'count'))
+            self.filter(id__in=list(stray)).delete()
+            assigned -= sum(stray.values())
+            self.filter(id__in=set(meteors)).update_summary()
+
+        log.info(f"Associated {assigned} sightings, created {len(created) - len(stray)} meteors")
+        return assigned
+
+    def create_named(self, created, meteor_of, batch_size=1000):
+        """
+        Insert the new meteors of <created> (label: Meteor). A concurrent association may have created a meteor
+        of the same name from the same first sighting in the meantime, such labels are moved to <meteor_of>
+        with the id of the existing meteor instead.
+        """
+        try:
+            with transaction.atomic():
+                self.bulk_create(created.values(), batch_size=batch_size)
+            return
+        except IntegrityError:
+            log.warning("Some new meteors were created concurrently, inserting them one by one")
+
+        for label, meteor in list(created.items()):
+            try:
+                with transaction.atomic():
+                    meteor.save(force_insert=True)
+            except IntegrityError:
+                meteor_of[label] = self.get(name=meteor.name).id
+                del created[label]
+
+    def associate_sighting(self, sighting, window=association.WINDOW):
+        """ Associate a newly received <sighting> with the sightings of its subnetwork around it """
+        subnetwork = sighting.station.subnetwork_id
+        if subnetwork is None:
+            return 0
+
+        margin = datetime.timedelta(seconds=2 * window)
+        return self.associate(
+            Sighting.objects.filter(station__subnetwork_id=subnetwork, timestamp__range=(sighting.timestamp - margin, sighting.timestamp + margin)),
+            window=window,
+        )
+
+    def solve_trajectories(self, meteors, processes=None, batch_size=1000):
+        """
+        Triangulate the trajectories of <meteors> from the frames of their sightings and store them as snapshots,
+        replacing existing ones and discarding their orbits. The frames are read with one query and solved in a pool
+        of <processes> worker processes (default: one per CPU, 1 solves in this process). Returns the number of solved meteors.
+        """
+        Frame = apps.get_model('meteors', 'Frame')
+        Snapshot = apps.get_model('meteors', 'Snapshot')
+        Trajectory = apps.get_model('meteors', 'Trajectory')
+        Station = apps.get_model('stations', 'Station')
+
+        data = core.loader.load_arrays(Frame.objects.filter(sighting__meteor__in=meteors), TRIANGULATION_COLUMNS)
+        stations = {station.id: station.earth_location() for station in Station.objects.filter(id__in=np.unique(data['sighting__station_id']).tolist())}
+
+        rays = association.directions(
+            data['sighting__station__latitude'], data['sighting__station__longitude'], data['altitude'], data['azimuth'],
+        )
+        times = (data['timestamp'] - np.datetime64(0, 'us')) / np.timedelta64(1, 's')
+
+        jobs = {}
+        for meteor in np.unique(data['sighting__meteor_id']).astype(int).tolist():
+            mask = data['sighting__meteor_id'] == meteor
+            sightings, indices = np.unique(data['sighting_id'][mask], return_inverse=True)
+            station_ids = [int(data['sighting__station_id'][mask][np.argmax(indices == index)]) for index in range(len(sightings))]
+            positions = np.array([[coordinate.to_value(units.m) for coordinate in stations[id].to_geocentric()] for id in station_ids])
+            jobs[meteor] = (times[mask], indices, positions, rays[mask], data['magnitude'][mask])
+
+        results = run_jobs(triangulation.try_solve, jobs, processes)
+
+        snapshots = []
+        for meteor, solution in results.items():
+            if isinstance(solution, triangulation.TrajectoryError):
+                log.warning(f"Could not solve the trajectory of meteor {meteor}: {solution}")
+                continue
+
+            latitudes, longitudes, altitudes = solution.geodetic()
+            velocity = solution.velocity.tolist()
+            for order, (time, latitude, longitude, altitude, magnitude) in enumerate(zip(
+                solution.times.tolist(), latitudes.tolist(), longitudes.tolist(), altitudes.tolist(), solution.magnitudes.tolist(),
+            )):
+                snapshots.append(Snapshot(
+                    meteor_id=meteor, order=order,
+                    timestamp=datetime.datetime.fromtimestamp(time, tz=pytz.UTC),
+                    latitude=latitude, longitude=longitude, altitude=altitude,
+                    velocity_x=velocity[0], velocity_y=velocity[1], velocity_z=velocity[2],
+                    magnitude=None if math.isnan(magnitude) else magnitude,
+                ))
+
+        solved = {snapshot.meteor_id for snapshot in snapshots}
+        with transaction.atomic():
+            # QuerySet.delete would send a signal and update the meteor summary for every snapshot, delete them directly
+            # and update the summaries once instead
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {Snapshot._meta.db_table} WHERE meteor_id = ANY(%s)", [list(solved)])
+            Snapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+            # Orbits were computed from the replaced snapshots, without_orbit picks the meteors up again
+            Trajectory.objects.filter(meteor_id__in=solved).delete()
+            self.filter(id__in=solved).update_summary()
+
+        log.info(f"Solved {len(solved)} of {len(jobs)} meteor trajectories")
+        return len(solved)
+
+    def compute_orbits(self, meteors, clones=orbit.CLONES, processes=None, batch_size=1000):
+        """
+        Determine the heliocentric orbits of <meteors> with solved trajectories from their first snapshots and store them
+        as Trajectory objects, replacing existing ones. Errors are estimated from <clones> Monte Carlo clones per meteor,
+        see meteors.orbit, and meteors are spread over <processes> worker processes like in solve_trajectories.
+        Returns the number of computed orbits.
+        """
+        Trajectory = apps.get_model('meteors', 'Trajectory')
+
+        data = core.loader.load_arrays(Snapshot.objects.filter(meteor__in=meteors, order=0), ORBIT_COLUMNS)
+        velocities = np.stack([data['velocity_x'], data['velocity_y'], data['velocity_z']], axis=1)
+        known = np.isfinite(velocities).all(axis=1) & np.isfinite(data['latitude']) & np.isfinite(data['longitude']) & np.isfinite(data['altitude'])
+        jds = astronomy.julian_date(data['timestamp'])
+
+        jobs = {
+            meteor: (jd, latitude, longitude, altitude, velocity, clones, meteor)
+            for meteor, jd, latitude, longitude, altitude, velocity in zip(
+                data['meteor_id'][known].astype(int).tolist(), jds[known].tolist(),
+                data['latitude'][known].tolist(), data['longitude'][known].tolist(), data['altitude'][known].tolist(),
+                velocities[known],
+            )
+        }
+        results = run_jobs(orbit.determine, jobs, processes)
+
+        def finite(value):
+            return None if value is None or not math.isfinite(value) else value
+
+        trajectories = [
+            Trajectory(
+                meteor_id=meteor,
+                radiant_right_ascension=result.radiant_right_ascension,
+                radiant_declination=result.radiant_declination,
+                geocentric_velocity=result.geocentric_velocity,
+                semimajor_axis=finite(result.elements['semimajor_axis']),
+                semimajor_axis_error=finite(result.errors['semimajor_axis']),
+                eccentricity=finite(result.elements['eccentricity']),
+                eccentricity_error=finite(result.errors['eccentricity']),
+                perihelion_distance=finite(result.elements['perihelion_distance']),
+                inclination=finite(result.elements['inclination']),
+                inclination_error=finite(result.errors['inclination']),
+                argument_of_perihelion=finite(result.elements['argument_of_perihelion']),
+                longitude_of_ascending_node=finite(result.elements['longitude_of_ascending_node']),
+            )
+            for meteor, result in results.items()
+        ]
+
+        with transaction.atomic():
+            Trajectory.objects.filter(meteor_id__in=list(results)).delete()
+            Trajectory.objects.bulk_create(trajectories, batch_size=batch_size)
+
+        log.info(f"Computed {len(trajectories)} meteor orbits")
+        return len(trajectories)
+
+    def associate_showers(self, meteors, index=None):
+        """
+        Assign <meteors> with an orbit to the showers their radiants match, see meteors.showers, or mark them sporadic.
+        <index> is a ShowerIndex, by default of all showers. Meteors without an orbit are left alone.
+        Returns the number of meteors whose shower changed.
+        """
+        Shower = apps.get_model('meteors', 'Shower')
+        index = Shower.objects.index() if index is None else index
+
+        data = core.loader.load_arrays(meteors.filter(trajectory__isnull=False), SHOWER_COLUMNS)
+        if len(data['id']) == 0:
+            return 0
+
+        longitude = astronomy.solar_longitude(astronomy.julian_date(data['timestamp']))
+        matched = index.match(
+            longitude, data['trajectory__radiant_right_ascension'], data['trajectory__radiant_declination'],
+            data['trajectory__geocentric_velocity'],
+        )
+        current = np.nan_to_num(data['source_id'], nan=-1).astype(int)
+        changed = np.flatnonzero(matched != current)
+        if len(changed) == 0:
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {self.model._meta.db_table} SET source_id = NULLIF(assignment.shower, -1)
+                FROM UNNEST(%s::integer[], %s::integer[]) AS assignment(id, shower)
+                WHERE {self.model._meta.db_table}.id = assignment.id
+            """, [data['id'][changed].astype(int).tolist(), matched[changed].tolist()])
+
+        log.info(f"Reassigned {len(changed)} of {len(data['id'])} meteors to showers")
+        return len(changed)
+
 
 class MeteorQuerySet(models.QuerySet):
-    def with_sightings(self):
+    def unsolved(self):
+        """ Meteors seen from at least two stations without a trajectory """
+        return self.filter(sighting_count__gte=2, snapshot_count=0)
+
+    def without_orbit(self):
+        """ Meteors with a solved trajectory but no heliocentric orbit """
+        return self.filter(snapshot_count__gt=0, trajectory__isnull=True)
+
+    def with_sightings(self, frames=True):
+        sightings = Sighting.objects.with_station().order_by('timestamp')
         return self.prefetch_related(
             Prefetch(
                 'sightings',
-                queryset=Sighting.objects.with_frames().with_station().with_lightmax().order_by('timestamp'),
+                queryset=sightings.with_frames() if frames else sightings,
             )
-        ).annotate(
-            sighting_count=Count('sightings', distinct=True)
         )
 
     def with_snapshots(self):
@@ -35,24 +375,26 @@ class MeteorQuerySet(models.QuerySet):
                 'snapshots',
                 queryset=Snapshot.objects.all(),
             )
-        ).annotate(
-            snapshot_count=Count('snapshots', distinct=True)
         )
 
     def with_subnetwork(self):
         return self.select_related('subnetwork')
 
-    def with_lightmax(self):
-        snapshots = Snapshot.objects.filter(meteor=OuterRef('id')).with_speed()
-        by_magnitude = snapshots.order_by('magnitude')
-        by_timestamp = snapshots.order_by('timestamp')
+    def update_summary(self):
+        """ Recompute the stored summary of all meteors in the queryset from their snapshots and sightings """
+        snapshots = Snapshot.objects.filter(meteor=OuterRef('id'))
+        brightest = snapshots.order_by('magnitude')
+        earliest = snapshots.with_speed().order_by('timestamp')
+        sightings = Sighting.objects.filter(meteor=OuterRef('id'))
 
-        return self.annotate(
-            magnitude=Subquery(by_magnitude.values('magnitude')[:1]),
-            latitude=Subquery(by_magnitude.values('latitude')[:1]),
-            longitude=Subquery(by_magnitude.values('longitude')[:1]),
-            altitude=Subquery(by_magnitude.values('altitude')[:1]),
-            speed=Subquery(by_timestamp.values('speed')[:1]),
+        return self.update(
+            magnitude=Subquery(brightest.values('magnitude')[:1]),
+            latitude=Subquery(brightest.values('latitude')[:1]),
+            longitude=Subquery(brightest.values('longitude')[:1]),
+            altitude=Subquery(brightest.values('altitude')[:1]),
+            speed=Subquery(earliest.values('speed')[:1]),
+            sighting_count=Coalesce(Subquery(sightings.order_by().values('meteor').annotate(count=Count('id')).values('count')), 0),
+            snapshot_count=Coalesce(Subquery(snapshots.order_by().values('meteor').annotate(count=Count('id')).values('count')), 0),
         )
 
     def with_neighbours(self):
@@ -82,26 +424,44 @@ class MeteorQuerySet(models.QuerySet):
         )
 
     def for_date(self, date):
-        return self.filter(timestamp__date=date)
+        start, end = day_range(date)
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
 
     def for_night(self, date):
-        midnight = datetime.datetime.combine(date, datetime.datetime.min.time()).replace(tzinfo=pytz.UTC)
-        half_day = datetime.timedelta(hours=12)
-        return self.filter(timestamp__range=(midnight - half_day, midnight + half_day))
+        start, end = night_range(date)
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
 
     def for_subnetwork(self, subnetwork_code):
         return self.filter(subnetwork__code=subnetwork_code)
 
+    def with_summary(self):
+        """ Only what meteor lists show: the stored summary, subnetwork and sightings with their stations, no frames or snapshots """
+        return self.with_subnetwork().with_sightings(frames=False)
+
     def with_everything(self):
-        return self.with_subnetwork().with_sightings().with_snapshots().with_lightmax()
+        return self.with_subnetwork().with_sightings().with_snapshots()
+
+    def with_profile(self, profile):
+        if profile == PROFILE_SUMMARY:
+            return self.with_summary()
+        elif profile == PROFILE_FULL:
+            return self.with_everything()
+        else:
+            raise ValueError(f"Unknown loading profile {profile}")
 
 
 class Meteor(models.Model):
     class Meta:
         verbose_name                = "meteor"
         ordering                    = ['timestamp']
+        indexes                     = [
+                                        models.Index(
+                                            fields          = ['timestamp'],
+                                            name            = 'meteor_timestamp',
+                                        ),
+                                    ]
 
-    objects                         = MeteorQuerySet.as_manager()
+    objects                         = MeteorManager.from_queryset(MeteorQuerySet)()
 
     id                              = models.AutoField(
                                         primary_key         = True,
@@ -135,12 +495,51 @@ class Meteor(models.Model):
                                         on_delete           = models.SET_NULL,
                                     )
 
+    # Summary of the snapshots and sightings, maintained by MeteorQuerySet.update_summary whenever they are written
+    magnitude                       = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "peak absolute magnitude",
+                                    )
+    latitude                        = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "latitude at the peak",
+                                    )
+    longitude                       = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "longitude at the peak",
+                                    )
+    altitude                        = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "altitude at the peak",
+                                    )
+    speed                           = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "initial speed",
+                                    )
+    sighting_count                  = models.PositiveIntegerField(
+                                        default             = 0,
+                                        verbose_name        = "number of sightings",
+                                    )
+    snapshot_count                  = models.PositiveIntegerField(
+                                        default             = 0,
+                                        verbose_name        = "number of snapshots",
+                                    )
+
     def __str__(self):
         return self.name
 
     def get_absolute_url(self):
         return reverse('meteor', kwargs={'name': self.name})
 
+    def update_summary(self):
+        type(self).objects.filter(id=self.id).update_summary()
+        self.refresh_from_db(fields=SUMMARY_FIELDS)
+
     def as_dict(self):
         return {
             'id': self.id,
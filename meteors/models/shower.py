@@ -1,6 +1,99 @@
+from django.db import models
+
 import core.models
+from meteors import showers
+
+
+class ShowerManager(models.Manager):
+    def index(self):
+        """ ShowerIndex of all showers with a known radiant and activity window """
+        rows = list(self.filter(
+            radiant_right_ascension__isnull=False, radiant_declination__isnull=False,
+            start_solar_longitude__isnull=False, end_solar_longitude__isnull=False,
+        ).values_list(
+            'id', 'radiant_right_ascension', 'radiant_declination', 'drift_right_ascension', 'drift_declination',
+            'peak_solar_longitude', 'start_solar_longitude', 'end_solar_longitude', 'geocentric_velocity',
+            'radius', 'velocity_tolerance',
+        ))
+        columns = list(zip(*rows)) if rows else [[]] * 11
+        # Without a known peak the radiant is taken at the middle of the activity
+        peaks = [
+            peak if peak is not None else (start + ((end - start) % 360) / 2) % 360
+            for peak, start, end in zip(columns[5], columns[6], columns[7])
+        ]
+        return showers.ShowerIndex(
+            *columns[:5], peaks, *columns[6:8],
+            [float('nan') if velocity is None else velocity for velocity in columns[8]],
+            *columns[9:],
+        )
+
 
 class Shower(core.models.NamedModel):
     class Meta:
         verbose_name                = 'meteor shower'
 
+    objects                         = ShowerManager()
+
+    code                            = models.CharField(
+                                        max_length          = 3,
+                                        null                = True,
+                                        blank               = True,
+                                        unique              = True,
+                                        verbose_name        = "IAU code",
+                                    )
+
+    radiant_right_ascension         = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "radiant right ascension",
+                                        help_text           = "geocentric, at the peak, degrees J2000",
+                                    )
+    radiant_declination             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "radiant declination",
+                                        help_text           = "geocentric, at the peak, degrees J2000",
+                                    )
+    drift_right_ascension           = models.FloatField(
+                                        default             = 0,
+                                        verbose_name        = "radiant drift in right ascension",
+                                        help_text           = "degrees per degree of solar longitude",
+                                    )
+    drift_declination               = models.FloatField(
+                                        default             = 0,
+                                        verbose_name        = "radiant drift in declination",
+                                        help_text           = "degrees per degree of solar longitude",
+                                    )
+    geocentric_velocity             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "geocentric velocity",
+                                        help_text           = "m/s",
+                                    )
+
+    peak_solar_longitude            = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "solar longitude of the peak",
+                                    )
+    start_solar_longitude           = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "solar longitude of the start of activity",
+                                    )
+    end_solar_longitude             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "solar longitude of the end of activity",
+                                    )
+
+    radius                          = models.FloatField(
+                                        default             = showers.RADIUS,
+                                        verbose_name        = "association radius",
+                                        help_text           = "largest distance of a member's radiant, degrees",
+                                    )
+    velocity_tolerance              = models.FloatField(
+                                        default             = showers.VELOCITY_TOLERANCE,
+                                        verbose_name        = "velocity tolerance",
+                                        help_text           = "largest relative difference of a member's geocentric velocity",
+                                    )
@@ -4,11 +4,12 @@ import math
 import logging
 import numpy as np
 
-from django.db import models
+from django.db import models, transaction
 from django.apps import apps
+from django.contrib.postgres.indexes import BrinIndex
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Prefetch, F, Q, Value, Window, Min, Count, Subquery, OuterRef
-from django.db.models.functions import Coalesce, Lead, Sin, Cos, Degrees, Radians, ACos
+from django.db.models.functions import Coalesce, Lead, Sin, Cos, Degrees, Radians, ACos, Least, Greatest
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 
@@ -19,7 +20,10 @@ from astropy import units
 from pprint import pprint as pp
 
 from core.models import none_if_error
+from core.utils import day_range, night_range
+from meteors import ufocapture
 from meteors.models import Frame
+from stations.registry import station_registry
 
 log = logging.getLogger(__name__)
 
@@ -28,22 +32,55 @@ class SightingManager(models.Manager):
     def create_from_POST(self, station_code, **kwargs):
         log.info(f"Creating a sighting from POST at station {station_code}")
 
-        Station = apps.get_model('stations', 'Station')
-        try:
-            sighting = self.create(
-                timestamp           = datetime.datetime.strptime(kwargs['meta']['timestamp'], '%Y-%m-%d %H:%M:%S.%f').replace(tzinfo=pytz.utc),
-                meteor              = None,
-                station             = Station.objects.get(code=station_code),
-                jpg                 = kwargs['files'].get('jpg', None),
-                xml                 = kwargs['files'].get('xml', None),
-                avi_size            = kwargs['meta'].get('avi_size', None),
-            )
-        except KeyError as e:
-            log.error("Invalid sighting")
-            raise e
+        with transaction.atomic():
+            try:
+                timestamp = datetime.datetime.strptime(kwargs['meta']['timestamp'], '%Y-%m-%d %H:%M:%S.%f').replace(tzinfo=pytz.utc)
+                sighting = station_registry.insert(station_code, lambda station_id: self.create(
+                    timestamp           = timestamp,
+                    meteor              = None,
+                    station_id          = station_id,
+                    jpg                 = kwargs['files'].get('jpg', None),
+                    xml                 = kwargs['files'].get('xml', None),
+                    avi_size            = kwargs['meta'].get('avi_size', None),
+                ))
+            except KeyError as e:
+                log.error("Invalid sighting")
+                raise e
+
+            if sighting.xml:
+                try:
+                    with sighting.xml.open('rb') as file:
+                        frames = Frame.objects.bulk_create_from_xml(sighting, file)
+                except ufocapture.RecordError:
+                    # The sighting is rolled back, do not leave its files behind
+                    sighting.xml.delete(save=False)
+                    sighting.jpg.delete(save=False)
+                    raise
+                log.info(f"Created {len(frames)} frames for sighting {sighting.id}")
+
+                if frames:
+                    # Only once the sighting is stored, so that a failed association cannot roll it back
+                    transaction.on_commit(lambda: self.associate_stored(sighting))
 
         return sighting
 
+    @staticmethod
+    def associate_stored(sighting):
+        """ Associate a committed <sighting>, leaving it to associate_recent_sightings if that fails """
+        try:
+            apps.get_model('meteors', 'Meteor').objects.associate_sighting(sighting)
+        except Exception as e:
+            log.exception(f"Could not associate sighting {sighting.id}: {e}")
+
+SUMMARY_FIELDS = [
+    'frame_count',
+    'first_altitude', 'first_azimuth', 'first_magnitude',
+    'last_altitude', 'last_azimuth', 'last_magnitude',
+    'altitude', 'azimuth', 'magnitude', 'angular_speed',
+    'arc_length',
+]
+
+
 class SightingQuerySet(models.QuerySet):
     def with_station(self):
         return self.select_related('station')
@@ -52,52 +89,62 @@ class SightingQuerySet(models.QuerySet):
         return self.select_related('meteor')
 
     def with_frames(self):
-        frames_asc = Frame.objects.filter(sighting=OuterRef('id')).order_by('timestamp')
-        frames_desc = Frame.objects.filter(sighting=OuterRef('id')).order_by('-timestamp')
         return self.prefetch_related(
             Prefetch(
                 'frames',
                 queryset=Frame.objects.with_flight_time(),
             )
-        ).annotate(
-            frame_count=Count('frames'),
-            fa=Subquery(frames_asc.values('altitude')[:1]),
-            la=Subquery(frames_desc.values('altitude')[:1]),
-            fz=Subquery(frames_asc.values('azimuth')[:1]),
-            lz=Subquery(frames_desc.values('azimuth')[:1]),
+        )
+
+    def with_everything(self):
+        return self.with_station().with_meteor().with_frames()
+
+    def update_summary(self):
+        """ Recompute the frame summary fields of all sightings in the queryset from their frames """
+        frames = Frame.objects.filter(sighting=OuterRef('id'))
+        first = frames.order_by('timestamp')
+        last = frames.order_by('-timestamp')
+        brightest = frames.order_by('magnitude')
+
+        self.update(
+            frame_count=Coalesce(Subquery(frames.order_by().values('sighting').annotate(count=Count('id')).values('count')), 0),
+            first_altitude=Subquery(first.values('altitude')[:1]),
+            first_azimuth=Subquery(first.values('azimuth')[:1]),
+            first_magnitude=Subquery(first.values('magnitude')[:1]),
+            last_altitude=Subquery(last.values('altitude')[:1]),
+            last_azimuth=Subquery(last.values('azimuth')[:1]),
+            last_magnitude=Subquery(last.values('magnitude')[:1]),
+            altitude=Subquery(brightest.values('altitude')[:1]),
+            azimuth=Subquery(brightest.values('azimuth')[:1]),
+            magnitude=Subquery(brightest.values('magnitude')[:1]),
+            angular_speed=Subquery(brightest.values('angular_speed')[:1]),
+        )
+        # Rounding errors may push the cosine slightly out of [-1, 1]
+        return self.update(
             arc_length=Degrees(
                 ACos(
-                    Sin(Radians(F('fa'))) * Sin(Radians(F('la'))) +
-                    Cos(Radians(F('fa'))) * Cos(Radians(F('la'))) * Cos(Radians(F('fz') - F('lz')))
+                    Least(Value(1.0), Greatest(Value(-1.0),
+                        Sin(Radians(F('first_altitude'))) * Sin(Radians(F('last_altitude'))) +
+                        Cos(Radians(F('first_altitude'))) * Cos(Radians(F('last_altitude'))) * Cos(Radians(F('first_azimuth') - F('last_azimuth')))
+                    ))
                 )
             ),
         )
 
-    def with_lightmax(self):
-        frames = Frame.objects.filter(sighting=OuterRef('id')).order_by('magnitude')
-        return self.annotate(
-            magnitude=Subquery(frames.values('magnitude')[:1]),
-            azimuth=Subquery(frames.values('azimuth')[:1]),
-            altitude=Subquery(frames.values('altitude')[:1]),
-            angular_speed=Subquery(frames.values('angular_speed')[:1]),
-        )
-
-    def with_everything(self):
-        return self.with_station().with_meteor().with_frames().with_lightmax()
-
     def for_meteor(self, meteor_name):
         return self.filter(meteor__name=meteor_name)
 
     def for_station(self, station_code):
-        return self.filter(station__code=station_code)
+        station_id = station_registry.get_id(station_code)
+        return self.none() if station_id is None else self.filter(station_id=station_id)
 
     def for_date(self, date):
-        return self.filter(timestamp__date=date)
+        start, end = day_range(date)
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
 
     def for_night(self, date):
-        midnight = datetime.datetime.combine(date, datetime.datetime.min.time()).replace(tzinfo=pytz.UTC)
-        half_day = datetime.timedelta(hours=12)
-        return self.filter(timestamp__range=(midnight - half_day, midnight + half_day))
+        start, end = night_range(date)
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
 
     def as_scatter(self, start=None, end=None):
         if end == None:
@@ -117,7 +164,11 @@ class Sighting(models.Model):
                                         models.Index(
                                             fields          = ['station', 'timestamp'],
                                             name            = 'by_station',
-                                        )
+                                        ),
+                                        BrinIndex(
+                                            fields          = ['timestamp'],
+                                            name            = 'sighting_timestamp_brin',
+                                        ),
                                     ]
 
     objects                         = SightingManager.from_queryset(SightingQuerySet)()
@@ -163,6 +214,67 @@ class Sighting(models.Model):
                                         on_delete           = models.SET_NULL,
                                     )
 
+    # Summary of the frames, maintained by SightingQuerySet.update_summary whenever frames are written
+    frame_count                     = models.PositiveIntegerField(
+                                        default             = 0,
+                                        verbose_name        = "number of frames",
+                                    )
+    first_altitude                  = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "altitude of the first frame",
+                                    )
+    first_azimuth                   = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "azimuth of the first frame",
+                                    )
+    first_magnitude                 = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "magnitude of the first frame",
+                                    )
+    last_altitude                   = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "altitude of the last frame",
+                                    )
+    last_azimuth                    = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "azimuth of the last frame",
+                                    )
+    last_magnitude                  = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "magnitude of the last frame",
+                                    )
+    altitude                        = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "altitude of the brightest frame",
+                                    )
+    azimuth                         = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "azimuth of the brightest frame",
+                                    )
+    magnitude                       = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "magnitude of the brightest frame",
+                                    )
+    angular_speed                   = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "angular speed of the brightest frame [°/s]",
+                                    )
+    arc_length                      = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "arc length between the first and the last frame [°]",
+                                    )
+
     def __str__(self):
         meteor = 'unknown meteor' if self.meteor is None else self.meteor.name
         return f"#{self.id}: {meteor} from {self.station} at {self.timestamp}"
@@ -176,11 +288,6 @@ class Sighting(models.Model):
     def moon_position(self):
         return self.station.moon_position(self.timestamp)
 
-    def arc_length(self):
-        first = self.frames.earliest()
-        last = self.frames.latest()
-        phi1 = math.radians(first.altitude)
-        phi2 = math.radians(last.altitude)
-        lambda1 = math.radians(first.azimuth)
-        lambda2 = math.radians(last.azimuth)
-        return math.degrees(math.acos(math.sin(phi1) * math.sin(phi2) + math.cos(phi1) * math.cos(phi2) * math.cos(lambda1 - lambda2)))
+    def update_summary(self):
+        type(self).objects.filter(id=self.id).update_summary()
+        self.refresh_from_db(fields=SUMMARY_FIELDS)
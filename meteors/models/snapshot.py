@@ -1,6 +1,7 @@
 import numpy as np
 
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 from django.db.models import F, Window, Min
 from django.db.models.functions import Sqrt
 
@@ -38,7 +39,11 @@ class Snapshot(models.Model):
                                         models.Index(
                                             fields          = ['meteor', 'order'],
                                             name            = 'meteor_order',
-                                        )
+                                        ),
+                                        BrinIndex(
+                                            fields          = ['timestamp'],
+                                            name            = 'snapshot_timestamp_brin',
+                                        ),
                                     ]
 
     objects                         = SnapshotManager.from_queryset(SnapshotQuerySet)()
@@ -5,6 +5,29 @@ class Trajectory(models.Model):
     class Meta:
         verbose_name = "heliocentric trajectory"
 
+    meteor                          = models.OneToOneField(
+                                        'Meteor',
+                                        verbose_name        = "meteor",
+                                        related_name        = 'trajectory',
+                                        on_delete           = models.CASCADE,
+                                    )
+
+    radiant_right_ascension         = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "geocentric radiant right ascension",
+                                    )
+    radiant_declination             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "geocentric radiant declination",
+                                    )
+    geocentric_velocity             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "geocentric velocity",
+                                    )
+
     semimajor_axis                  = models.FloatField(null=True, blank=True, verbose_name="semi-major axis")
     semimajor_axis_error            = models.FloatField(null=True, blank=True, verbose_name="semi-major axis error")
     eccentricity                    = models.FloatField(
@@ -12,11 +35,18 @@ class Trajectory(models.Model):
                                         blank               = True,
                                         verbose_name        = "eccentricity",
                                     )
+    eccentricity_error              = models.FloatField(null=True, blank=True, verbose_name="eccentricity error")
+    perihelion_distance             = models.FloatField(
+                                        null                = True,
+                                        blank               = True,
+                                        verbose_name        = "perihelion distance",
+                                    )
     inclination                     = models.FloatField(
                                         null                = True,
                                         blank               = True,
                                         verbose_name        = "inclination",
                                     )
+    inclination_error               = models.FloatField(null=True, blank=True, verbose_name="inclination error")
     argument_of_perihelion          = models.FloatField(
                                         null                = True,
                                         blank               = True,
@@ -27,4 +57,3 @@ class Trajectory(models.Model):
                                         blank               = True,
                                         verbose_name        = "longitude of the ascending node",
                                     )
-
@@ -0,0 +1,164 @@
+"""
+Heliocentric orbits of meteoroids from their triangulated atmospheric trajectories.
+
+The state of the meteor at its first snapshot (geocentric cartesian position and velocity relative to the rotating Earth,
+in metres and metres per second) is rotated to the true equator of date by the sidereal time and the rotation of the Earth
+is added to the velocity. The pre-atmospheric speed is taken to be the measured one (deceleration is neglected).
+The geocentric speed removes the Earth's gravity well, v_g² = v_∞² - 2GM/r, and zenith attraction moves the radiant
+away from the zenith by 2 atan((v_∞ - v_g) / (v_∞ + v_g) tan(z / 2)).
+
+The geocentric velocity is rotated to the ecliptic of date and added to the heliocentric velocity of the Earth,
+from the low precision solar series of core.astronomy, and the elements follow from the heliocentric state vector.
+Angles are finally referred to the equinox J2000 by the general precession in longitude.
+
+Errors are estimated by Monte Carlo: the velocity is cloned with normal errors in speed and direction, all clones
+are propagated at once as arrays, and the errors are the standard deviations of the elements over the clones.
+The functions here only use NumPy, so they can run in worker processes without a database connection.
+"""
+
+import numpy as np
+
+from core import astronomy
+from meteors import association
+
+
+GM_EARTH = 3.986004418e14               # m³ / s²
+EARTH_ROTATION = 7.2921150e-5           # rad / s
+GAUSS = 0.01720209895                   # Gaussian gravitational constant, μ = k² in AU³ / day²
+DAY = 86400.0                           # s
+AU = astronomy.ASTRONOMICAL_UNIT * 1e3  # m
+
+CLONES = 1000
+SPEED_ERROR = 500.0                     # m/s, standard deviation of the measured speed
+DIRECTION_ERROR = np.radians(0.3)       # standard deviation of the measured direction
+
+
+class Orbit():
+    """ Radiant, geocentric speed and heliocentric elements of a meteoroid, with Monte Carlo errors """
+    def __init__(self, radiant_right_ascension, radiant_declination, geocentric_velocity, elements, errors):
+        self.radiant_right_ascension = radiant_right_ascension
+        self.radiant_declination = radiant_declination
+        self.geocentric_velocity = geocentric_velocity
+        self.elements = elements
+        self.errors = errors
+
+
+def inertial(jd, position, velocity):
+    """ Rotate geocentric positions and velocities (relative to the rotating Earth) to the true equator of date """
+    gst = np.radians(astronomy.sidereal_time(jd))
+    c, s = np.cos(gst), np.sin(gst)
+    rotation = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+    position, velocity = position @ rotation.T, velocity @ rotation.T
+    return position, velocity + np.cross([0, 0, EARTH_ROTATION], position)
+
+
+def geocentric(position, velocity):
+    """
+    Geocentric radiants (unit vectors towards them, equatorial of date) and speeds (m/s) of meteors at inertial <position>
+    with <velocity>, corrected for the attraction of the Earth. Velocities of shape (n, 3) are n clones.
+    """
+    speed = np.linalg.norm(velocity, axis=-1)
+    radiant = -velocity / speed[..., None]
+    radius = np.linalg.norm(position, axis=-1)
+    geocentric_speed = np.sqrt(np.maximum(speed ** 2 - 2 * GM_EARTH / radius, 0))
+
+    zenith = position / radius[..., None]
+    cosine = np.clip(np.sum(radiant * zenith, axis=-1), -1, 1)
+    distance = np.arccos(cosine)
+    correction = 2 * np.arctan((speed - geocentric_speed) / (speed + geocentric_speed) * np.tan(distance / 2))
+    # Turn the radiant away from the zenith in the vertical plane containing both
+    across = radiant - cosine[..., None] * zenith
+    across /= np.maximum(np.linalg.norm(across, axis=-1), 1e-12)[..., None]
+    corrected = distance + correction
+    radiant = np.cos(corrected)[..., None] * zenith + np.sin(corrected)[..., None] * across
+    return radiant, geocentric_speed
+
+
+def earth_state(jd):
+    """ Heliocentric ecliptic position (AU) and velocity (AU / day) of the Earth, ecliptic and equinox of date """
+    def position(jd):
+        longitude, distance = astronomy.sun_ecliptic(jd)
+        longitude = np.radians(longitude)
+        return -distance / astronomy.ASTRONOMICAL_UNIT * np.array([np.cos(longitude), np.sin(longitude), 0])
+
+    step = 0.01
+    return position(jd), (position(jd + step) - position(jd - step)) / (2 * step)
+
+
+def elements(position, velocity):
+    """
+    Heliocentric elements of states given as ecliptic positions (AU) and velocities (AU / day) broadcast together:
+    dict of semimajor_axis (AU, negative for hyperbolic orbits), eccentricity, perihelion_distance (AU),
+    inclination, argument_of_perihelion and longitude_of_ascending_node (degrees, ecliptic of date)
+    """
+    mu = GAUSS ** 2
+    position, velocity = np.broadcast_arrays(position, velocity)
+    radius = np.linalg.norm(position, axis=-1)
+    square = np.sum(velocity ** 2, axis=-1)
+    momentum = np.cross(position, velocity)
+    h = np.linalg.norm(momentum, axis=-1)
+    node = np.stack([-momentum[..., 1], momentum[..., 0], np.zeros_like(h)], axis=-1)
+    vector = ((square - mu / radius)[..., None] * position - np.sum(position * velocity, axis=-1)[..., None] * velocity) / mu
+    eccentricity = np.linalg.norm(vector, axis=-1)
+
+    # Parabolic orbits have an infinite semi-major axis, circular or ecliptic ones an undefined argument of perihelion
+    with np.errstate(divide='ignore', invalid='ignore'):
+        semimajor_axis = 1 / (2 / radius - square / mu)
+        perigee = np.degrees(np.arccos(np.clip(
+            np.sum(node * vector, axis=-1) / (np.linalg.norm(node, axis=-1) * eccentricity), -1, 1,
+        )))
+
+    return {
+        'semimajor_axis': semimajor_axis,
+        'eccentricity': eccentricity,
+        'perihelion_distance': h ** 2 / mu / (1 + eccentricity),
+        'inclination': np.degrees(np.arccos(momentum[..., 2] / h)),
+        'argument_of_perihelion': np.where(vector[..., 2] < 0, 360 - perigee, perigee),
+        'longitude_of_ascending_node': np.degrees(np.arctan2(node[..., 1], node[..., 0])) % 360,
+    }
+
+
+def clone(velocity, count, rng, speed_error=SPEED_ERROR, direction_error=DIRECTION_ERROR):
+    """ <count> clones of <velocity> with normal errors in speed and direction, the first one is the nominal velocity """
+    speed = np.linalg.norm(velocity)
+    directions = velocity / speed + rng.normal(0, direction_error, (count, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    speeds = speed + rng.normal(0, speed_error, count)
+    directions[0], speeds[0] = velocity / speed, speed
+    return directions * speeds[:, None]
+
+
+def determine(jd, latitude, longitude, altitude, velocity, clones=CLONES, seed=None):
+    """
+    Orbit of a meteor whose first snapshot at Julian date <jd> is at geodetic <latitude>, <longitude> (degrees) and
+    <altitude> (m), moving with geocentric cartesian <velocity> (m/s) relative to the rotating Earth.
+    """
+    rng = np.random.default_rng(seed)
+    position = association.positions(latitude, longitude, altitude)
+    position, velocities = inertial(jd, position, clone(np.asarray(velocity, dtype=float), max(clones, 1), rng))
+    radiant, speed = geocentric(position, velocities)
+
+    T = (jd - astronomy.J2000) / 36525
+    epsilon = np.radians(astronomy.obliquity(T))
+    c, s = np.cos(epsilon), np.sin(epsilon)
+    to_ecliptic = np.array([[1, 0, 0], [0, c, s], [0, -s, c]])
+    geocentric_velocity = -(radiant @ to_ecliptic.T) * (speed * DAY / AU)[:, None]
+
+    earth_position, earth_velocity = earth_state(jd)
+    result = elements(earth_position, earth_velocity + geocentric_velocity)
+    result['longitude_of_ascending_node'] = (result['longitude_of_ascending_node'] - astronomy.PRECESSION * T) % 360
+
+    # Semi-major axes of clones on unbound orbits are meaningless, spread only over the bound ones
+    bound = result['eccentricity'] < 1
+    errors = {key: float(np.std(values)) if len(values) > 1 else None for key, values in result.items()}
+    errors['semimajor_axis'] = float(np.std(result['semimajor_axis'][bound])) if bound.sum() > 1 else None
+
+    ra = np.degrees(np.arctan2(radiant[0, 1], radiant[0, 0])) % 360
+    dec = np.degrees(np.arcsin(radiant[0, 2]))
+    return Orbit(
+        radiant_right_ascension=float(ra),
+        radiant_declination=float(dec),
+        geocentric_velocity=float(speed[0]),
+        elements={key: float(values[0]) for key, values in result.items()},
+        errors=errors,
+    )
@@ -0,0 +1,110 @@
+"""
+Association of meteors with meteor showers by their geocentric radiants, speeds and solar longitudes.
+
+A shower is active between two solar longitudes, possibly across 0°. Its radiant moves linearly with the solar longitude
+from the radiant at the peak by the daily drift. A meteor belongs to the active shower whose radiant is closest to its own,
+measured in units of the shower's association radius, if that is within the radius and the geocentric speeds agree
+within the relative tolerance. Other meteors are sporadic. Shower radiants are J2000, meteor radiants are stored
+for the equinox of date, the difference of a few tenths of a degree is well within the association radii.
+
+The index precomputes, for every whole degree of solar longitude, which showers can be active within it. Meteors are
+sorted into the same buckets, and each bucket is matched against its few candidate showers with one vectorized
+computation, so classifying n meteors costs O(n log n) plus O(n k) with k showers per bucket.
+"""
+
+import numpy as np
+
+
+BUCKETS = 360
+RADIUS = 5.0                    # degrees, default association radius
+VELOCITY_TOLERANCE = 0.2        # relative to the geocentric speed of the shower
+
+
+def unit(ra, dec):
+    """ Unit vectors (..., 3) of equatorial coordinates in degrees """
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def offset(longitude, reference):
+    """ Signed difference of solar longitudes in degrees, in [-180, 180) """
+    return (np.asarray(longitude) - reference + 180) % 360 - 180
+
+
+class ShowerIndex():
+    """
+    Showers as parallel arrays: <ids>, radiant at the peak and its drift in degrees per degree of solar longitude,
+    solar longitudes of the peak, start and end of activity, geocentric speed (m/s, NaN if unknown),
+    association radius (degrees) and relative speed tolerance.
+    """
+    def __init__(self, ids, ra, dec, drift_ra, drift_dec, peak, start, end, velocity, radius, tolerance):
+        self.ids = np.asarray(ids, dtype=int)
+        self.ra = np.asarray(ra, dtype=float)
+        self.dec = np.asarray(dec, dtype=float)
+        self.drift_ra = np.asarray(drift_ra, dtype=float)
+        self.drift_dec = np.asarray(drift_dec, dtype=float)
+        self.peak = np.asarray(peak, dtype=float)
+        self.start = np.asarray(start, dtype=float)
+        self.end = np.asarray(end, dtype=float)
+        self.velocity = np.asarray(velocity, dtype=float)
+        self.radius = np.asarray(radius, dtype=float)
+        self.tolerance = np.asarray(tolerance, dtype=float)
+
+        # A shower is a candidate in every bucket that overlaps its activity, the exact window is checked when matching
+        length = (self.end - self.start) % 360
+        first = np.floor(self.start).astype(int)
+        last = np.floor(self.start + length).astype(int)
+        self.buckets = [[] for _ in range(BUCKETS)]
+        for shower, (begin, end) in enumerate(zip(first.tolist(), last.tolist())):
+            for bucket in range(begin, end + 1):
+                self.buckets[bucket % BUCKETS].append(shower)
+        self.buckets = [np.array(candidates, dtype=int) for candidates in self.buckets]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def active(self, showers, longitude):
+        """ Whether each of <showers> is active at the corresponding solar <longitude> """
+        return (longitude - self.start[showers]) % 360 <= (self.end[showers] - self.start[showers]) % 360
+
+    def radiants(self, showers, longitude):
+        """ Unit vectors of the radiants of <showers> drifted to solar <longitude> """
+        shift = offset(longitude, self.peak[showers])
+        return unit(self.ra[showers] + self.drift_ra[showers] * shift, self.dec[showers] + self.drift_dec[showers] * shift)
+
+    def match(self, longitude, ra, dec, velocity):
+        """
+        Shower ids for meteors given as parallel arrays of solar longitude, geocentric radiant (degrees)
+        and geocentric speed (m/s, NaN if unknown), -1 for sporadic meteors
+        """
+        longitude = np.asarray(longitude, dtype=float) % 360
+        velocity = np.asarray(velocity, dtype=float)
+        radiants = unit(ra, dec)
+        result = np.full(len(longitude), -1)
+        if len(self) == 0:
+            return result
+
+        buckets = np.floor(longitude).astype(int) % BUCKETS
+        order = np.argsort(buckets, kind='stable')
+        bounds = np.searchsorted(buckets[order], np.arange(BUCKETS + 1))
+
+        for bucket, candidates in enumerate(self.buckets):
+            meteors = order[bounds[bucket]:bounds[bucket + 1]]
+            if len(meteors) == 0 or len(candidates) == 0:
+                continue
+
+            # Meteors × candidate showers
+            lon = longitude[meteors, None]
+            cosine = np.einsum('mk,mnk->mn', radiants[meteors], self.radiants(candidates[None, :], lon))
+            distance = np.degrees(np.arccos(np.clip(cosine, -1, 1))) / self.radius[candidates]
+            expected = self.velocity[candidates]
+            speed = np.abs(velocity[meteors, None] - expected) <= self.tolerance[candidates] * expected
+            unknown = np.isnan(velocity[meteors, None]) | np.isnan(expected)
+
+            valid = self.active(candidates[None, :], lon) & (distance <= 1) & (speed | unknown)
+            distance = np.where(valid, distance, np.inf)
+            best = np.argmin(distance, axis=1)
+            found = np.isfinite(distance[np.arange(len(meteors)), best])
+            result[meteors[found]] = self.ids[candidates[best[found]]]
+
+        return result
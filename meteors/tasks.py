@@ -1,8 +1,14 @@
+import datetime
+
 from celery import shared_task
 
-from .models import Meteor
+from django.utils import timezone
+
+from .models import Meteor, Sighting
+
 
 @shared_task
-def createMeteor():
-    meteor = Meteor.objects.create_random()
-    meteor.save()
+def associate_recent_sightings(hours=2):
+    """ Catch sightings that were received simultaneously from several stations and missed each other """
+    since = timezone.now() - datetime.timedelta(hours=hours)
+    return Meteor.objects.associate(Sighting.objects.filter(timestamp__gte=since))
@@ -1,3 +1,856 @@
-from django.test import TestCase
+import io
+import tempfile
+import datetime
+import numpy as np
 
-# Create your tests here.
+from unittest.mock import patch
+from xml.etree.ElementTree import iterparse
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+import core.loader
+from core import astronomy
+from core.pagination import KeysetPaginator
+from meteors import association, orbit, showers, triangulation, ufocapture
+from meteors.views import sighting as sighting_views
+from meteors.models import Meteor, Sighting, Snapshot, Frame, Trajectory, Shower
+from meteors.models.meteor import MeteorManager, meteor_name
+from stations.models import Country, Subnetwork, Station
+
+
+STATIONS = [(48.37, 17.27), (48.73, 19.15), (48.95, 18.20), (49.16, 20.28), (48.15, 17.10), (47.90, 18.60)]
+
+
+def observe(latitude, longitude, points):
+    """ Altitudes and azimuths of geocentric <points> from an observer at 300 m """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    east = np.array([-np.sin(lon), np.cos(lon), 0])
+    north = np.array([-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon), np.cos(lat)])
+    up = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    rays = points - association.positions(latitude, longitude, 300.0)
+    rays /= np.linalg.norm(rays, axis=1)[:, None]
+    return np.degrees(np.arcsin(rays @ up)), np.degrees(np.arctan2(rays @ east, rays @ north)) % 360
+
+
+def simulate(count, duration, rng):
+    """
+    Random meteors over the stations, falling from 90-120 km to 60-85 km, seen with 0.1° errors by every station
+    that has them higher than 15° above the horizon. Returns a list of (time, station, meteor, altitudes, azimuths).
+    """
+    latitudes, longitudes = np.array(STATIONS).T
+    sightings = []
+    for meteor, time in enumerate(np.sort(rng.uniform(0, duration, count))):
+        latitude = rng.uniform(latitudes.min() - 1, latitudes.max() + 1)
+        longitude = rng.uniform(longitudes.min() - 1.5, longitudes.max() + 1.5)
+        heading, length = rng.uniform(0, 2 * np.pi), rng.uniform(20e3, 80e3)
+        steps = np.array([0, 0.5, 1])
+        points = association.positions(
+            latitude + steps * length * np.cos(heading) / 111e3,
+            longitude + steps * length * np.sin(heading) / (111e3 * np.cos(np.radians(latitude))),
+            rng.uniform(90e3, 120e3) + steps * (rng.uniform(60e3, 85e3) - 105e3),
+        )
+        for station, (station_latitude, station_longitude) in enumerate(STATIONS):
+            altitude, azimuth = observe(station_latitude, station_longitude, points)
+            if altitude.min() > 15:
+                sightings.append((
+                    time + rng.uniform(-1, 1), station, meteor,
+                    altitude + rng.normal(0, 0.1, 3), azimuth + rng.normal(0, 0.1, 3) / np.cos(np.radians(altitude)),
+                ))
+    return sorted(sightings, key=lambda sighting: sighting[0])
+
+
+class AssociationTest(SimpleTestCase):
+    """ The sweep must recover simulated multi-station meteors """
+    def observations(self, sightings):
+        stations = np.array([sighting[1] for sighting in sightings])
+        latitudes, longitudes = np.array(STATIONS)[stations].T
+        altitudes = np.array([sighting[3] for sighting in sightings])
+        azimuths = np.array([sighting[4] for sighting in sightings])
+        rays = np.stack([association.directions(latitudes, longitudes, altitudes[:, k], azimuths[:, k]) for k in range(3)], axis=1)
+        return association.Observations(
+            [sighting[0] for sighting in sightings], stations, np.zeros(len(sightings)), np.full(len(sightings), -1),
+            latitudes, longitudes, np.full(len(sightings), 300.0), rays,
+        )
+
+    def pairs(self, labels):
+        """ Set of pairs of sightings that share a label """
+        return {(i, j) for i in range(len(labels)) for j in range(i + 1, len(labels)) if labels[i] >= 0 and labels[i] == labels[j]}
+
+    def test_recovers_meteors(self):
+        sightings = simulate(300, 6 * 3600, np.random.default_rng(1))
+        labels = self.observations(sightings).cluster()
+
+        found = self.pairs(labels)
+        true = self.pairs([sighting[2] for sighting in sightings])
+        self.assertGreater(len(found & true) / len(found), 0.98)
+        self.assertGreater(len(found & true) / len(true), 0.95)
+
+    def test_one_sighting_per_station(self):
+        sightings = simulate(300, 600, np.random.default_rng(2))
+        observations = self.observations(sightings)
+        labels = observations.cluster()
+        for label in np.unique(labels):
+            stations = observations.stations[labels == label]
+            self.assertEqual(len(stations), len(set(stations)))
+
+    def test_existing_meteors_stay(self):
+        sightings = simulate(50, 3600, np.random.default_rng(3))
+        observations = self.observations(sightings)
+        observations.meteors[:] = 7
+        labels = observations.cluster()
+        self.assertEqual(len(np.unique(labels)), 1)
+
+
+class NetworkTestCase(TestCase):
+    """ A subnetwork with the simulated stations """
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name='Slovakia')
+        cls.subnetwork = Subnetwork.objects.create(code='SK', name='Slovakia', timezone='Europe/Bratislava')
+        cls.stations = [
+            Station.objects.create(
+                code=f'S{index}', name=f'Station {index}', subnetwork=cls.subnetwork, country=country,
+                latitude=latitude, longitude=longitude, altitude=300, timezone='Europe/Bratislava', on=True,
+            )
+            for index, (latitude, longitude) in enumerate(STATIONS)
+        ]
+        cls.start = datetime.datetime(2021, 8, 12, 22, tzinfo=datetime.timezone.utc)
+
+
+class AssociateTest(NetworkTestCase):
+    """ Meteor.objects.associate creates meteors from new sightings and extends existing ones """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.sightings = simulate(20, 3600, np.random.default_rng(4))
+
+    def create(self, sightings):
+        return Sighting.objects.bulk_create([
+            Sighting(
+                station=self.stations[station], timestamp=self.start + datetime.timedelta(seconds=time),
+                first_altitude=altitude[0], first_azimuth=azimuth[0], altitude=altitude[1], azimuth=azimuth[1],
+                last_altitude=altitude[2], last_azimuth=azimuth[2],
+            )
+            for time, station, meteor, altitude, azimuth in sightings
+        ])
+
+    def test_bulk_and_incremental(self):
+        # The last sighting of a meteor seen from more than one station is received last, so it always has a partner
+        index = max(i for i, sighting in enumerate(self.sightings) if sum(s[2] == sighting[2] for s in self.sightings) > 1)
+        last = self.sightings[index]
+        earlier = self.sightings[:index] + self.sightings[index + 1:]
+        self.create(earlier)
+
+        count = Meteor.objects.associate(Sighting.objects.all())
+        meteors = {sighting[2] for sighting in earlier if sum(s[2] == sighting[2] for s in earlier) > 1}
+        self.assertEqual(Meteor.objects.count(), len(meteors))
+        self.assertEqual(Sighting.objects.filter(meteor__isnull=False).count(), count)
+        for meteor in Meteor.objects.all():
+            self.assertEqual(meteor.sighting_count, meteor.sightings.count())
+            self.assertEqual(meteor.subnetwork, self.subnetwork)
+
+        # Running again changes nothing
+        self.assertEqual(Meteor.objects.associate(Sighting.objects.all()), 0)
+
+        sighting, = self.create([last])
+        partners = [s for s in earlier if s[2] == last[2]]
+        self.assertEqual(Meteor.objects.associate_sighting(sighting), 1 if len(partners) > 1 else 2)
+        sighting.refresh_from_db()
+        self.assertIsNotNone(sighting.meteor)
+        self.assertEqual(sighting.meteor.sighting_count, len(partners) + 1)
+
+    def test_concurrent(self):
+        """ Sightings assigned by another association after they were loaded must keep their meteor """
+        meteor = next(m for m in range(20) if sum(s[2] == m for s in self.sightings) == 2)
+        first, second = self.create([s for s in self.sightings if s[2] == meteor])
+        other = Meteor.objects.create(name='other', timestamp=self.start, subnetwork=self.subnetwork)
+
+        load_arrays = core.loader.load_arrays
+
+        def claim(*args, **kwargs):
+            data = load_arrays(*args, **kwargs)
+            Sighting.objects.filter(id=first.id).update(meteor=other)
+            return data
+
+        with patch('core.loader.load_arrays', side_effect=claim):
+            self.assertEqual(Meteor.objects.associate(Sighting.objects.all()), 0)
+
+        # The new meteor of the pair is left with the second sighting only and is dropped
+        self.assertEqual(list(Meteor.objects.all()), [other])
+        self.assertEqual(list(Sighting.objects.filter(meteor=other)), [first])
+        second.refresh_from_db()
+        self.assertIsNone(second.meteor)
+
+
+    def test_name_collision(self):
+        """ A meteor created concurrently from the same first sighting is joined instead of failing on its name """
+        meteor = next(m for m in range(20) if sum(s[2] == m for s in self.sightings) >= 3)
+        sightings = self.create([s for s in self.sightings if s[2] == meteor])
+        first = min(sightings, key=lambda sighting: sighting.timestamp)
+
+        load_arrays = core.loader.load_arrays
+
+        def claim(*args, **kwargs):
+            data = load_arrays(*args, **kwargs)
+            other = Meteor.objects.create(name=meteor_name('SK', first.timestamp), timestamp=first.timestamp, subnetwork=self.subnetwork)
+            Sighting.objects.filter(id=first.id).update(meteor=other)
+            return data
+
+        with patch('core.loader.load_arrays', side_effect=claim):
+            self.assertEqual(Meteor.objects.associate(Sighting.objects.all()), len(sightings) - 1)
+
+        other = Meteor.objects.get()
+        self.assertEqual(other.sightings.count(), len(sightings))
+        self.assertEqual(other.sighting_count, len(sightings))
+
+
+class SightingIngestTest(NetworkTestCase):
+    """ A received sighting is associated only after it has been committed """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def receive(self):
+        return Sighting.objects.create_from_POST(
+            'S0', meta={'timestamp': '2021-08-12 22:15:31.700000'}, files={'xml': SimpleUploadedFile('record.xml', RECORD)},
+        )
+
+    def test_after_commit(self):
+        with patch.object(MeteorManager, 'associate_sighting', autospec=True) as associate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                sighting = self.receive()
+            associate.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+            associate.assert_called_once_with(Meteor.objects, sighting)
+
+    def test_failed_association(self):
+        with patch.object(MeteorManager, 'associate_sighting', autospec=True, side_effect=IntegrityError("duplicate key")):
+            with self.captureOnCommitCallbacks(execute=True):
+                sighting = self.receive()
+        self.assertTrue(Sighting.objects.filter(id=sighting.id).exists())
+        self.assertEqual(sighting.frames.count(), 4)
+
+
+class DateFilterPlanTest(TestCase):
+    """ Date and night filters must be plain timestamp ranges that can be answered from an index """
+    DAYS = 200
+    PER_DAY = 500
+    DATE = datetime.date(2021, 8, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        # Rows are appended in time order, like the real data the BRIN indexes are made for
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO meteors_meteor (name, "timestamp", sighting_count, snapshot_count)
+                SELECT 'M' || g, TIMESTAMPTZ '2021-03-01 00:00+00' + MAKE_INTERVAL(secs => 86400.0 / %(per_day)s * g), 0, 0
+                FROM generate_series(1, %(count)s) g
+            """, {'count': cls.DAYS * cls.PER_DAY, 'per_day': cls.PER_DAY})
+            cursor.execute("""
+                INSERT INTO meteors_sighting ("timestamp", meteor_id, frame_count)
+                SELECT "timestamp", id, 0 FROM meteors_meteor ORDER BY "timestamp"
+            """)
+            cursor.execute("""
+                INSERT INTO meteors_snapshot ("timestamp", meteor_id, "order")
+                SELECT "timestamp", id, 0 FROM meteors_meteor ORDER BY "timestamp"
+            """)
+            cursor.execute("ANALYZE meteors_meteor, meteors_sighting, meteors_snapshot")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn(f'Seq Scan on {queryset.model._meta.db_table}', plan)
+
+    def test_sightings_for_date(self):
+        queryset = Sighting.objects.for_date(self.DATE)
+        self.assertEqual(queryset.count(), self.PER_DAY)
+        self.assertUsesIndex(queryset, 'sighting_timestamp_brin')
+
+    def test_sightings_for_night(self):
+        self.assertUsesIndex(Sighting.objects.for_night(self.DATE), 'sighting_timestamp_brin')
+
+    def test_meteors_for_date(self):
+        queryset = Meteor.objects.for_date(self.DATE)
+        self.assertEqual(queryset.count(), self.PER_DAY)
+        self.assertUsesIndex(queryset, 'meteor_timestamp')
+
+    def test_meteors_for_night(self):
+        self.assertUsesIndex(Meteor.objects.for_night(self.DATE), 'meteor_timestamp')
+
+    def test_snapshots_by_time(self):
+        start = datetime.datetime(2021, 8, 12, tzinfo=datetime.timezone.utc)
+        queryset = Snapshot.objects.filter(timestamp__gte=start, timestamp__lt=start + datetime.timedelta(days=1))
+        self.assertUsesIndex(queryset, 'snapshot_timestamp_brin')
+
+    def test_half_open(self):
+        midnight = datetime.datetime.combine(self.DATE, datetime.time(), tzinfo=datetime.timezone.utc)
+        next_midnight = midnight + datetime.timedelta(days=1)
+        self.assertTrue(Meteor.objects.for_date(self.DATE).filter(timestamp=midnight).exists())
+        self.assertFalse(Meteor.objects.for_date(self.DATE).filter(timestamp=next_midnight).exists())
+        self.assertEqual(
+            Meteor.objects.for_date(self.DATE).count() + Meteor.objects.for_date(self.DATE + datetime.timedelta(days=1)).count(),
+            Meteor.objects.filter(timestamp__gte=midnight, timestamp__lt=next_midnight + datetime.timedelta(days=1)).count(),
+        )
+
+
+def fly(start, velocity, times, rng, error=0.02):
+    """
+    Frames of a meteor moving from geocentric <start> with <velocity> (m/s), as seen from the first three stations
+    at <times> (s) offset by a random clock error, with <error>° noise. Returns a list of (station, times, altitudes, azimuths).
+    """
+    sightings = []
+    for station, (latitude, longitude) in enumerate(STATIONS[:3]):
+        shifted = times + rng.uniform(0, 0.04)
+        altitude, azimuth = observe(latitude, longitude, start + shifted[:, None] * velocity)
+        sightings.append((station, shifted, altitude + rng.normal(0, error, len(times)), azimuth + rng.normal(0, error, len(times)) / np.cos(np.radians(altitude))))
+    return sightings
+
+
+class TriangulationTest(SimpleTestCase):
+    """ The solver must recover a simulated straight trajectory """
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        self.start = association.positions(48.6, 18.5, 105e3)
+        up = self.start / np.linalg.norm(self.start)
+        east = np.cross([0, 0, 1], up)
+        east /= np.linalg.norm(east)
+        self.velocity = 40e3 * (0.8 * east - 0.6 * up)
+        self.sightings = fly(self.start, self.velocity, np.arange(0, 1.2, 0.04), rng)
+
+    def solve(self, sightings):
+        stations = association.positions(*np.array(STATIONS)[[station for station, *rest in sightings]].T, 300.0)
+        times = np.concatenate([sighting[1] for sighting in sightings])
+        indices = np.concatenate([np.full(len(sighting[1]), index) for index, sighting in enumerate(sightings)])
+        latitudes, longitudes = np.array(STATIONS)[[sightings[index][0] for index in indices]].T
+        rays = association.directions(latitudes, longitudes, np.concatenate([s[2] for s in sightings]), np.concatenate([s[3] for s in sightings]))
+        return triangulation.solve(times, indices, stations, rays, np.zeros(len(times)))
+
+    def test_speed_and_direction(self):
+        solution = self.solve(self.sightings)
+        self.assertAlmostEqual(solution.speed(), 40e3, delta=400)
+        cosine = solution.velocity @ self.velocity / (solution.speed() * 40e3)
+        self.assertGreater(cosine, np.cos(np.radians(0.5)))
+        self.assertLess(np.degrees(solution.residual), 0.05)
+
+    def test_positions(self):
+        solution = self.solve(self.sightings)
+        expected = self.start + solution.times[:, None] * self.velocity
+        self.assertLess(np.linalg.norm(solution.positions - expected, axis=1).max(), 500)
+        latitudes, longitudes, altitudes = solution.geodetic()
+        self.assertAlmostEqual(altitudes[0], 105e3, delta=1000)
+
+    def test_two_stations(self):
+        self.assertAlmostEqual(self.solve(self.sightings[:2]).speed(), 40e3, delta=800)
+
+    def test_one_station(self):
+        with self.assertRaises(triangulation.TrajectoryError):
+            self.solve(self.sightings[:1])
+
+
+# A record with two objects, the second one is the meteor. Its third frame has no magnitude.
+RECORD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ufoanalyzer_record y="2021" mo="8" d="13" h="0" m="15" s="30.50" tz="2" fps="25" cx="1280" cy="960">
+  <ua2_objects>
+    <ua2_object fs="10" fe="11" sN="2">
+      <ua2_objpath>
+        <ua2_fdata2 fno="10" x="100.2" y="200.7" az="10.0" ev="20.0" mag="3.0" />
+        <ua2_fdata2 fno="11" x="101.0" y="201.0" az="10.1" ev="20.1" mag="3.1" />
+      </ua2_objpath>
+    </ua2_object>
+    <ua2_object fs="30" fe="34" sN="4">
+      <ua2_objpath>
+        <ua2_fdata2 fno="30" x="640.0" y="480.0" az="120.00" ev="45.00" mag="1.5" />
+        <ua2_fdata2 fno="31" x="650.4" y="470.6" az="120.50" ev="44.60" mag="0.2" />
+        <ua2_fdata2 fno="32" x="661.0" y="461.0" az="121.00" ev="44.20" />
+        <ua2_fdata2 fno="34" x="682.0" y="442.0" az="122.00" ev="43.40" mag="2.5" />
+      </ua2_objpath>
+    </ua2_object>
+  </ua2_objects>
+</ufoanalyzer_record>
+"""
+
+
+class UFOCaptureTest(SimpleTestCase):
+    """ UFOAnalyzer records are parsed into the track of their longest object """
+    def test_parse(self):
+        track = ufocapture.parse(io.BytesIO(RECORD))
+        self.assertEqual(track.start, datetime.datetime(2021, 8, 12, 22, 15, 30, 500000, tzinfo=datetime.timezone.utc))
+        self.assertEqual(track.fno.tolist(), [30, 31, 32, 34])
+        self.assertEqual(track.azimuth.tolist(), [120.0, 120.5, 121.0, 122.0])
+        np.testing.assert_array_equal(track.magnitude, [1.5, 0.2, np.nan, 2.5])
+        self.assertEqual(track.timestamps()[0], np.datetime64('2021-08-12T22:15:31.700000'))
+        self.assertEqual(track.timestamps()[-1], np.datetime64('2021-08-12T22:15:31.860000'))
+
+        speed = track.angular_speed()
+        self.assertTrue(np.isnan(speed[0]))
+        # Two frames between the last two positions
+        self.assertAlmostEqual(speed[3], speed[2], delta=0.5)
+
+    def test_detached(self):
+        elements = []
+
+        def recording(*args, **kwargs):
+            for event, element in iterparse(*args, **kwargs):
+                elements.append(element)
+                yield event, element
+
+        with patch('meteors.ufocapture.iterparse', recording):
+            ufocapture.parse(io.BytesIO(RECORD))
+        # Only the record and the container of the objects remain in the tree
+        self.assertEqual(len(list(elements[0].iter())), 2)
+
+    def test_truncated(self):
+        with self.assertRaisesRegex(ufocapture.RecordError, "Malformed XML"):
+            ufocapture.parse(io.BytesIO(RECORD[:len(RECORD) // 2]))
+
+    def test_missing_attributes(self):
+        with self.assertRaisesRegex(ufocapture.RecordError, "Invalid frame"):
+            ufocapture.parse(io.BytesIO(RECORD.replace(b'fno="31" ', b'')))
+        with self.assertRaisesRegex(ufocapture.RecordError, "Invalid clip start time"):
+            ufocapture.parse(io.BytesIO(RECORD.replace(b' mo="8"', b'')))
+        with self.assertRaisesRegex(ufocapture.RecordError, "frame rate"):
+            ufocapture.parse(io.BytesIO(RECORD.replace(b' fps="25"', b'')))
+        with self.assertRaisesRegex(ufocapture.RecordError, "Not a UFOAnalyzer record"):
+            ufocapture.parse(io.BytesIO(b'<record />'))
+
+    def test_no_objects(self):
+        self.assertIsNone(ufocapture.parse(io.BytesIO(b'<ufoanalyzer_record y="2021" mo="8" d="13" h="0" m="15" s="0" fps="25" />')))
+
+
+class FramesFromXMLTest(NetworkTestCase):
+    """ Frame.objects.bulk_create_from_xml stores the frames of a record and updates the summary of the sighting """
+    def test_create(self):
+        sighting = Sighting.objects.create(station=self.stations[0], timestamp=self.start)
+        frames = Frame.objects.bulk_create_from_xml(sighting, io.BytesIO(RECORD))
+        self.assertEqual(len(frames), 4)
+
+        frames = list(sighting.frames.order_by('order'))
+        self.assertEqual([frame.order for frame in frames], [0, 1, 2, 3])
+        self.assertEqual(frames[0].timestamp, datetime.datetime(2021, 8, 12, 22, 15, 31, 700000, tzinfo=datetime.timezone.utc))
+        self.assertEqual((frames[1].x, frames[1].y), (650, 471))
+        self.assertIsNone(frames[2].magnitude)
+        self.assertIsNone(frames[0].angular_speed)
+        self.assertTrue(all(frame.solar_elongation is not None and frame.lunar_elongation is not None for frame in frames))
+
+        sighting.refresh_from_db()
+        self.assertEqual(sighting.frame_count, 4)
+        self.assertEqual((sighting.first_altitude, sighting.last_altitude), (45.0, 43.4))
+        self.assertEqual(sighting.magnitude, 0.2)
+        self.assertEqual(sighting.azimuth, 120.5)
+
+    def test_invalid(self):
+        sighting = Sighting.objects.create(station=self.stations[0], timestamp=self.start)
+        with self.assertRaises(ufocapture.RecordError):
+            Frame.objects.bulk_create_from_xml(sighting, io.BytesIO(RECORD[:200]))
+        self.assertFalse(sighting.frames.exists())
+
+
+class SightingSummaryTest(NetworkTestCase):
+    """ The stored frame summary of a sighting follows its frames """
+    def setUp(self):
+        self.sighting = Sighting.objects.create(station=self.stations[0], timestamp=self.start)
+
+    def frame(self, order, altitude, azimuth, magnitude):
+        return Frame(
+            sighting=self.sighting, order=order, timestamp=self.start + datetime.timedelta(seconds=order / 25),
+            altitude=altitude, azimuth=azimuth, magnitude=magnitude,
+        )
+
+    def assertSummary(self, count, first=None, last=None, brightest=None):
+        self.sighting.refresh_from_db()
+        self.assertEqual(self.sighting.frame_count, count)
+        self.assertEqual((self.sighting.first_altitude, self.sighting.first_azimuth), first or (None, None))
+        self.assertEqual((self.sighting.last_altitude, self.sighting.last_azimuth), last or (None, None))
+        self.assertEqual(self.sighting.magnitude, brightest)
+
+    def test_signals(self):
+        first = self.frame(0, 40.0, 100.0, 1.0)
+        first.save()
+        self.assertSummary(1, (40.0, 100.0), (40.0, 100.0), 1.0)
+        self.assertAlmostEqual(self.sighting.arc_length, 0, places=5)
+
+        brightest = self.frame(1, 41.0, 100.0, -2.0)
+        brightest.save()
+        self.frame(2, 42.0, 100.0, 0.5).save()
+        self.assertSummary(3, (40.0, 100.0), (42.0, 100.0), -2.0)
+        self.assertAlmostEqual(self.sighting.arc_length, 2.0)
+        self.assertEqual(self.sighting.altitude, 41.0)
+
+        brightest.delete()
+        self.assertSummary(2, (40.0, 100.0), (42.0, 100.0), 0.5)
+        first.delete()
+        self.assertSummary(1, (42.0, 100.0), (42.0, 100.0), 0.5)
+        Frame.objects.get().delete()
+        self.assertSummary(0)
+
+    def test_rebuild(self):
+        # Bulk writes bypass the signals
+        Frame.objects.bulk_create([self.frame(order, 30.0 + order, 200.0, 3.0 - order) for order in range(4)])
+        self.assertSummary(0)
+
+        call_command('rebuild_summaries', sightings=True, chunk_size=1, stdout=io.StringIO())
+        self.assertSummary(4, (30.0, 200.0), (33.0, 200.0), 0.0)
+
+
+class MeteorSummaryTest(NetworkTestCase):
+    """ The stored summary of a meteor follows its sightings and snapshots """
+    def setUp(self):
+        self.meteors = [
+            Meteor.objects.create(name=name, timestamp=self.start, subnetwork=self.subnetwork) for name in ['first', 'second']
+        ]
+
+    def counts(self):
+        return [
+            tuple(Meteor.objects.filter(id=meteor.id).values_list('sighting_count', 'snapshot_count').get())
+            for meteor in self.meteors
+        ]
+
+    def test_sightings(self):
+        sightings = [Sighting.objects.create(station=station, meteor=self.meteors[0], timestamp=self.start) for station in self.stations[:3]]
+        self.assertEqual(self.counts(), [(3, 0), (0, 0)])
+
+        # Moving a sighting updates the meteor it left as well as the one it joined
+        sightings[0].meteor = self.meteors[1]
+        sightings[0].save()
+        self.assertEqual(self.counts(), [(2, 0), (1, 0)])
+
+        sightings[1].meteor = None
+        sightings[1].save()
+        self.assertEqual(self.counts(), [(1, 0), (1, 0)])
+
+        sightings[2].delete()
+        self.assertEqual(self.counts(), [(0, 0), (1, 0)])
+
+    def test_snapshots(self):
+        for order, (magnitude, speed) in enumerate([(1.0, 30e3), (-3.0, 29e3), (0.0, 28e3)]):
+            Snapshot.objects.create(
+                meteor=self.meteors[0], order=order, timestamp=self.start + datetime.timedelta(seconds=order / 10),
+                latitude=48.0 + order, longitude=18.0, altitude=100e3 - 5e3 * order,
+                velocity_x=speed, velocity_y=0, velocity_z=0, magnitude=magnitude,
+            )
+
+        meteor = Meteor.objects.get(id=self.meteors[0].id)
+        self.assertEqual(meteor.snapshot_count, 3)
+        self.assertEqual((meteor.magnitude, meteor.latitude, meteor.altitude), (-3.0, 49.0, 95e3))
+        self.assertEqual(meteor.speed, 30e3)
+
+        Snapshot.objects.get(order=1).delete()
+        meteor.refresh_from_db()
+        self.assertEqual((meteor.snapshot_count, meteor.magnitude), (2, 0.0))
+
+    def test_rebuild(self):
+        Sighting.objects.bulk_create([Sighting(station=station, meteor=self.meteors[1], timestamp=self.start) for station in self.stations[:2]])
+        self.assertEqual(self.counts(), [(0, 0), (0, 0)])
+
+        call_command('rebuild_summaries', meteors=True, stdout=io.StringIO())
+        self.assertEqual(self.counts(), [(0, 0), (2, 0)])
+
+
+class MeteorProfileTest(NetworkTestCase):
+    """ The summary loading profile must leave frames and snapshots to the full one """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        meteor = Meteor.objects.create(name='profile', timestamp=cls.start, subnetwork=cls.subnetwork)
+        sightings = Sighting.objects.bulk_create([
+            Sighting(station=station, meteor=meteor, timestamp=cls.start) for station in cls.stations[:2]
+        ])
+        Frame.objects.bulk_create([
+            Frame(sighting=sighting, order=order, timestamp=cls.start, altitude=45, azimuth=90)
+            for sighting in sightings for order in range(3)
+        ])
+        Snapshot.objects.create(
+            meteor=meteor, order=0, timestamp=cls.start, latitude=48.0, longitude=18.0, altitude=100e3,
+            velocity_x=30e3, velocity_y=0, velocity_z=0,
+        )
+
+    def load(self, profile):
+        # Everything that is not prefetched or joined here would be loaded lazily, one query per access
+        meteor, = Meteor.objects.with_profile(profile)
+        with self.assertNumQueries(0):
+            self.assertEqual(meteor.subnetwork, self.subnetwork)
+            self.assertEqual([sighting.station for sighting in meteor.sightings.all()], self.stations[:2])
+        return meteor
+
+    def test_summary(self):
+        with self.assertNumQueries(2):
+            meteor = self.load('summary')
+
+        self.assertNotIn('snapshots', meteor._prefetched_objects_cache)
+        for sighting in meteor.sightings.all():
+            self.assertNotIn('frames', getattr(sighting, '_prefetched_objects_cache', {}))
+
+    def test_full(self):
+        with self.assertNumQueries(4):
+            meteor = self.load('full')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(meteor.snapshots.all()), 1)
+            self.assertEqual([len(sighting.frames.all()) for sighting in meteor.sightings.all()], [3, 3])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            Meteor.objects.with_profile('everything')
+
+
+class KeysetPaginationTest(NetworkTestCase):
+    """ Walking the pages by cursors in either direction must visit every row once, also across equal timestamps """
+    PER_PAGE = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_user('observer')
+        # Ids run against the timestamps so that ties are only broken by the id
+        offsets = [5, 5, 5, 3, 3, 3, 3, 1, 0, 0]
+        Sighting.objects.bulk_create([
+            Sighting(station=cls.stations[index % 3], timestamp=cls.start - datetime.timedelta(hours=12, seconds=offset))
+            for index, offset in enumerate(offsets)
+        ])
+
+    def expected(self, descending):
+        order = ['-timestamp', '-id'] if descending else ['timestamp', 'id']
+        return list(Sighting.objects.order_by(*order).values_list('id', flat=True))
+
+    def forward(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor()))
+        return pages
+
+    def backward(self, paginator, page):
+        pages = [page]
+        while pages[0].has_previous():
+            pages.insert(0, paginator.page(before=pages[0].previous_cursor()))
+        return pages
+
+    def assertPages(self, pages, descending):
+        self.assertEqual([sighting.id for page in pages for sighting in page], self.expected(descending))
+        self.assertTrue(all(len(page) == self.PER_PAGE for page in pages[:-1]))
+        self.assertEqual([page.has_previous() for page in pages], [False] + [True] * (len(pages) - 1))
+        self.assertEqual([page.has_next() for page in pages], [True] * (len(pages) - 1) + [False])
+
+    def test_paginator(self):
+        for descending in [False, True]:
+            with self.subTest(descending=descending):
+                paginator = KeysetPaginator(Sighting.objects.all(), self.PER_PAGE, descending=descending)
+                pages = self.forward(paginator)
+                self.assertPages(pages, descending)
+
+                # Going back from the last page must rebuild the same pages, except that the last one
+                # is reached through a cursor and so knows nothing about rows after it
+                back = self.backward(paginator, pages[-1])
+                self.assertEqual([[s.id for s in page] for page in back], [[s.id for s in page] for page in pages])
+                self.assertEqual([page.has_previous() for page in back], [page.has_previous() for page in pages])
+                self.assertTrue(all(page.has_next() for page in back[:-1]))
+
+    def test_fragments(self):
+        self.client.force_login(self.user)
+        date = (self.start - datetime.timedelta(hours=12)).strftime('%Y-%m-%d')
+
+        with patch.object(sighting_views.ListDateView, 'paginate_by', self.PER_PAGE):
+            response = self.client.get(reverse('list-sightings'), {'date': date})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context['previous_page_url'])
+            ids = [sighting.id for sighting in response.context['sightings']]
+
+            url = response.context['next_fragment_url']
+            while url is not None:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNotNone(response.context['previous_page_url'])
+                ids += [sighting.id for sighting in response.context['sightings']]
+                url = response.json()['next']
+
+        self.assertEqual(ids, self.expected(descending=False))
+
+    def test_invalid_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('list-sightings'), {'after': 'yesterday'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ElongationsTest(NetworkTestCase):
+    """ Vectorized elongations must agree with the per-frame astropy computation of Frame.save """
+    def test_compute(self):
+        rng = np.random.default_rng(3)
+        for station in self.stations[:2]:
+            sighting = Sighting.objects.create(station=station, timestamp=self.start)
+            for order in range(3):
+                Frame.objects.create(
+                    sighting=sighting, order=order, timestamp=self.start + datetime.timedelta(hours=order, seconds=rng.uniform(0, 1)),
+                    altitude=None if order == 2 else rng.uniform(10, 90), azimuth=rng.uniform(0, 360),
+                )
+
+        saved = {frame.id: frame for frame in Frame.objects.all()}
+        Frame.objects.update(solar_elongation=None, lunar_elongation=None)
+        self.assertEqual(Frame.objects.compute_elongations(), 6)
+        self.assertEqual(Frame.objects.without_elongations().count(), 2)
+
+        for frame in Frame.objects.all():
+            expected = saved[frame.id]
+            if frame.altitude is None:
+                self.assertIsNone(frame.solar_elongation)
+                self.assertIsNone(frame.lunar_elongation)
+            else:
+                self.assertAlmostEqual(frame.solar_elongation, expected.solar_elongation, places=6)
+                self.assertAlmostEqual(frame.lunar_elongation, expected.lunar_elongation, places=6)
+
+    def test_queryset(self):
+        sightings = [Sighting.objects.create(station=station, timestamp=self.start) for station in self.stations[:2]]
+        Frame.objects.bulk_create([
+            Frame(sighting=sighting, order=0, timestamp=self.start, altitude=45, azimuth=90) for sighting in sightings
+        ])
+
+        self.assertEqual(Frame.objects.compute_elongations(Frame.objects.filter(sighting=sightings[0])), 1)
+        self.assertEqual(list(Frame.objects.without_elongations()), list(sightings[1].frames.all()))
+
+
+class SolveTrajectoriesTest(NetworkTestCase):
+    """ Meteor.objects.solve_trajectories replaces the snapshots of meteors with a triangulated trajectory """
+    def test_solve(self):
+        rng = np.random.default_rng(7)
+        start = association.positions(48.6, 18.5, 100e3)
+        velocity = 30e3 * association.directions(48.6, 18.5, -40.0, 250.0)
+        meteor = Meteor.objects.create(name='simulated', timestamp=self.start, subnetwork=self.subnetwork)
+        for station, times, altitudes, azimuths in fly(start, velocity, np.arange(0, 1, 0.04), rng):
+            sighting = Sighting.objects.create(station=self.stations[station], meteor=meteor, timestamp=self.start)
+            Frame.objects.bulk_create([
+                Frame(sighting=sighting, order=order, timestamp=self.start + datetime.timedelta(seconds=time), altitude=altitude, azimuth=azimuth, magnitude=0)
+                for order, (time, altitude, azimuth) in enumerate(zip(times.tolist(), altitudes.tolist(), azimuths.tolist()))
+            ])
+
+        meteor.refresh_from_db()
+        self.assertEqual(Meteor.objects.unsolved().get(), meteor)
+        self.assertEqual(Meteor.objects.solve_trajectories(Meteor.objects.unsolved(), processes=1), 1)
+
+        meteor.refresh_from_db()
+        self.assertEqual(meteor.snapshot_count, 75)
+        self.assertAlmostEqual(meteor.speed, 30e3, delta=300)
+        self.assertFalse(Meteor.objects.unsolved().exists())
+
+        # Solving again discards the orbit computed from the previous snapshots
+        Trajectory.objects.create(meteor=meteor, geocentric_velocity=20e3)
+        self.assertFalse(Meteor.objects.without_orbit().exists())
+        self.assertEqual(Meteor.objects.solve_trajectories(Meteor.objects.filter(id=meteor.id), processes=1), 1)
+        self.assertFalse(Trajectory.objects.exists())
+        self.assertEqual(Meteor.objects.without_orbit().get(), meteor)
+
+
+def perseid(time, latitude, longitude, altitude):
+    """ Velocity (m/s, relative to the rotating Earth) at a geodetic point of a Perseid with geocentric radiant 48°, +58° and v_g 59 km/s """
+    jd = astronomy.julian_date(time)
+    position = association.positions(latitude, longitude, altitude)
+    ra, dec = np.radians(48.0), np.radians(58.0)
+    radiant = np.array([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+    speed = np.sqrt(59e3 ** 2 + 2 * orbit.GM_EARTH / np.linalg.norm(position))
+    gst = np.radians(astronomy.sidereal_time(jd))
+    rotation = np.array([[np.cos(gst), -np.sin(gst), 0], [np.sin(gst), np.cos(gst), 0], [0, 0, 1]])
+    # Zenith attraction is not applied, the radiant is high and the correction is below a degree
+    return rotation.T @ (-speed * radiant - np.cross([0, 0, orbit.EARTH_ROTATION], rotation @ position))
+
+
+class OrbitTest(SimpleTestCase):
+    """ Orbits computed from the atmospheric velocity must match the known Perseid orbit """
+    time = datetime.datetime(2021, 8, 12, 23, tzinfo=datetime.timezone.utc)
+
+    def test_perseid(self):
+        velocity = perseid(self.time, 48.6, 17.3, 100e3)
+        result = orbit.determine(astronomy.julian_date(self.time), 48.6, 17.3, 100e3, velocity, clones=500, seed=1)
+        self.assertAlmostEqual(result.geocentric_velocity, 59e3, delta=10)
+        self.assertAlmostEqual(result.radiant_right_ascension, 48.0, delta=1)
+        self.assertAlmostEqual(result.radiant_declination, 58.0, delta=1)
+        self.assertAlmostEqual(result.elements['perihelion_distance'], 0.95, delta=0.01)
+        self.assertAlmostEqual(result.elements['inclination'], 113.5, delta=1)
+        self.assertAlmostEqual(result.elements['argument_of_perihelion'], 151, delta=2)
+        self.assertAlmostEqual(result.elements['longitude_of_ascending_node'], 140.1, delta=0.1)
+        self.assertGreater(result.elements['eccentricity'], 0.85)
+        self.assertGreater(result.errors['semimajor_axis'], 0)
+        self.assertLess(result.errors['inclination'], 2)
+
+    def test_elements_circular(self):
+        elements = orbit.elements(np.array([1.0, 0, 0]), np.array([0, orbit.GAUSS, 0]))
+        self.assertAlmostEqual(float(elements['semimajor_axis']), 1)
+        self.assertAlmostEqual(float(elements['eccentricity']), 0)
+        self.assertAlmostEqual(float(elements['inclination']), 0)
+
+
+class ComputeOrbitsTest(NetworkTestCase):
+    """ Meteor.objects.compute_orbits stores an orbit for every meteor with snapshots """
+    def test_compute(self):
+        time = OrbitTest.time
+        velocity = perseid(time, 48.6, 17.3, 100e3)
+        meteor = Meteor.objects.create(name='perseid', timestamp=time, subnetwork=self.subnetwork)
+        Meteor.objects.create(name='unsolved', timestamp=time, subnetwork=self.subnetwork)
+        Snapshot.objects.create(
+            meteor=meteor, order=0, timestamp=time, latitude=48.6, longitude=17.3, altitude=100e3,
+            velocity_x=velocity[0], velocity_y=velocity[1], velocity_z=velocity[2],
+        )
+
+        self.assertEqual(Meteor.objects.without_orbit().get(), meteor)
+        self.assertEqual(Meteor.objects.compute_orbits(Meteor.objects.all(), clones=100, processes=1), 1)
+        self.assertFalse(Meteor.objects.without_orbit().exists())
+
+        trajectory = Trajectory.objects.get(meteor=meteor)
+        self.assertAlmostEqual(trajectory.inclination, 113.5, delta=1)
+        self.assertIsNotNone(trajectory.semimajor_axis_error)
+
+        # Computing again replaces the orbit
+        self.assertEqual(Meteor.objects.compute_orbits(Meteor.objects.all(), clones=100, processes=1), 1)
+        self.assertEqual(Trajectory.objects.count(), 1)
+
+
+class ShowerIndexTest(SimpleTestCase):
+    """ Meteors match the closest active shower within its radius and speed tolerance """
+    def setUp(self):
+        # A shower active across 0° of solar longitude with a drifting radiant, and a slow one without known speed
+        self.index = showers.ShowerIndex(
+            ids=[7, 8], ra=[100, 200], dec=[20, -10], drift_ra=[1, 0], drift_dec=[0, 0],
+            peak=[0, 180], start=[350, 170], end=[10, 190], velocity=[40e3, np.nan], radius=[3, 5], tolerance=[0.1, 0.1],
+        )
+
+    def test_buckets(self):
+        self.assertEqual(self.index.buckets[355].tolist(), [0])
+        self.assertEqual(self.index.buckets[10].tolist(), [0])
+        self.assertEqual(self.index.buckets[11].tolist(), [])
+        self.assertEqual(self.index.buckets[180].tolist(), [1])
+
+    def test_match(self):
+        result = self.index.match(
+            longitude=[355, 5, 5, 5, 20, 180, 180],
+            ra=[95, 105, 105, 105, 120, 202, 230],
+            dec=[20, 20, 20, 20, 20, -10, -10],
+            velocity=[40e3, 41e3, 50e3, np.nan, 40e3, 20e3, 20e3],
+        )
+        self.assertEqual(result.tolist(), [7, 7, -1, 7, -1, 8, -1])
+
+    def test_empty(self):
+        index = showers.ShowerIndex(*[[]] * 11)
+        self.assertEqual(index.match([10], [100], [20], [40e3]).tolist(), [-1])
+
+
+class AssociateShowersTest(NetworkTestCase):
+    """ Meteor.objects.associate_showers assigns meteors with orbits to the showers added by the migrations """
+    def test_perseid(self):
+        time = OrbitTest.time
+        perseid = Meteor.objects.create(name='perseid', timestamp=time, subnetwork=self.subnetwork)
+        sporadic = Meteor.objects.create(name='sporadic', timestamp=time, subnetwork=self.subnetwork, source=Shower.objects.get(code='PER'))
+        unsolved = Meteor.objects.create(name='unsolved', timestamp=time, subnetwork=self.subnetwork, source=Shower.objects.get(code='GEM'))
+        Trajectory.objects.create(meteor=perseid, radiant_right_ascension=48.5, radiant_declination=57.5, geocentric_velocity=58e3)
+        Trajectory.objects.create(meteor=sporadic, radiant_right_ascension=200, radiant_declination=10, geocentric_velocity=30e3)
+
+        self.assertEqual(Meteor.objects.associate_showers(Meteor.objects.all()), 2)
+        self.assertEqual(Meteor.objects.get(id=perseid.id).source.code, 'PER')
+        self.assertIsNone(Meteor.objects.get(id=sporadic.id).source)
+        self.assertEqual(Meteor.objects.get(id=unsolved.id).source.code, 'GEM')
+        self.assertEqual(Meteor.objects.associate_showers(Meteor.objects.all()), 0)
@@ -0,0 +1,161 @@
+"""
+Straight-line meteor trajectories from the frames of two or more sightings.
+
+Every sighting defines a plane through its station that best contains its lines of sight: the normal is the eigenvector
+of the smallest eigenvalue of the 3x3 scatter matrix of the directions, computed for all sightings in one batched call.
+The trajectory is the least-squares intersection of the planes. Each frame is then placed on the trajectory
+at the point closest to its line of sight, and a linear fit of these positions against time gives the speed.
+
+Frames taken at the same instant by several stations are merged into one snapshot. Positions are geocentric cartesian
+coordinates in metres, velocities in metres per second, magnitudes are reduced to a range of 100 km.
+
+The functions here only use NumPy and astropy, so they can run in worker processes without a database connection.
+"""
+
+import numpy as np
+
+from astropy.coordinates import EarthLocation
+from astropy import units
+
+
+MIN_CONVERGENCE = np.sin(np.radians(3))     # smallest angle between two observation planes
+MIN_HEIGHT = 10e3                           # m
+MAX_HEIGHT = 250e3                          # m
+MIN_SPEED = 10e3                            # m/s
+MAX_SPEED = 75e3                            # m/s
+REFERENCE_RANGE = 100e3                     # m, for absolute magnitudes
+
+
+class TrajectoryError(ValueError):
+    pass
+
+
+class Solution():
+    """ Snapshots of a solved trajectory as parallel arrays, plus the quality of the fit """
+    def __init__(self, times, positions, velocity, magnitudes, residual, convergence):
+        self.times = times
+        self.positions = positions
+        self.velocity = velocity
+        self.magnitudes = magnitudes
+        self.residual = residual
+        self.convergence = convergence
+
+    def __len__(self):
+        return len(self.times)
+
+    def speed(self):
+        return float(np.linalg.norm(self.velocity))
+
+    def geodetic(self):
+        """ Latitudes, longitudes (degrees) and altitudes (metres) of the snapshots """
+        location = EarthLocation.from_geocentric(*self.positions.T, unit=units.m)
+        longitude, latitude, height = location.to_geodetic()
+        return latitude.to_value(units.deg), longitude.to_value(units.deg), height.to_value(units.m)
+
+
+def planes(sightings, rays, count):
+    """ Unit normals (count, 3) of the planes best containing the <rays> of each sighting, <sightings> are their sighting indices """
+    scatter = np.zeros((count, 3, 3))
+    np.add.at(scatter, sightings, rays[:, :, None] * rays[:, None, :])
+    values, vectors = np.linalg.eigh(scatter)
+    return vectors[:, :, 0]
+
+
+def intersection(normals, stations):
+    """ Point and unit direction of the line closest to all planes through <stations> with <normals> """
+    values, vectors = np.linalg.eigh(normals.T @ normals)
+    direction = vectors[:, 0]
+    # The planes fix the line up to a shift along itself, pin it near the stations
+    matrix = np.vstack([normals, direction])
+    target = np.concatenate([np.einsum('ij,ij->i', normals, stations), [direction @ stations.mean(axis=0)]])
+    point = np.linalg.lstsq(matrix, target, rcond=None)[0]
+    return point, direction
+
+
+def convergence(normals):
+    """ Sine of the largest angle between any two planes """
+    crossed = np.cross(normals[:, None, :], normals[None, :, :])
+    return float(np.linalg.norm(crossed, axis=2).max())
+
+
+def closest(point, direction, origins, rays):
+    """ Parameters along the line (point, direction) of its points closest to the lines of sight, and ranges along the lines of sight """
+    offset = point - origins
+    cosine = rays @ direction
+    along = offset @ direction
+    across = np.einsum('ij,ij->i', rays, offset)
+    denominator = 1 - cosine ** 2
+    return (cosine * across - along) / denominator, (across - cosine * along) / denominator
+
+
+def solve(times, sightings, stations, rays, magnitudes):
+    """
+    Solve the trajectory from frames given as parallel arrays: <times> in seconds, <sightings> indices into <stations>
+    (geocentric positions of the observing stations, shape (k, 3)), <rays> geocentric unit lines of sight and apparent <magnitudes>.
+    Returns a Solution or raises TrajectoryError.
+    """
+    valid = np.isfinite(times) & np.isfinite(rays).all(axis=1)
+    times, sightings, rays, magnitudes = times[valid], sightings[valid], rays[valid], magnitudes[valid]
+
+    count = len(stations)
+    if len(np.unique(sightings)) < 2:
+        raise TrajectoryError("At least two sightings with frames are needed")
+
+    normals = planes(sightings, rays, count)
+    used = np.bincount(sightings, minlength=count) >= 2
+    normals, planar_stations = normals[used], stations[used]
+    if len(normals) < 2:
+        raise TrajectoryError("At least two sightings with two frames each are needed")
+
+    sine = convergence(normals)
+    if sine < MIN_CONVERGENCE:
+        raise TrajectoryError(f"Observation planes converge at only {np.degrees(np.arcsin(sine)):.1f}°")
+
+    point, direction = intersection(normals, planar_stations)
+    origins = stations[sightings]
+    position, distance = closest(point, direction, origins, rays)
+
+    reference = times.min()
+    slope, offset = np.polyfit(times - reference, position, 1)
+    if slope < 0:
+        direction, position, slope, offset = -direction, -position, -slope, -offset
+
+    # Angular distance of every line of sight from the point it was matched to on the trajectory
+    points = point + position[:, None] * direction
+    sight = points - origins
+    sight /= np.linalg.norm(sight, axis=1)[:, None]
+    residual = float(np.sqrt(np.mean(np.arccos(np.clip(np.einsum('ij,ij->i', sight, rays), -1, 1)) ** 2)))
+
+    # Merge frames taken within the same millisecond
+    keys, inverse = np.unique(np.round((times - reference) * 1000).astype(np.int64), return_inverse=True)
+    frames = np.bincount(inverse)
+    mean_position = np.bincount(inverse, weights=position) / frames
+    absolute = magnitudes - 5 * np.log10(np.abs(distance) / REFERENCE_RANGE)
+    known = np.isfinite(absolute)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_magnitude = np.bincount(inverse[known], weights=absolute[known], minlength=len(keys)) / np.bincount(inverse[known], minlength=len(keys))
+
+    solution = Solution(
+        times=reference + keys / 1000,
+        positions=point + mean_position[:, None] * direction,
+        velocity=slope * direction,
+        magnitudes=mean_magnitude,
+        residual=residual,
+        convergence=np.degrees(np.arcsin(sine)),
+    )
+
+    if not MIN_SPEED <= solution.speed() <= MAX_SPEED:
+        raise TrajectoryError(f"Implausible speed {solution.speed() / 1000:.1f} km/s")
+    heights = solution.geodetic()[2]
+    if heights.min() < MIN_HEIGHT or heights.max() > MAX_HEIGHT:
+        raise TrajectoryError(f"Implausible heights {heights.min() / 1000:.0f} to {heights.max() / 1000:.0f} km")
+
+    return solution
+
+
+def try_solve(*args):
+    """ Same as solve, but returns the TrajectoryError instead of raising it, for collecting results from worker processes """
+    try:
+        return solve(*args)
+    except TrajectoryError as e:
+        return e
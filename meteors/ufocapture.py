@@ -0,0 +1,122 @@
+"""
+Streaming parser for the UFOCapture / UFOAnalyzer XML record uploaded with every sighting.
+
+    <ufoanalyzer_record y="2020" mo="10" d="3" h="21" m="32" s="45.60" tz="0" fps="25" ...>
+      <ua2_objects>
+        <ua2_object fs="30" fe="58" sN="29" ...>
+          <ua2_objpath>
+            <ua2_fdata2 fno="30" x="1022.3" y="540.8" az="123.45" ev="32.10" mag="1.3" ... />
+            ...
+
+The file is read with iterparse and every frame or object element is removed from its parent as soon as it has
+been read, so memory use does not depend on the length of the record. Frame times are counted from the clip start
+given by the record (local time of the capturing computer, `tz` hours ahead of UTC) at `fps` frames per second.
+"""
+
+import datetime
+import numpy as np
+
+from xml.etree.ElementTree import iterparse, ParseError
+
+
+class RecordError(ValueError):
+    pass
+
+
+class Track():
+    """ Path of a single object through the field of view, as parallel arrays with one item per frame """
+    def __init__(self, start, fps, frames):
+        self.start = start
+        self.fps = fps
+        self.fno = np.array([frame['fno'] for frame in frames], dtype=int)
+        self.x = np.array([frame['x'] for frame in frames], dtype=float)
+        self.y = np.array([frame['y'] for frame in frames], dtype=float)
+        self.azimuth = np.array([frame['az'] for frame in frames], dtype=float)
+        self.altitude = np.array([frame['ev'] for frame in frames], dtype=float)
+        self.magnitude = np.array([frame['mag'] for frame in frames], dtype=float)
+
+    def __len__(self):
+        return len(self.fno)
+
+    def timestamps(self):
+        offsets = np.round(self.fno / self.fps * 1e6).astype('timedelta64[us]')
+        return np.datetime64(self.start.replace(tzinfo=None), 'us') + offsets
+
+    def angular_speed(self):
+        """ Angular speed in °/s over the interval ending at every frame, NaN for the first one """
+        alt, az = np.radians(self.altitude), np.radians(self.azimuth)
+        cos = np.sin(alt[:-1]) * np.sin(alt[1:]) + np.cos(alt[:-1]) * np.cos(alt[1:]) * np.cos(az[1:] - az[:-1])
+        arc = np.degrees(np.arccos(np.clip(cos, -1, 1)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = arc * self.fps / np.diff(self.fno)
+        return np.concatenate([[np.nan], np.where(np.isfinite(speed), speed, np.nan)])
+
+
+def number(attrib, name):
+    try:
+        return float(attrib[name])
+    except (KeyError, ValueError):
+        return np.nan
+
+
+def record_start(attrib):
+    try:
+        local = datetime.datetime(
+            int(attrib['y']), int(attrib['mo']), int(attrib['d']), int(attrib['h']), int(attrib['m']),
+        ) + datetime.timedelta(seconds=float(attrib['s']))
+        return (local - datetime.timedelta(hours=float(attrib.get('tz', 0)))).replace(tzinfo=datetime.timezone.utc)
+    except (KeyError, ValueError) as e:
+        raise RecordError(f"Invalid clip start time: {e}") from e
+
+
+def parse(file):
+    """
+    Parse an open XML file and return the Track of the object with the most frames, or None if there is none.
+    Raises RecordError if the file is not a valid record.
+    """
+    start = None
+    fps = None
+    best = []
+    frames = []
+    # Elements from the root to the current one, to detach read elements from their parents
+    path = []
+
+    try:
+        for event, element in iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                path.append(element)
+                if element.tag == 'ufoanalyzer_record':
+                    start = record_start(element.attrib)
+                    fps = number(element.attrib, 'fps')
+                elif element.tag == 'ua2_object':
+                    frames = []
+                continue
+
+            path.pop()
+            if element.tag == 'ua2_fdata2':
+                frames.append({
+                    'fno': int(element.attrib['fno']),
+                    'x': number(element.attrib, 'x'),
+                    'y': number(element.attrib, 'y'),
+                    'az': number(element.attrib, 'az'),
+                    'ev': number(element.attrib, 'ev'),
+                    'mag': number(element.attrib, 'mag'),
+                })
+                if path:
+                    path[-1].remove(element)
+            elif element.tag == 'ua2_object':
+                if len(frames) > len(best):
+                    best = frames
+                if path:
+                    path[-1].remove(element)
+    except ParseError as e:
+        raise RecordError(f"Malformed XML: {e}") from e
+    except (KeyError, ValueError) as e:
+        raise RecordError(f"Invalid frame: {e}") from e
+
+    if start is None:
+        raise RecordError("Not a UFOAnalyzer record")
+    if not fps > 0:
+        raise RecordError("Missing or invalid frame rate")
+
+    return Track(start, fps, best) if best else None
@@ -6,6 +6,8 @@ urlpatterns = [
     # Meteor listings
     path('meteors/',                                                meteor.ListDateView.as_view(),              name='list-meteors'),
     path('meteors/<slug:subnetwork_code>/',                         meteor.ListBySubnetworkView.as_view(),      name='list-meteors-by-subnetwork'),
+    path('meteors/rows',                                            meteor.ListDateRowsView.as_view(),          name='list-meteors-rows'),
+    path('meteors/<slug:subnetwork_code>/rows',                     meteor.ListBySubnetworkRowsView.as_view(),  name='list-meteors-by-subnetwork-rows'),
     path('meteors/json',                                            meteor.listJSON,                            name='list-meteors-JSON'),
 
     # Single meteor views
@@ -18,6 +20,8 @@ urlpatterns = [
     # Sighting listings
     path('sightings/',                                              sighting.ListDateView.as_view(),            name='list-sightings'),
     path('sightings/<slug:station_code>/',                          sighting.ListByStationView.as_view(),       name='list-sightings-by-station'),
+    path('sightings/rows',                                          sighting.ListDateRowsView.as_view(),        name='list-sightings-rows'),
+    path('sightings/<slug:station_code>/rows',                      sighting.ListByStationRowsView.as_view(),   name='list-sightings-by-station-rows'),
     path('sightings/latest/<int:limit>',                            sighting.ListLatestView.as_view(),          name='list-sightings-latest'),
 
     # Single sighting views
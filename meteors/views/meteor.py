@@ -7,19 +7,23 @@ from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
-from core.views import JSONDetailView
+from core.views import JSONDetailView, KeysetPaginationMixin, FragmentMixin
 
 from meteors.models import Meteor
+from meteors.models.meteor import PROFILE_SUMMARY, PROFILE_FULL
 from meteors.forms import DateForm
 
 from stations.models import Subnetwork
 
 
-class GenericListView(django.contrib.auth.mixins.LoginRequiredMixin, django.views.generic.list.ListView):
+class GenericListView(KeysetPaginationMixin, django.contrib.auth.mixins.LoginRequiredMixin, django.views.generic.list.ListView):
     model = Meteor
     context_object_name = 'meteors'
     template_name = 'meteors/list-meteors.html'
-    queryset = Meteor.objects.with_everything()
+    profile = PROFILE_SUMMARY
+
+    def get_queryset(self):
+        return Meteor.objects.with_profile(self.profile)
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -34,16 +38,21 @@ class GenericDetailView(django.contrib.auth.mixins.LoginRequiredMixin, django.vi
     slug_field = 'name'
     slug_url_kwarg = 'name'
     template_name = 'meteors/meteor/main.html'
-    queryset = Meteor.objects.with_everything()
+    profile = PROFILE_FULL
+
+    def get_queryset(self):
+        return Meteor.objects.with_profile(self.profile)
 
 
 class ListDateView(GenericListView):
+    fragment_url_name = 'list-meteors-rows'
+
     def get_queryset(self):
         if self.request.GET.get('date'):
             self.date = datetime.datetime.strptime(self.request.GET['date'], '%Y-%m-%d').date()
         else:
             self.date = datetime.date.today()
-        return self.queryset.for_date(self.date)
+        return super().get_queryset().for_date(self.date)
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -65,20 +74,22 @@ class ListDateView(GenericListView):
 
 
 class ListLatestView(GenericListView):
-    def get_queryset(self):
-        limit = self.kwargs.get('limit', 10)
-        return Meteor.objects.with_everything().order_by('-timestamp')[:limit]
+    paginate_descending = True
+
+    def get_paginate_by(self, queryset):
+        return self.kwargs.get('limit', 10)
 
 
 class ListBySubnetworkView(ListDateView):
     template_name = 'meteors/list-meteors-subnetwork.html'
+    fragment_url_name = 'list-meteors-by-subnetwork-rows'
 
     def get_queryset(self):
         if self.request.GET.get('date'):
             self.date = datetime.datetime.strptime(self.request.GET['date'], '%Y-%m-%d').date()
         else:
             self.date = datetime.date.today()
-        return self.queryset.for_date(self.date)
+        return super().get_queryset().for_date(self.date)
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -100,6 +111,14 @@ class ListBySubnetworkView(ListDateView):
             return django.http.HttpResponseBadRequest()
 
 
+class ListDateRowsView(FragmentMixin, ListDateView):
+    fragment_template_name = 'meteors/meteors-rows.html'
+
+
+class ListBySubnetworkRowsView(FragmentMixin, ListBySubnetworkView):
+    fragment_template_name = 'meteors/meteors-rows.html'
+
+
 class DetailView(GenericDetailView):
     pass
 
@@ -21,7 +21,7 @@ from meteors.models import Sighting
 from stations.models import Station, Subnetwork
 
 
-class GenericListView(core.views.LoginListView):
+class GenericListView(core.views.KeysetPaginationMixin, core.views.LoginListView):
     model = Sighting
     context_object_name = 'sightings'
     template_name = 'meteors/list-sightings.html'
@@ -35,6 +35,8 @@ class GenericListView(core.views.LoginListView):
 
 
 class ListDateView(GenericListView):
+    fragment_url_name = 'list-sightings-rows'
+
     def get_queryset(self):
         if self.request.GET.get('date'):
             self.date = datetime.datetime.strptime(self.request.GET['date'], '%Y-%m-%d').date()
@@ -61,9 +63,13 @@ class ListDateView(GenericListView):
 
 
 class ListLatestView(GenericListView):
+    paginate_descending = True
+
+    def get_paginate_by(self, queryset):
+        return self.kwargs.get('limit', 10)
+
     def get_queryset(self):
-        limit = self.kwargs.get('limit', 10)
-        return Sighting.objects.with_everything().order_by('-timestamp')[:limit]
+        return Sighting.objects.with_everything()
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -75,6 +81,7 @@ class ListLatestView(GenericListView):
 
 class ListByStationView(ListDateView):
     template_name = 'meteors/list-sightings-station.html'
+    fragment_url_name = 'list-sightings-by-station-rows'
 
     def get_queryset(self):
         return super().get_queryset().for_station(self.kwargs['station_code'])
@@ -93,6 +100,14 @@ class ListByStationView(ListDateView):
             return django.http.HttpResponseBadRequest()
 
 
+class ListDateRowsView(core.views.FragmentMixin, ListDateView):
+    fragment_template_name = 'meteors/sightings/rows.html'
+
+
+class ListByStationRowsView(core.views.FragmentMixin, ListByStationView):
+    fragment_template_name = 'meteors/sightings/rows.html'
+
+
 class DetailView(core.views.LoginDetailView):
     model           = Sighting
     queryset        = Sighting.objects.with_everything()
@@ -136,7 +151,7 @@ class DetailView(core.views.LoginDetailView):
 
 
 class DetailViewExtras(DetailView):
-    queryset = Sighting.objects.with_frames().with_lightmax()
+    queryset = Sighting.objects.with_frames()
 
     def get_object(self):
         self.sighting = super().get_object()
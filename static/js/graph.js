@@ -0,0 +1,292 @@
+/*
+ * Client-side station graph, drawn from the columnar feed of stations.views.station.GraphViewColumnar.
+ *
+ * Usage: <canvas class="station-graph" data-src="{% url 'station-graph-data' code=station.code %}?format=binary"></canvas>
+ * All canvases with the class station-graph are drawn on page load.
+ */
+var AMOS = AMOS || {};
+
+AMOS.graph = (function() {
+    'use strict';
+
+    var MAGIC = 'AMOSCOL1';
+
+    var colours = {
+        sighting: 'green',
+        grid: 'rgba(0, 0, 0, 0.25)',
+        t_env: '#00D040',
+        t_lens: '#0030B0',
+        t_cpu: '#E01040',
+        humidity: '#0080C0',
+        primary: '#FF8000',
+        permanent: '#00A040',
+        none: 'rgba(0, 0, 0, 0)',
+        cover: {O: '#FFC000', o: '#A08060', C: '#400060', c: '#A08060', S: '#008080', P: '#FF0000'},
+        state: {D: '#F0E000', O: '#00C000', N: '#404040', M: '#A000A0', R: '#0000FF', U: '#FF0000'},
+        stateUnknown: '#000000',
+        automatic: '#7F7F7F',
+        manual: '#F0E000',
+        sensorOn: '#FF8040',
+        sensorOff: '#202020',
+    };
+
+    var sensors = [
+        ['lens_heating', 'lens heating'],
+        ['camera_heating', 'camera heating'],
+        ['intensifier_active', 'intensifier'],
+        ['fan_active', 'fan'],
+        ['rain_sensor_active', 'rain sensor'],
+        ['light_sensor_active', 'light sensor'],
+        ['computer_power', 'computer'],
+        ['rain_emergency_closing', 'rain emergency'],
+    ];
+
+    /* Decode the binary feed into {meta, tables: {name: {length, columns: {name: array}}}} */
+    function decode(buffer) {
+        var bytes = new Uint8Array(buffer);
+        var magic = String.fromCharCode.apply(null, bytes.subarray(0, 8));
+        if (magic !== MAGIC) {
+            throw new Error('Not a columnar graph feed');
+        }
+
+        var headerLength = new DataView(buffer).getUint32(8, true);
+        var header = JSON.parse(new TextDecoder().decode(bytes.subarray(12, 12 + headerLength)));
+        var dataStart = 12 + headerLength;
+        var result = {meta: header, tables: {}};
+
+        header.tables.forEach(function(table) {
+            var columns = {};
+            table.columns.forEach(function(column) {
+                var start = dataStart + column.offset;
+                switch (column.type) {
+                    case 'time':
+                        var deltas = new BigInt64Array(buffer, start, column.bytes / 8);
+                        var times = new Float64Array(deltas.length);
+                        var current = table.base;
+                        for (var i = 0; i < deltas.length; i++) {
+                            current += Number(deltas[i]);
+                            times[i] = current;
+                        }
+                        columns[column.name] = times;
+                        break;
+                    case 'float32':
+                        columns[column.name] = new Float32Array(buffer, start, column.bytes / 4);
+                        break;
+                    case 'uint8':
+                        columns[column.name] = new Uint8Array(buffer, start, column.bytes);
+                        break;
+                    case 'bool':
+                        var packed = new Uint8Array(buffer, start, column.bytes);
+                        var values = new Uint8Array(table.length);
+                        for (var j = 0; j < table.length; j++) {
+                            values[j] = (packed[j >> 3] >> (j & 7)) & 1;
+                        }
+                        columns[column.name] = values;
+                        break;
+                }
+                columns[column.name].meta = column;
+            });
+            result.tables[table.name] = {length: table.length, columns: columns};
+        });
+        return result;
+    }
+
+    function Panel(ctx, top, height, left, width, start, end) {
+        this.ctx = ctx;
+        this.top = top;
+        this.height = height;
+        this.left = left;
+        this.width = width;
+        this.start = start;
+        this.end = end;
+    }
+
+    Panel.prototype.x = function(time) {
+        return this.left + (time - this.start) / (this.end - this.start) * this.width;
+    };
+
+    Panel.prototype.y = function(value, min, max) {
+        return this.top + this.height - (value - min) / (max - min) * this.height;
+    };
+
+    Panel.prototype.frame = function(label) {
+        var ctx = this.ctx;
+        ctx.strokeStyle = '#000000';
+        ctx.strokeRect(this.left, this.top, this.width, this.height);
+        ctx.fillStyle = '#000000';
+        ctx.textAlign = 'right';
+        ctx.textBaseline = 'middle';
+        ctx.fillText(label, this.left - 6, this.top + this.height / 2);
+
+        ctx.strokeStyle = colours.grid;
+        ctx.setLineDash([1, 3]);
+        var hour = 3600000;
+        for (var t = Math.ceil(this.start / hour) * hour; t < this.end; t += hour) {
+            ctx.beginPath();
+            ctx.moveTo(this.x(t), this.top);
+            ctx.lineTo(this.x(t), this.top + this.height);
+            ctx.stroke();
+        }
+        ctx.setLineDash([]);
+    };
+
+    Panel.prototype.points = function(times, values, min, max, colour) {
+        var ctx = this.ctx;
+        ctx.fillStyle = colour;
+        for (var i = 0; i < times.length; i++) {
+            if (!isNaN(values[i])) {
+                ctx.fillRect(this.x(times[i]) - 0.5, this.y(values[i], min, max) - 0.5, 1.5, 1.5);
+            }
+        }
+    };
+
+    Panel.prototype.strip = function(times, row, rows, colourOf) {
+        var ctx = this.ctx;
+        var rowHeight = this.height / rows;
+        var width = Math.max(1, this.width / Math.max(times.length, 1));
+        for (var i = 0; i < times.length; i++) {
+            var colour = colourOf(i);
+            if (colour) {
+                ctx.fillStyle = colour;
+                ctx.fillRect(this.x(times[i]), this.top + row * rowHeight + 1, width, rowHeight - 2);
+            }
+        }
+    };
+
+    function range(arrays, fallbackMin, fallbackMax) {
+        var min = Infinity, max = -Infinity;
+        arrays.forEach(function(values) {
+            for (var i = 0; i < values.length; i++) {
+                if (!isNaN(values[i])) {
+                    min = Math.min(min, values[i]);
+                    max = Math.max(max, values[i]);
+                }
+            }
+        });
+        if (min === Infinity) {
+            return [fallbackMin, fallbackMax];
+        }
+        var margin = (max - min) * 0.05 || 1;
+        return [min - margin, max + margin];
+    }
+
+    function axisLabels(panel, min, max, format) {
+        var ctx = panel.ctx;
+        ctx.fillStyle = '#000000';
+        ctx.textAlign = 'left';
+        ctx.fillText(format(max), panel.left + panel.width + 4, panel.top + 6);
+        ctx.fillText(format(min), panel.left + panel.width + 4, panel.top + panel.height - 6);
+    }
+
+    function timeLabels(panel) {
+        var ctx = panel.ctx;
+        var hour = 3600000;
+        var step = (panel.end - panel.start) > 2 * 86400000 ? 24 * hour : 3 * hour;
+        ctx.fillStyle = '#000000';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'top';
+        for (var t = Math.ceil(panel.start / step) * step; t < panel.end; t += step) {
+            var date = new Date(t);
+            var label = ('0' + date.getUTCHours()).slice(-2) + ':' + ('0' + date.getUTCMinutes()).slice(-2);
+            ctx.fillText(label, panel.x(t), panel.top + panel.height + 4);
+        }
+    }
+
+    function draw(canvas, feed) {
+        var ctx = canvas.getContext('2d');
+        var width = canvas.width, height = canvas.height;
+        var left = 110, right = 60, gap = 12;
+        var start = feed.meta.start, end = feed.meta.end;
+        var hb = feed.tables.heartbeats.columns;
+        var sg = feed.tables.sightings.columns;
+
+        ctx.clearRect(0, 0, width, height);
+        ctx.font = '11px sans-serif';
+
+        var ratios = [2, 4, 2, 2, 2];
+        var unit = (height - gap * (ratios.length + 1) - 12) / ratios.reduce(function(a, b) { return a + b; });
+        var top = gap;
+        var panels = ratios.map(function(ratio) {
+            var panel = new Panel(ctx, top, ratio * unit, left, width - left - right, start, end);
+            top += ratio * unit + gap;
+            return panel;
+        });
+
+        // Sightings
+        var avi = range([sg.avi_size], 0, 1);
+        panels[0].frame('AVI size / MiB');
+        panels[0].points(sg.time, sg.avi_size, 0, avi[1], colours.sighting);
+        axisLabels(panels[0], 0, avi[1], function(v) { return v.toFixed(0); });
+
+        // State, cover, automatic and sensor strips
+        var rows = 3 + sensors.length;
+        panels[1].frame('status');
+        panels[1].strip(hb.time, 0, rows, function(i) {
+            return hb.state[i] ? (colours.state[String.fromCharCode(hb.state[i])] || colours.stateUnknown) : null;
+        });
+        panels[1].strip(hb.time, 1, rows, function(i) {
+            return hb.cover[i] ? (colours.cover[String.fromCharCode(hb.cover[i])] || null) : null;
+        });
+        panels[1].strip(hb.time, 2, rows, function(i) {
+            return hb.automatic[i] ? colours.automatic : colours.manual;
+        });
+        sensors.forEach(function(sensor, index) {
+            var bit = hb.sensors.meta.bits[sensor[0]];
+            panels[1].strip(hb.time, 3 + index, rows, function(i) {
+                if (!(hb.sensors_valid[i] & bit)) {
+                    return null;
+                }
+                return (hb.sensors[i] & bit) ? colours.sensorOn : colours.sensorOff;
+            });
+        });
+        ctx.textAlign = 'left';
+        ctx.fillStyle = '#000000';
+        ['state', 'cover', 'mode'].concat(sensors.map(function(s) { return s[1]; })).forEach(function(label, index) {
+            ctx.fillText(label, panels[1].left + panels[1].width + 4, panels[1].top + (index + 0.5) * panels[1].height / rows);
+        });
+
+        // Temperatures
+        var temperature = range([hb.t_env, hb.t_lens, hb.t_cpu], 0, 20);
+        panels[2].frame('temperature / °C');
+        panels[2].points(hb.time, hb.t_env, temperature[0], temperature[1], colours.t_env);
+        panels[2].points(hb.time, hb.t_lens, temperature[0], temperature[1], colours.t_lens);
+        panels[2].points(hb.time, hb.t_cpu, temperature[0], temperature[1], colours.t_cpu);
+        axisLabels(panels[2], temperature[0], temperature[1], function(v) { return v.toFixed(1); });
+
+        // Humidity
+        panels[3].frame('humidity / %');
+        panels[3].points(hb.time, hb.h_env, 0, 100, colours.humidity);
+        axisLabels(panels[3], 0, 100, function(v) { return v.toFixed(0); });
+
+        // Storage
+        var storage = range([hb.storage_primary, hb.storage_permanent], 0, 256);
+        panels[4].frame('storage / GiB');
+        panels[4].points(hb.time, hb.storage_primary, 0, storage[1], colours.primary);
+        panels[4].points(hb.time, hb.storage_permanent, 0, storage[1], colours.permanent);
+        axisLabels(panels[4], 0, storage[1], function(v) { return v.toFixed(0); });
+        timeLabels(panels[4]);
+    }
+
+    function load(canvas) {
+        return fetch(canvas.dataset.src, {credentials: 'same-origin'})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.arrayBuffer();
+            })
+            .then(function(buffer) {
+                draw(canvas, decode(buffer));
+            })
+            .catch(function(error) {
+                var ctx = canvas.getContext('2d');
+                ctx.fillText('Could not load the graph: ' + error.message, 20, 20);
+            });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('canvas.station-graph').forEach(load);
+    });
+
+    return {decode: decode, draw: draw, load: load};
+})();
@@ -0,0 +1,35 @@
+/*
+ * Infinite scrolling of paginated tables: when the "next" link with a data-fragment URL scrolls into view,
+ * load the following rows as JSON {html, next} and append them to the table body given by data-rows.
+ * Without JavaScript or a fragment URL the link simply opens the next page.
+ */
+$(function() {
+    $('a.more').each(function() {
+        var link = $(this);
+        var loading = false;
+
+        if (!link.data('fragment') || !('IntersectionObserver' in window)) {
+            return;
+        }
+
+        var observer = new IntersectionObserver(function(entries) {
+            if (!entries[0].isIntersecting || loading) {
+                return;
+            }
+            loading = true;
+            $.getJSON(link.data('fragment'), function(data) {
+                $(link.data('rows')).append(data.html);
+                if (data.next) {
+                    link.data('fragment', data.next);
+                    link.attr('href', data.next.replace('/rows?', '/?'));
+                } else {
+                    observer.disconnect();
+                    link.remove();
+                }
+            }).always(function() {
+                loading = false;
+            });
+        });
+        observer.observe(this);
+    });
+});
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class StationsConfig(AppConfig):
     name = 'stations'
+
+    def ready(self):
+        from .registry import station_registry
+        from .ephemeris import ephemeris
+
+        Station = self.get_model('Station')
+        post_save.connect(station_registry.invalidate, sender=Station, dispatch_uid='station_registry_save')
+        post_delete.connect(station_registry.invalidate, sender=Station, dispatch_uid='station_registry_delete')
+        post_save.connect(ephemeris.invalidate, sender=Station, dispatch_uid='ephemeris_save')
+        post_delete.connect(ephemeris.invalidate, sender=Station, dispatch_uid='ephemeris_delete')
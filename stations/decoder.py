@@ -0,0 +1,183 @@
+"""
+Table-driven decoding of the dome status string sent in heartbeats.
+
+Every character of the status string is one flag: '-' means the flag is not set, anything else
+means it is set. The same tables are used to decode a single heartbeat at ingest and to decode
+whole arrays of status strings at once (graphs, re-decoding stored heartbeats).
+"""
+
+import numpy as np
+
+
+STATUS_WIDTH = 32
+FLAG_OFF = ord('-')
+
+# Sensor name -> position of its flag in the status string
+SENSORS = {
+    'lens_heating':             4,
+    'camera_heating':           5,
+    'intensifier_active':       6,
+    'fan_active':               7,
+    'rain_sensor_active':       9,
+    'light_sensor_active':      10,
+    'computer_power':           11,
+    'rain_emergency_closing':   25,
+}
+
+# The shortest status string that contains all the flags we decode
+STATUS_MIN_LENGTH = max(SENSORS.values()) + 1
+
+# Sensor name -> bit in the packed sensor bitmasks stored in Heartbeat.sensors and Heartbeat.sensors_valid.
+# Never reorder, the bits are stored in the database.
+SENSOR_BITS = {
+    'lens_heating':             1 << 0,
+    'camera_heating':           1 << 1,
+    'intensifier_active':       1 << 2,
+    'fan_active':               1 << 3,
+    'rain_sensor_active':       1 << 4,
+    'light_sensor_active':      1 << 5,
+    'computer_power':           1 << 6,
+    'rain_emergency_closing':   1 << 7,
+}
+ALL_SENSOR_BITS = sum(SENSOR_BITS.values())
+
+# Cover state rules, evaluated in order: (positions that must be set, resulting cover state)
+COVER_MOVING = 0
+COVER_DIRECTION = 1
+COVER_OPEN_SWITCH = 2
+COVER_CLOSED_SWITCH = 3
+COVER_SAFETY_SWITCH = 14
+
+COVER_RULES = [
+    ((COVER_MOVING, COVER_DIRECTION),   'o'),
+    ((COVER_MOVING,),                   'c'),
+    ((COVER_SAFETY_SWITCH,),            'S'),
+    ((COVER_OPEN_SWITCH,),              'O'),
+    ((COVER_CLOSED_SWITCH,),            'C'),
+    ((),                                'P'),
+]
+
+TRI_NONE = 0
+TRI_FALSE = 1
+TRI_TRUE = 2
+
+
+def decode_status_string(status):
+    """
+    Decode a single status string into a dict of sensor values and the cover state.
+    All values are None if the status string is None; a truncated string raises ValueError.
+    """
+    if status is None:
+        return dict({name: None for name in SENSORS}, cover_state=None)
+
+    if len(status) < STATUS_MIN_LENGTH:
+        raise ValueError(f"Status string '{status}' is too short ({len(status)} < {STATUS_MIN_LENGTH} characters)")
+
+    result = {name: status[position] != '-' for name, position in SENSORS.items()}
+    for positions, cover_state in COVER_RULES:
+        if all(status[position] != '-' for position in positions):
+            result['cover_state'] = cover_state
+            break
+
+    return result
+
+
+def status_flags(statuses):
+    """
+    Convert a sequence of status strings (or None) to a 2D boolean array of flags, one row per string,
+    and a boolean mask of rows that contained a complete status string.
+    """
+    statuses = np.asarray(statuses, dtype=object)
+    present = np.not_equal(statuses, None)
+
+    text = np.where(present, statuses, '').astype(f'U{STATUS_WIDTH}')
+    lengths = np.char.str_len(text)
+    # Every non-ASCII character becomes a single '?', a set flag like in decode_status_string
+    chars = np.char.encode(text, 'ascii', 'replace').astype(f'S{STATUS_WIDTH}').view(np.uint8).reshape(len(text), STATUS_WIDTH)
+
+    flags = (chars != FLAG_OFF) & (np.arange(STATUS_WIDTH) < lengths[:, np.newaxis])
+    return flags, present & (lengths >= STATUS_MIN_LENGTH)
+
+
+def decode_status_strings(statuses):
+    """
+    Decode an array of status strings in one pass.
+    Returns (sensors, cover, valid): a dict of boolean arrays per sensor, an uint8 array of cover state codes
+    (0 where there is no status string) and a boolean mask of rows with a valid status string.
+    """
+    flags, valid = status_flags(statuses)
+
+    sensors = {name: flags[:, position] & valid for name, position in SENSORS.items()}
+
+    conditions = [np.all(flags[:, list(positions)], axis=1) if positions else np.ones(len(flags), dtype=bool) for positions, _ in COVER_RULES]
+    cover = np.select(conditions, [ord(state) for _, state in COVER_RULES], default=0).astype(np.uint8)
+    cover[~valid] = 0
+
+    return sensors, cover, valid
+
+
+def pack_sensors(values):
+    """ Pack a dict of sensor values (True / False / None) into a pair of bitmasks (values, validity) """
+    bits = valid = 0
+    for name, bit in SENSOR_BITS.items():
+        value = values.get(name)
+        if value is not None:
+            valid |= bit
+            if value:
+                bits |= bit
+    return bits, valid
+
+
+def pack_sensor_arrays(sensors, valid):
+    """ Vectorized pack_sensors for the output of decode_status_strings """
+    bits = np.zeros(len(valid), dtype=np.int16)
+    for name, bit in SENSOR_BITS.items():
+        bits |= np.where(sensors[name] & valid, bit, 0).astype(np.int16)
+    return bits, np.where(valid, ALL_SENSOR_BITS, 0).astype(np.int16)
+
+
+def unpack_sensors(bits, valid):
+    """ Unpack arrays of bitmasks (values, validity) into a dict of TRI_TRUE / TRI_FALSE / TRI_NONE arrays per sensor """
+    bits = np.asarray(bits, dtype=np.int64)
+    valid = np.asarray(valid, dtype=np.int64)
+    return {
+        name: np.where(valid & bit, np.where(bits & bit, TRI_TRUE, TRI_FALSE), TRI_NONE).astype(np.uint8)
+        for name, bit in SENSOR_BITS.items()
+    }
+
+
+def missing(values):
+    """ Mask of None and NaN entries in an object array """
+    return np.equal(values, None) | np.not_equal(values, values)
+
+
+def char_codes(values):
+    """ Convert an array of one-character codes (or None) to uint8 code points, 0 for None or empty """
+    values = np.asarray(values, dtype=object)
+    text = np.where(missing(values), '', values).astype('U1')
+    return np.minimum(text.view(np.uint32), 255).astype(np.uint8)
+
+
+def tristate(values):
+    """ Convert an array of True / False / None to TRI_TRUE / TRI_FALSE / TRI_NONE """
+    values = np.asarray(values, dtype=object)
+    none = missing(values)
+    return np.where(none, TRI_NONE, np.where(np.where(none, False, values).astype(bool), TRI_TRUE, TRI_FALSE)).astype(np.uint8)
+
+
+def lookup_table(mapping, default):
+    """ Build a 256-entry lookup table from a mapping of one-character codes (or code points) to values """
+    table = [default] * 256
+    for code, value in mapping.items():
+        table[ord(code) if isinstance(code, str) else code] = value
+    return np.array(table)
+
+
+def colour_codes(values, mapping, default):
+    """ Map an array of one-character codes to colours with a single table lookup """
+    return lookup_table(mapping, default)[char_codes(values)]
+
+
+def colour_tristate(codes, colour_on, colour_off, colour_none):
+    """ Map an array of TRI_TRUE / TRI_FALSE / TRI_NONE to colours with a single table lookup """
+    return np.array([colour_none, colour_off, colour_on])[codes]
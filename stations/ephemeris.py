@@ -0,0 +1,82 @@
+import datetime
+import logging
+import pytz
+import numpy as np
+
+from django.apps import apps
+from django.core.cache import cache
+
+from core import astronomy
+
+log = logging.getLogger(__name__)
+
+
+class Ephemeris():
+    """
+    Current positions of the Sun and the Moon above all stations, computed for all stations at once
+    with a single vectorized call of the selected core.astronomy engine and cached for every `bucket` seconds.
+    Positions at arbitrary times (e.g. of sightings) are not cached and should be computed directly.
+    """
+    def __init__(self, bucket=60, prefix='ephemeris', engine=astronomy.ENGINE_FAST):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.engine = engine
+
+    def floor(self, time):
+        return datetime.datetime.fromtimestamp(time.timestamp() // self.bucket * self.bucket, tz=pytz.utc)
+
+    def key(self, time):
+        return f'{self.prefix}:{self.floor(time).timestamp():.0f}'
+
+    def invalidate(self, *args, **kwargs):
+        cache.delete(self.key(datetime.datetime.now(tz=pytz.utc)))
+
+    def compute(self, time):
+        """ Compute positions of the Sun and the Moon for all stations with known coordinates at <time> """
+        Station = apps.get_model('stations', 'Station')
+        stations = list(
+            Station.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list('id', 'latitude', 'longitude', 'altitude')
+        )
+        if not stations:
+            return {}
+
+        ids, latitudes, longitudes, altitudes = zip(*stations)
+        latitudes = np.array(latitudes)
+        longitudes = np.array(longitudes)
+        altitudes = np.array([0 if altitude is None else altitude for altitude in altitudes])
+        times = np.full(len(ids), np.datetime64(time.replace(tzinfo=None), 'ns'))
+
+        sun_alt, sun_az = astronomy.sun_alt_az(times, latitudes, longitudes, altitudes, engine=self.engine)
+        moon_alt, moon_az = astronomy.moon_alt_az(times, latitudes, longitudes, altitudes, engine=self.engine)
+
+        log.debug(f"Computed ephemeris for {len(ids)} stations at {time}")
+        return {
+            station_id: {
+                'sun':  {'alt': float(sa), 'az': float(sz)},
+                'moon': {'alt': float(ma), 'az': float(mz)},
+            } for station_id, sa, sz, ma, mz in zip(ids, sun_alt, sun_az, moon_alt, moon_az)
+        }
+
+    def get_positions(self, time=None):
+        """ Return a dict of station id -> {'sun': {'alt', 'az'}, 'moon': {'alt', 'az'}} for the bucket containing <time> """
+        time = self.floor(datetime.datetime.now(tz=pytz.utc) if time is None else time)
+        key = self.key(time)
+
+        positions = cache.get(key)
+        if positions is None:
+            positions = self.compute(time)
+            cache.set(key, positions, timeout=2 * self.bucket)
+        return positions
+
+    def get(self, station, body):
+        """ Current position of <body> ('sun' or 'moon') above <station>, or None if the station has no coordinates """
+        positions = self.get_positions()
+        if station.id not in positions and station.latitude is not None and station.longitude is not None:
+            self.invalidate()
+            positions = self.get_positions()
+
+        position = positions.get(station.id)
+        return None if position is None else position[body]
+
+
+ephemeris = Ephemeris()
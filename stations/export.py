@@ -0,0 +1,70 @@
+"""
+Datasets available for bulk export (see core.export), selected by station or subnetwork and time range.
+"""
+
+from stations.models import Station, Heartbeat
+from stations.models.heartbeat import SensorBit
+from stations import decoder
+from meteors.models import Sighting, Frame
+
+
+class Dataset():
+    def __init__(self, queryset, columns, station_field, time_field):
+        self.get_base_queryset = queryset
+        self.columns = columns
+        self.station_field = station_field
+        self.time_field = time_field
+
+    def get_queryset(self, stations=None, start=None, end=None):
+        queryset = self.get_base_queryset()
+        if stations is not None:
+            queryset = queryset.filter(**{f'{self.station_field}__in': stations})
+        if start is not None:
+            queryset = queryset.filter(**{f'{self.time_field}__gte': start})
+        if end is not None:
+            queryset = queryset.filter(**{f'{self.time_field}__lt': end})
+        return queryset.order_by(self.time_field, 'id')
+
+
+DATASETS = {
+    'heartbeats': Dataset(
+        lambda: Heartbeat.objects.annotate(**{name: SensorBit(name) for name in decoder.SENSOR_BITS}),
+        [
+            'id', 'timestamp', 'received', 'station__code', 'automatic', 'state', 'cover_state', 'cover_position',
+            'status_string', *decoder.SENSOR_BITS,
+            'temperature', 't_lens', 't_cpu', 'humidity',
+            'storage_primary_available', 'storage_primary_total', 'storage_permanent_available', 'storage_permanent_total',
+        ],
+        'station', 'timestamp',
+    ),
+    'sightings': Dataset(
+        lambda: Sighting.objects.all(),
+        ['id', 'timestamp', 'station__code', 'meteor__name', 'avi_size'],
+        'station', 'timestamp',
+    ),
+    'frames': Dataset(
+        lambda: Frame.objects.all(),
+        [
+            'id', 'sighting_id', 'sighting__station__code', 'order', 'timestamp', 'x', 'y',
+            'altitude', 'azimuth', 'magnitude', 'angular_speed', 'solar_elongation', 'lunar_elongation',
+        ],
+        'sighting__station', 'timestamp',
+    ),
+}
+
+
+def select_stations(station=None, subnetwork=None):
+    """ Ids of the selected stations, or None for all stations. Raises Station.DoesNotExist for an unknown code """
+    if station is None and subnetwork is None:
+        return None
+
+    stations = Station.objects.all()
+    if station is not None:
+        stations = stations.filter(code=station)
+    if subnetwork is not None:
+        stations = stations.filter(subnetwork__code=subnetwork)
+
+    ids = list(stations.values_list('id', flat=True))
+    if not ids:
+        raise Station.DoesNotExist(f"No station matches station={station}, subnetwork={subnetwork}")
+    return ids
@@ -0,0 +1,52 @@
+import numpy as np
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stations import decoder
+from stations.models import Heartbeat
+
+
+class Command(BaseCommand):
+    help = "Re-decode stored heartbeat status strings into sensor and cover state columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--station', type=str, default=None, help="only process heartbeats of the station with this code")
+        parser.add_argument('--chunk-size', type=int, default=20000, help="number of heartbeats decoded at once")
+
+    def handle(self, *args, **options):
+        queryset = Heartbeat.objects.exclude(status_string=None).order_by('id')
+        if options['station']:
+            queryset = queryset.for_station(options['station'])
+
+        fields = ['sensors', 'sensors_valid', 'cover_state']
+        last_id = 0
+        total = 0
+
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).values_list('id', 'status_string')[:options['chunk_size']])
+            if not rows:
+                break
+
+            ids, statuses = zip(*rows)
+            sensors, cover, valid = decoder.decode_status_strings(statuses)
+            bits, bits_valid = decoder.pack_sensor_arrays(sensors, valid)
+            cover_states = np.where(valid, cover.view('S1').astype('U1'), None)
+
+            heartbeats = [
+                Heartbeat(
+                    id=heartbeat_id,
+                    sensors=int(bits[index]),
+                    sensors_valid=int(bits_valid[index]),
+                    cover_state=cover_states[index],
+                ) for index, heartbeat_id in enumerate(ids)
+            ]
+
+            with transaction.atomic():
+                Heartbeat.objects.bulk_update(heartbeats, fields, batch_size=1000)
+
+            last_id = ids[-1]
+            total += len(rows)
+            self.stdout.write(f"Decoded {total} heartbeats (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Re-decoded {total} heartbeats"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+from core.utils import parse_time
+from stations.export import DATASETS, select_stations
+from stations.models import Station
+
+
+class Command(BaseCommand):
+    help = "Export heartbeats, sightings or frames for a station or subnetwork and time range as CSV or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--station', help="station code")
+        parser.add_argument('--subnetwork', help="subnetwork code")
+        parser.add_argument('--start', help="start date or time (UTC, inclusive)")
+        parser.add_argument('--end', help="end date or time (UTC, exclusive)")
+        parser.add_argument('--format', choices=[export.FORMAT_CSV, export.FORMAT_PARQUET], default=export.FORMAT_CSV)
+        parser.add_argument('--chunk-size', type=int, default=None, help="number of rows read and written at once")
+        parser.add_argument('--output', '-o', help="output file (default: standard output, CSV only)")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_time(options['start'])
+            end = parse_time(options['end'])
+            stations = select_stations(options['station'], options['subnetwork'])
+        except (ValueError, Station.DoesNotExist) as e:
+            raise CommandError(e)
+
+        if options['format'] == export.FORMAT_PARQUET and options['output'] is None:
+            raise CommandError("Parquet export needs an --output file")
+
+        dataset = DATASETS[options['dataset']]
+        queryset = dataset.get_queryset(stations, start, end)
+
+        try:
+            chunks = export.stream(queryset, dataset.columns, options['format'], options['chunk_size'])
+            if options['output'] is None:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+            else:
+                if options['format'] == export.FORMAT_CSV:
+                    file = open(options['output'], 'w', newline='')
+                else:
+                    file = open(options['output'], 'wb')
+                with file:
+                    for chunk in chunks:
+                        file.write(chunk)
+        except export.ExportError as e:
+            raise CommandError(e)
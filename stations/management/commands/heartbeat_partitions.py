@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stations import partitions
+
+
+class Command(BaseCommand):
+    help = "Create future monthly partitions of the heartbeat table and detach or drop old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.HEARTBEAT_PARTITIONS_AHEAD,
+                            help="number of months ahead to create partitions for")
+        parser.add_argument('--retain', type=int, default=settings.HEARTBEAT_PARTITIONS_RETAIN,
+                            help="detach partitions older than this many months (default: keep everything)")
+        parser.add_argument('--drop', action='store_true', help="drop old partitions instead of moving them to the archive schema")
+        parser.add_argument('--list', action='store_true', help="only list the attached partitions")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError(f"Table {partitions.TABLE} is not partitioned")
+
+        if options['list']:
+            for month in partitions.list_partitions():
+                self.stdout.write(f"{partitions.partition_name(month)}")
+            return
+
+        for name in partitions.ensure_partitions(options['ahead']):
+            self.stdout.write(f"Created {name}")
+
+        if options['retain'] is not None:
+            for name in partitions.detach_partitions(options['retain'], drop=options['drop']):
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Archived'} {name}")
+
+        self.stdout.write(self.style.SUCCESS("Heartbeat partitions are up to date"))
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0057_auto_20210129_2203'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='heartbeat',
+            name='timestamp',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, verbose_name='timestamp'),
+        ),
+    ]
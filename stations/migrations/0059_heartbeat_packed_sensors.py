@@ -0,0 +1,90 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+# Bits as defined in stations.decoder.SENSOR_BITS at the time of this migration
+PACK_SENSORS = """
+    UPDATE stations_heartbeat SET
+        sensors = (CASE WHEN lens_heating THEN 1 ELSE 0 END) |
+        (CASE WHEN camera_heating THEN 2 ELSE 0 END) |
+        (CASE WHEN intensifier_active THEN 4 ELSE 0 END) |
+        (CASE WHEN fan_active THEN 8 ELSE 0 END) |
+        (CASE WHEN rain_sensor_active THEN 16 ELSE 0 END) |
+        (CASE WHEN light_sensor_active THEN 32 ELSE 0 END) |
+        (CASE WHEN computer_power THEN 64 ELSE 0 END) |
+        (CASE WHEN rain_emergency_closing THEN 128 ELSE 0 END),
+        sensors_valid = (CASE WHEN lens_heating IS NULL THEN 0 ELSE 1 END) |
+        (CASE WHEN camera_heating IS NULL THEN 0 ELSE 2 END) |
+        (CASE WHEN intensifier_active IS NULL THEN 0 ELSE 4 END) |
+        (CASE WHEN fan_active IS NULL THEN 0 ELSE 8 END) |
+        (CASE WHEN rain_sensor_active IS NULL THEN 0 ELSE 16 END) |
+        (CASE WHEN light_sensor_active IS NULL THEN 0 ELSE 32 END) |
+        (CASE WHEN computer_power IS NULL THEN 0 ELSE 64 END) |
+        (CASE WHEN rain_emergency_closing IS NULL THEN 0 ELSE 128 END)
+"""
+
+UNPACK_SENSORS = """
+    UPDATE stations_heartbeat SET
+        lens_heating = CASE WHEN sensors_valid & 1 = 0 THEN NULL ELSE sensors & 1 <> 0 END,
+        camera_heating = CASE WHEN sensors_valid & 2 = 0 THEN NULL ELSE sensors & 2 <> 0 END,
+        intensifier_active = CASE WHEN sensors_valid & 4 = 0 THEN NULL ELSE sensors & 4 <> 0 END,
+        fan_active = CASE WHEN sensors_valid & 8 = 0 THEN NULL ELSE sensors & 8 <> 0 END,
+        rain_sensor_active = CASE WHEN sensors_valid & 16 = 0 THEN NULL ELSE sensors & 16 <> 0 END,
+        light_sensor_active = CASE WHEN sensors_valid & 32 = 0 THEN NULL ELSE sensors & 32 <> 0 END,
+        computer_power = CASE WHEN sensors_valid & 64 = 0 THEN NULL ELSE sensors & 64 <> 0 END,
+        rain_emergency_closing = CASE WHEN sensors_valid & 128 = 0 THEN NULL ELSE sensors & 128 <> 0 END
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0058_heartbeat_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='heartbeat',
+            name='sensors',
+            field=models.SmallIntegerField(blank=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='heartbeat',
+            name='sensors_valid',
+            field=models.SmallIntegerField(blank=True, default=0),
+        ),
+        migrations.RunSQL(PACK_SENSORS, UNPACK_SENSORS),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='lens_heating',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='camera_heating',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='intensifier_active',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='fan_active',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='rain_sensor_active',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='light_sensor_active',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='computer_power',
+        ),
+        migrations.RemoveField(
+            model_name='heartbeat',
+            name='rain_emergency_closing',
+        ),
+    ]
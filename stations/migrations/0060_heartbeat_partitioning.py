@@ -0,0 +1,111 @@
+import datetime
+
+from django.db import migrations
+
+
+TABLE = 'stations_heartbeat'
+AHEAD = 3
+
+
+def month_add(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def table_definitions(cursor, table):
+    """ Index and foreign key definitions of <table>, except the primary key """
+    cursor.execute("""
+        SELECT indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'
+        )
+    """, [table, table])
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [table])
+    foreign_keys = cursor.fetchall()
+
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+    primary_key = cursor.fetchone()[0]
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+
+    return indexes, foreign_keys, primary_key, sequence
+
+
+def restore_definitions(cursor, table, indexes, foreign_keys):
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+    for definition in indexes:
+        cursor.execute(definition)
+
+
+def partition(apps, schema_editor):
+    """
+    Convert the heartbeat table to a table partitioned by month on the timestamp.
+    Partitions are created for all months with data and a few months ahead, anything else goes to the default partition.
+    Further partitions are managed by stations.partitions.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys, primary_key, sequence = table_definitions(cursor, TABLE)
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned')
+        cursor.execute(f'ALTER TABLE {TABLE}_unpartitioned DROP CONSTRAINT "{primary_key}"')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM {TABLE}_unpartitioned')
+        first = cursor.fetchone()[0]
+        today = datetime.date.today()
+        month = datetime.date(today.year, today.month, 1) if first is None else datetime.date(first.year, first.month, 1)
+        last = month_add(datetime.date(today.year, today.month, 1), AHEAD)
+
+        while month <= last:
+            following = month_add(month, 1)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month.isoformat(), following.isoformat()],
+            )
+            month = following
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+        cursor.execute(f'DROP TABLE {TABLE}_unpartitioned')
+
+        restore_definitions(cursor, TABLE, indexes, foreign_keys)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys, primary_key, sequence = table_definitions(cursor, TABLE)
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+        cursor.execute(f'DROP TABLE {TABLE}_partitioned CASCADE')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+
+        restore_definitions(cursor, TABLE, indexes, foreign_keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0059_heartbeat_packed_sensors'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0060_heartbeat_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeartbeatRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('environment_count', models.PositiveIntegerField(default=0)),
+                ('received', models.DateTimeField(verbose_name='last heartbeat received at')),
+                ('state', models.CharField(blank=True, max_length=1, null=True)),
+                ('cover_state', models.CharField(blank=True, max_length=1, null=True)),
+                ('sensors', models.SmallIntegerField(blank=True, default=0)),
+                ('sensors_valid', models.SmallIntegerField(blank=True, default=0)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('t_lens', models.FloatField(blank=True, null=True)),
+                ('t_cpu', models.FloatField(blank=True, null=True)),
+                ('humidity', models.FloatField(blank=True, null=True)),
+                ('storage_primary_available', models.BigIntegerField(blank=True, null=True)),
+                ('storage_permanent_available', models.BigIntegerField(blank=True, null=True)),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='heartbeat_rollups', to='stations.station')),
+            ],
+            options={
+                'verbose_name': 'heartbeat rollup',
+                'verbose_name_plural': 'heartbeat rollups',
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='heartbeatrollup',
+            constraint=models.UniqueConstraint(fields=('station', 'resolution', 'bucket'), name='unique_heartbeat_rollup'),
+        ),
+    ]
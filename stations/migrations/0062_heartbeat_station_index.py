@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0061_heartbeat_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='heartbeat',
+            index=models.Index(fields=['station', '-timestamp'], name='heartbeat_by_station'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0062_heartbeat_station_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='heartbeat',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['received'], name='heartbeat_received_brin'),
+        ),
+        migrations.RenameField(
+            model_name='heartbeatrollup',
+            old_name='environment_count',
+            new_name='temperature_count',
+        ),
+        migrations.AddField(
+            model_name='heartbeatrollup',
+            name='humidity_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='heartbeatrollup',
+            name='t_cpu_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='heartbeatrollup',
+            name='t_lens_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Rollups are derived data, the next refresh rebuilds all of them with the new counts
+        migrations.RunSQL('DELETE FROM stations_heartbeatrollup', migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def station_foreign_key(table, timing):
+    """ Set the timing of the foreign key from <table> to the station table, its name was generated by Django """
+    return f"""
+        DO $$
+        DECLARE
+            name text;
+        BEGIN
+            SELECT conname INTO STRICT name FROM pg_constraint
+            WHERE conrelid = '{table}'::regclass AND confrelid = 'stations_station'::regclass AND contype = 'f';
+            EXECUTE format('ALTER TABLE {table} ALTER CONSTRAINT %I DEFERRABLE INITIALLY {timing}', name);
+        END $$
+    """
+
+
+class Migration(migrations.Migration):
+    """
+    Check the station of a new heartbeat at the INSERT instead of at the commit, so that the station registry
+    can catch the error of a station deleted by another process and retry, see StationRegistry.insert.
+    The constraint stays deferrable for SET CONSTRAINTS.
+    """
+
+    dependencies = [
+        ('stations', '0063_heartbeat_rollup_counts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            station_foreign_key('stations_heartbeat', 'IMMEDIATE'),
+            station_foreign_key('stations_heartbeat', 'DEFERRED'),
+        ),
+    ]
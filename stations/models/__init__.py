@@ -2,4 +2,5 @@ from .country import Country
 from .subnetwork import Subnetwork
 from .station import Station
 from .heartbeat import Heartbeat
+from .rollup import HeartbeatRollup
 from .logentry import LogEntry
@@ -6,14 +6,59 @@ import dotmap
 from django.db import models
 from django.db.models import F, Func, Aggregate, Prefetch, Avg, Min, Max
 from django.db.models.functions import TruncMinute, Extract, Floor
+from django.contrib.postgres.aggregates import BitOr
+from django.contrib.postgres.indexes import BrinIndex
 from django.apps import apps
 from django.urls import reverse
-from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from pprint import pprint as pp
 
 import core.models
+from stations.registry import station_registry
+from stations import decoder
+
+
+class SensorBit(Func):
+    """
+    Value of a single sensor packed in Heartbeat.sensors: true, false, or null if it was not reported.
+    Can be used directly in filter() or wrapped in BoolOr to aggregate a single sensor.
+    """
+    arity = 2
+    output_field = models.BooleanField(null=True)
+
+    def __init__(self, name, **extra):
+        self.bit = decoder.SENSOR_BITS[name]
+        super().__init__(F('sensors'), F('sensors_valid'), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        values, valid = self.get_source_expressions()
+        values_sql, values_params = compiler.compile(values)
+        valid_sql, valid_params = compiler.compile(valid)
+        return (
+            f"CASE WHEN ({valid_sql} & {self.bit}) = 0 THEN NULL ELSE ({values_sql} & {self.bit}) <> 0 END",
+            valid_params + values_params,
+        )
+
+
+def sensor_property(name):
+    bit = decoder.SENSOR_BITS[name]
+
+    def getter(self):
+        return bool(self.sensors & bit) if self.sensors_valid & bit else None
+
+    def setter(self, value):
+        if value is None:
+            self.sensors_valid &= ~bit
+            self.sensors &= ~bit
+        else:
+            self.sensors_valid |= bit
+            self.sensors = (self.sensors | bit) if value else (self.sensors & ~bit)
+
+    return property(getter, setter)
 
 
 class HeartbeatManager(models.Manager):
@@ -24,61 +69,34 @@ class HeartbeatManager(models.Manager):
             hints=self._hints,
         )
 
-    def create_from_POST(self, code, **data):
-        Station = apps.get_model('stations', 'Station')
+    def build_from_POST(self, station_id, **data):
+        timestamp = data['time']
+        if isinstance(timestamp, str):
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError(f"Invalid time '{data['time']}'")
 
         stateS = data['dome']['s']
         stateT = data['dome']['t']
+        decoded = decoder.decode_status_string(stateS)
+        sensors, sensors_valid = decoder.pack_sensors(decoded)
 
-        #pp(data)
-        if stateS is None:
-            cover_state = None
-        else:
-            if stateS[0] != '-':
-                if stateS[1] != '-':
-                    cover_state = Heartbeat.COVER_OPENING
-                else:
-                    cover_state = Heartbeat.COVER_CLOSING
-            else:
-                if stateS[14] != '-':
-                    cover_state = Heartbeat.COVER_SAFETY
-                else:
-                    if stateS[2] != '-':
-                        cover_state = Heartbeat.COVER_OPEN
-                    elif stateS[3] != '-':
-                        cover_state = Heartbeat.COVER_CLOSED
-                    else:
-                        cover_state = Heartbeat.COVER_PROBLEM
-
-        try:
-            station = Station.objects.get(code=code)
-        except Station.DoesNotExist as e:
-            raise Station.DoesNotExist(f"Station {code} does not exist")
-
-        heartbeat = self.create(
+        return self.model(
             automatic                   = data['auto'],
-            timestamp                   = data['time'],
-            station                     = station,
+            timestamp                   = timestamp,
+            station_id                  = station_id,
 
             state                       = data['st'],
             status_string               = stateS,
-            lens_heating                = (stateS[4] != '-') if stateS else None,
-            camera_heating              = (stateS[5] != '-') if stateS else None,
-            intensifier_active          = (stateS[6] != '-') if stateS else None,
-            fan_active                  = (stateS[7] != '-') if stateS else None,
-
-            rain_sensor_active          = (stateS[9] != '-') if stateS else None,
-            light_sensor_active         = (stateS[10] != '-') if stateS else None,
-            computer_power              = (stateS[11] != '-') if stateS else None,
-
-            rain_emergency_closing      = (stateS[25] != '-') if stateS else None,
+            sensors                     = sensors,
+            sensors_valid               = sensors_valid,
 
             temperature                 = None if stateT is None else stateT['t_sht'],
             t_lens                      = None if stateT is None else stateT['t_lens'],
             t_cpu                       = None if stateT is None else stateT['t_cpu'],
             humidity                    = None if stateT is None else stateT['h_sht'],
 
-            cover_state                 = cover_state,
+            cover_state                 = decoded['cover_state'],
             cover_position              = None if data['dome']['z'] is None else data['dome']['z']['sp'],
 
             storage_primary_available   = data['disk']['prim']['a'],
@@ -86,12 +104,55 @@ class HeartbeatManager(models.Manager):
             storage_permanent_available = data['disk']['perm']['a'],
             storage_permanent_total     = data['disk']['perm']['t'],
         )
-        return heartbeat
+
+    def create_from_POST(self, code, **data):
+        def create(station_id):
+            heartbeat = self.build_from_POST(station_id, **data)
+            heartbeat.save(force_insert=True)
+            return heartbeat
+
+        return station_registry.insert(code, create)
+
+    def bulk_create_from_POST(self, code, items):
+        """
+        Decode a batch of heartbeat reports for a single station and insert all valid ones at once.
+        Returns a list of (heartbeat, error) pairs in the original order, exactly one of them is None.
+        """
+        return station_registry.insert(code, lambda station_id: self._bulk_create_from_POST(station_id, items))
+
+    def _bulk_create_from_POST(self, station_id, items):
+        results = []
+
+        for item in items:
+            if isinstance(item, Exception):
+                results.append((None, item))
+                continue
+
+            try:
+                heartbeat = self.build_from_POST(station_id, **item)
+                # Bad values must fail their own item here, not the whole bulk insert.
+                # The station is already known to exist, do not query it for every item.
+                heartbeat.clean_fields(exclude=['station'])
+                results.append((heartbeat, None))
+            except (KeyError, TypeError, ValueError, AttributeError, ValidationError) as e:
+                results.append((None, e))
+
+        self.bulk_create([heartbeat for heartbeat, error in results if heartbeat is not None])
+        return results
 
 
 class HeartbeatQuerySet(models.QuerySet):
     def for_station(self, station_code):
-        return self.filter(station__code=station_code)
+        station_id = station_registry.get_id(station_code)
+        return self.none() if station_id is None else self.filter(station_id=station_id)
+
+    def with_sensor(self, name, value=True):
+        """ Filter heartbeats by the value of a single sensor (True, False or None for not reported) """
+        annotated = self.annotate(**{f'sensor_{name}': SensorBit(name)})
+        if value is None:
+            return annotated.filter(**{f'sensor_{name}__isnull': True})
+        else:
+            return annotated.filter(**{f'sensor_{name}': value})
 
     def with_age(self):
         return self.annotate(
@@ -142,13 +203,8 @@ class HeartbeatQuerySet(models.QuerySet):
                 'time',
             ).annotate(
                 t_env=Avg('temperature'),
-                lh=BoolOr('lens_heating'),
-                ch=BoolOr('camera_heating'),
-                ii=BoolOr('intensifier_active'),
-                fa=BoolOr('fan_active'),
-                rs=BoolOr('rain_sensor_active'),
-                ls=BoolOr('light_sensor_active'),
-                cp=BoolOr('computer_power')
+                bits=BitOr('sensors'),
+                bits_valid=BitOr('sensors_valid'),
             ).order_by()
 
     def as_scatter(self, start=None, end=None):
@@ -172,6 +228,15 @@ class Heartbeat(models.Model):
         get_latest_by               = ['timestamp']
         indexes                     = [
                                         models.Index(fields=['timestamp', 'station']),
+                                        models.Index(
+                                            fields          = ['station', '-timestamp'],
+                                            name            = 'heartbeat_by_station',
+                                        ),
+                                        # Rows are appended in order of arrival, HeartbeatRollupManager.refresh scans by it
+                                        BrinIndex(
+                                            fields          = ['received'],
+                                            name            = 'heartbeat_received_brin',
+                                        ),
                                     ]
 
     STATE_DAYLIGHT = 'D'
@@ -211,7 +276,7 @@ class Heartbeat(models.Model):
     timestamp                       = models.DateTimeField(
                                         verbose_name        = 'timestamp',
                                         blank               = True,
-                                        auto_now_add        = True,
+                                        default             = timezone.now,
                                     )
     received                        = models.DateTimeField(
                                         verbose_name        = 'received at',
@@ -236,16 +301,11 @@ class Heartbeat(models.Model):
                                         blank               = True,
                                     )
 
-    # Device sensors
+    # Device sensors: values and validity (the sensor was reported) are packed into two bitmasks,
+    # see stations.decoder.SENSOR_BITS. Individual sensors are available as properties below.
     status_string                   = models.CharField(null=True, blank=True, max_length=32)
-    lens_heating                    = models.BooleanField(null=True, blank=True)
-    camera_heating                  = models.BooleanField(null=True, blank=True)
-    intensifier_active              = models.BooleanField(null=True, blank=True)
-    fan_active                      = models.BooleanField(null=True, blank=True)
-    rain_sensor_active              = models.BooleanField(null=True, blank=True)
-    light_sensor_active             = models.BooleanField(null=True, blank=True)
-    computer_power                  = models.BooleanField(null=True, blank=True)
-    rain_emergency_closing          = models.BooleanField(null=True, blank=True)
+    sensors                         = models.SmallIntegerField(null=False, blank=True, default=0)
+    sensors_valid                   = models.SmallIntegerField(null=False, blank=True, default=0)
     cover_position                  = models.SmallIntegerField(null=True, blank=True)
 
     # Environmental data
@@ -263,6 +323,15 @@ class Heartbeat(models.Model):
     # Management
     automatic                       = models.BooleanField(null=False, blank=False, default=False)
 
+    lens_heating                    = sensor_property('lens_heating')
+    camera_heating                  = sensor_property('camera_heating')
+    intensifier_active              = sensor_property('intensifier_active')
+    fan_active                      = sensor_property('fan_active')
+    rain_sensor_active              = sensor_property('rain_sensor_active')
+    light_sensor_active             = sensor_property('light_sensor_active')
+    computer_power                  = sensor_property('computer_power')
+    rain_emergency_closing          = sensor_property('rain_emergency_closing')
+
     def __str__(self):
         return f"[{self.station.code}] at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')}: {self.status_string}"
 
@@ -2,10 +2,13 @@ import textwrap
 from django.conf import settings
 from django.db import models
 
+from stations.registry import station_registry
+
 
 class LogEntryQuerySet(models.QuerySet):
     def for_station(self, station_code):
-        return self.filter(station__code=station_code)
+        station_id = station_registry.get_id(station_code)
+        return self.none() if station_id is None else self.filter(station_id=station_id)
 
 
 class LogEntry(models.Model):
@@ -0,0 +1,211 @@
+import datetime
+import pytz
+
+from django.db import models, connection, transaction
+from django.db.models import F, Q, Func, Sum, Max, ExpressionWrapper
+from django.db.models.functions import Extract, Floor
+from django.contrib.postgres.aggregates import BitOr
+
+from stations.registry import station_registry
+
+
+class HeartbeatRollupManager(models.Manager):
+    # Heartbeats may be committed slightly after their received timestamp was set,
+    # so every refresh also recomputes buckets touched shortly before the watermark
+    OVERLAP = datetime.timedelta(minutes=5)
+
+    REFRESH_SQL = """
+        WITH touched AS (
+            SELECT DISTINCT
+                station_id,
+                TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM "timestamp") / %(resolution)s) * %(resolution)s) AS bucket
+            FROM stations_heartbeat
+            WHERE received > %(since)s
+        )
+        INSERT INTO stations_heartbeatrollup (
+            station_id, resolution, bucket, count, received,
+            temperature_count, humidity_count, t_lens_count, t_cpu_count,
+            temperature, humidity, t_lens, t_cpu,
+            storage_primary_available, storage_permanent_available,
+            sensors, sensors_valid, state, cover_state
+        )
+        SELECT
+            h.station_id, %(resolution)s, t.bucket, COUNT(*), MAX(h.received),
+            COUNT(h.temperature), COUNT(h.humidity), COUNT(h.t_lens), COUNT(h.t_cpu),
+            AVG(h.temperature), AVG(h.humidity), AVG(h.t_lens), AVG(h.t_cpu),
+            MIN(h.storage_primary_available), MIN(h.storage_permanent_available),
+            BIT_OR(h.sensors), BIT_OR(h.sensors_valid),
+            MODE() WITHIN GROUP (ORDER BY h.state), MODE() WITHIN GROUP (ORDER BY h.cover_state)
+        FROM touched t
+        JOIN stations_heartbeat h
+            ON h.station_id = t.station_id
+            AND h."timestamp" >= t.bucket
+            AND h."timestamp" < t.bucket + MAKE_INTERVAL(secs => %(resolution)s)
+        GROUP BY h.station_id, t.bucket
+        ON CONFLICT (station_id, resolution, bucket) DO UPDATE SET
+            count = EXCLUDED.count,
+            received = EXCLUDED.received,
+            temperature_count = EXCLUDED.temperature_count,
+            humidity_count = EXCLUDED.humidity_count,
+            t_lens_count = EXCLUDED.t_lens_count,
+            t_cpu_count = EXCLUDED.t_cpu_count,
+            temperature = EXCLUDED.temperature,
+            humidity = EXCLUDED.humidity,
+            t_lens = EXCLUDED.t_lens,
+            t_cpu = EXCLUDED.t_cpu,
+            storage_primary_available = EXCLUDED.storage_primary_available,
+            storage_permanent_available = EXCLUDED.storage_permanent_available,
+            sensors = EXCLUDED.sensors,
+            sensors_valid = EXCLUDED.sensors_valid,
+            state = EXCLUDED.state,
+            cover_state = EXCLUDED.cover_state
+    """
+
+    def watermark(self, resolution):
+        return self.filter(resolution=resolution).aggregate(received=Max('received'))['received']
+
+    def refresh(self, resolution, since=None):
+        """
+        Recompute all buckets of <resolution> that contain a heartbeat received after <since>
+        (default: the watermark of the rollup, i.e. the last heartbeat already included). Returns the number of upserted buckets.
+        """
+        if since is None:
+            since = self.watermark(resolution)
+            since = datetime.datetime.min.replace(tzinfo=pytz.utc) if since is None else since - self.OVERLAP
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(self.REFRESH_SQL, {'resolution': resolution, 'since': since})
+            return cursor.rowcount
+
+    def refresh_all(self, since=None):
+        return {resolution: self.refresh(resolution, since) for resolution in self.model.RESOLUTIONS}
+
+
+class HeartbeatRollupQuerySet(models.QuerySet):
+    def for_station(self, station_code):
+        station_id = station_registry.get_id(station_code)
+        return self.none() if station_id is None else self.filter(station_id=station_id)
+
+    def for_interval(self, start=None, end=None, interval=600):
+        """
+        Select the coarsest rollup whose resolution divides <interval> and group its buckets by <interval>.
+        Returns None if no rollup is fine enough, the caller should then aggregate raw heartbeats.
+        """
+        resolution = self.model.resolution_for(interval)
+        if resolution is None:
+            return None
+
+        if end == None:
+            end = datetime.datetime.now(tz=pytz.utc)
+        if start == None:
+            start = datetime.datetime.now(tz=pytz.utc) - datetime.timedelta(days=1)
+
+        return self.filter(
+                resolution=resolution,
+                bucket__gt=start - datetime.timedelta(seconds=resolution),
+                bucket__lte=end,
+            ).order_by(
+                'bucket'
+            ).annotate(
+                unix=Floor(Extract('bucket', 'epoch') / interval) * interval,
+                time=Func(F('unix'), function="TO_TIMESTAMP", output_field=models.DateTimeField()),
+            )
+
+    @staticmethod
+    def weighted_avg(field):
+        """ Average of bucket averages of <field> weighted by the number of heartbeats that had a value of it """
+        return ExpressionWrapper(
+            Sum(F(field) * F(f'{field}_count')) / Sum(f'{field}_count', filter=Q(**{f'{field}__isnull': False})),
+            output_field=models.FloatField(),
+        )
+
+    def as_graph(self, start=None, end=None, interval=600):
+        """ Same output as HeartbeatQuerySet.as_graph, or None if no rollup can be used for <interval> """
+        rollups = self.for_interval(start, end, interval)
+        if rollups is None:
+            return None
+
+        return rollups.values(
+                'time',
+            ).annotate(
+                t_env=self.weighted_avg('temperature'),
+                h_env=self.weighted_avg('humidity'),
+                t_len=self.weighted_avg('t_lens'),
+                t_CPU=self.weighted_avg('t_cpu'),
+                cover=Max('cover_state'),
+            ).order_by()
+
+    def as_sensors_graph(self, start=None, end=None, interval=600):
+        """ Same output as HeartbeatQuerySet.as_sensors_graph, or None if no rollup can be used for <interval> """
+        rollups = self.for_interval(start, end, interval)
+        if rollups is None:
+            return None
+
+        return rollups.values(
+                'time',
+            ).annotate(
+                t_env=self.weighted_avg('temperature'),
+                bits=BitOr('sensors'),
+                bits_valid=BitOr('sensors_valid'),
+            ).order_by()
+
+
+class HeartbeatRollup(models.Model):
+    """
+    Heartbeats of a single station aggregated over a fixed time bucket, maintained by HeartbeatRollupManager.refresh.
+    Sensors are OR-ed over the bucket (a sensor is on if it was on in any heartbeat), state and cover state are modal.
+    """
+    class Meta:
+        verbose_name                = 'heartbeat rollup'
+        verbose_name_plural         = 'heartbeat rollups'
+        ordering                    = ['-bucket']
+        constraints                 = [
+                                        models.UniqueConstraint(
+                                            fields=['station', 'resolution', 'bucket'],
+                                            name='unique_heartbeat_rollup',
+                                        ),
+                                    ]
+
+    # Available resolutions in seconds, finest first
+    RESOLUTIONS                     = [60, 600, 3600]
+
+    objects                         = HeartbeatRollupManager.from_queryset(HeartbeatRollupQuerySet)()
+
+    station                         = models.ForeignKey(
+                                        'Station',
+                                        on_delete           = models.CASCADE,
+                                        related_name        = 'heartbeat_rollups',
+                                    )
+    resolution                      = models.PositiveIntegerField()
+    bucket                          = models.DateTimeField()
+    count                           = models.PositiveIntegerField()
+    received                        = models.DateTimeField(
+                                        verbose_name        = 'last heartbeat received at',
+                                    )
+
+    state                           = models.CharField(max_length=1, null=True, blank=True)
+    cover_state                     = models.CharField(max_length=1, null=True, blank=True)
+    sensors                         = models.SmallIntegerField(null=False, blank=True, default=0)
+    sensors_valid                   = models.SmallIntegerField(null=False, blank=True, default=0)
+
+    temperature                     = models.FloatField(null=True, blank=True)
+    t_lens                          = models.FloatField(null=True, blank=True)
+    t_cpu                           = models.FloatField(null=True, blank=True)
+    humidity                        = models.FloatField(null=True, blank=True)
+    # Number of heartbeats with a value of each of the averaged fields, used as weights when merging buckets
+    temperature_count               = models.PositiveIntegerField(default=0)
+    t_lens_count                    = models.PositiveIntegerField(default=0)
+    t_cpu_count                     = models.PositiveIntegerField(default=0)
+    humidity_count                  = models.PositiveIntegerField(default=0)
+
+    storage_primary_available       = models.BigIntegerField(null=True, blank=True)
+    storage_permanent_available     = models.BigIntegerField(null=True, blank=True)
+
+    @classmethod
+    def resolution_for(cls, interval):
+        """ The coarsest resolution that <interval> is a multiple of, or None """
+        suitable = [resolution for resolution in cls.RESOLUTIONS if interval % resolution == 0]
+        return max(suitable) if suitable else None
+
+    def __str__(self):
+        return f"[{self.station_id}] {self.resolution} s at {self.bucket.strftime('%Y-%m-%d %H:%M:%S')}"
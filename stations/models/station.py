@@ -2,37 +2,45 @@ import datetime
 import pytz
 
 from django.db import models
-from django.db.models import Prefetch, F, Q, OuterRef, Max, Count
+from django.db.models import Prefetch, F, Q, OuterRef, Subquery, Max, Count
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
 
-from astropy.coordinates import EarthLocation, AltAz, get_sun, get_moon
+from astropy.coordinates import EarthLocation, AltAz
 from astropy.time import Time
 
 import core.models
+from core import astronomy
 from meteors.models import Sighting
 from stations.models.heartbeat import Heartbeat
+from stations.ephemeris import ephemeris
 
 from core.templatetags.quantities import since_date_time
 
 
 class StationQuerySet(models.QuerySet):
+    def latest_per_station(self, model):
+        """
+        Ids of the latest <model> instance of every station. Each station is looked up separately with LIMIT 1
+        on the (station, timestamp) index, so the cost does not grow with the length of the history.
+        """
+        latest = model.objects.filter(station=OuterRef('pk')).order_by('-timestamp').values('id')[:1]
+        return self.annotate(latest=Subquery(latest)).filter(latest__isnull=False).values('latest')
+
     def with_last_sighting(self):
-        latest = Sighting.objects.order_by('station__id', '-timestamp').distinct('station__id')
         return self.prefetch_related(
             Prefetch(
                 'sightings',
-                queryset=Sighting.objects.filter(id__in=latest),
+                queryset=Sighting.objects.filter(id__in=self.latest_per_station(Sighting)),
                 to_attr='last_sighting',
             )
         )
 
     def with_last_heartbeat(self):
-        latest = Heartbeat.objects.order_by('station__id', '-timestamp').distinct('station__id')
         return self.prefetch_related(
             Prefetch(
                 'heartbeats',
-                queryset=Heartbeat.objects.filter(id__in=latest),
+                queryset=Heartbeat.objects.filter(id__in=self.latest_per_station(Heartbeat)),
                 to_attr='last_heartbeat',
             )
         )
@@ -171,26 +179,24 @@ class Station(core.models.NamedModel):
             location=self.earth_location()
         )
 
-    def sun_position(self, time=None):
+    def sun_position(self, time=None, engine=astronomy.ENGINE_FAST):
         if time is None:
-            time = datetime.datetime.now()
-
-        sun = get_sun(Time(time)).transform_to(self.alt_az(time))
+            return ephemeris.get(self, 'sun')
 
+        alt, az = astronomy.sun_alt_az(time, self.latitude, self.longitude, self.altitude or 0, engine=engine)
         return {
-            'alt':  sun.altaz.alt.degree,
-            'az':   sun.altaz.az.degree,
+            'alt':  float(alt),
+            'az':   float(az),
         }
 
-    def moon_position(self, time=None):
+    def moon_position(self, time=None, engine=astronomy.ENGINE_FAST):
         if time is None:
-            time = datetime.datetime.now()
-
-        moon = get_moon(Time(time)).transform_to(self.alt_az(time))
+            return ephemeris.get(self, 'moon')
 
+        alt, az = astronomy.moon_alt_az(time, self.latitude, self.longitude, self.altitude or 0, engine=engine)
         return {
-            'alt':  moon.altaz.alt.degree,
-            'az':   moon.altaz.az.degree,
+            'alt':  float(alt),
+            'az':   float(az),
         }
 
     def location(self):
@@ -218,6 +224,7 @@ class Station(core.models.NamedModel):
             return StatusOK(last_heartbeat)
 
     def json(self):
+        sun = self.sun_position()
         return {
             'id': self.id,
             'code': self.code,
@@ -226,8 +233,8 @@ class Station(core.models.NamedModel):
             'longitude': self.longitude,
             'altitude': self.altitude,
             'status': self.get_current_status().short,
-            'sun-alt': self.sun_position()['alt'],
-            'sun-az': self.sun_position()['az'],
+            'sun-alt': None if sun is None else sun['alt'],
+            'sun-az': None if sun is None else sun['az'],
         }
 
 
@@ -0,0 +1,117 @@
+"""
+Management of the monthly partitions of the heartbeat table (see migration 0060_heartbeat_partitioning).
+
+Partitions are named stations_heartbeat_pYYYY_MM and cover one calendar month of heartbeat timestamps.
+Rows that do not fit any partition land in stations_heartbeat_default and are moved out when
+a matching partition is created. Old partitions can be detached from the table and moved to the
+archive schema, where they are still available to SQL but no longer scanned by the application.
+"""
+
+import re
+import datetime
+import logging
+
+from django.db import connection, transaction
+
+log = logging.getLogger(__name__)
+
+TABLE = 'stations_heartbeat'
+DEFAULT = f'{TABLE}_default'
+ARCHIVE_SCHEMA = 'heartbeat_archive'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def first_of_month(date):
+    return datetime.date(date.year, date.month, 1)
+
+
+def month_add(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+
+def list_partitions():
+    """ Return a sorted list of months (first day) of all monthly partitions currently attached to the heartbeat table """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass", [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(month):
+    """
+    Create the partition for <month>. Heartbeats for that month that are already in the default partition
+    are moved to the new partition (PostgreSQL refuses to create it otherwise).
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), month_add(month, 1).isoformat()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE "timestamp" >= %s AND "timestamp" < %s)', [start, end])
+        if cursor.fetchone()[0]:
+            log.info(f"Moving heartbeats for {month:%Y-%m} out of the default partition")
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT}')
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)', [start, end])
+            cursor.execute(f'INSERT INTO {name} SELECT * FROM {DEFAULT} WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+            cursor.execute(f'DELETE FROM {DEFAULT} WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT} DEFAULT')
+        else:
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+    log.info(f"Created heartbeat partition {name}")
+    return name
+
+
+def ensure_partitions(ahead=3, today=None):
+    """ Make sure partitions exist from the current month up to <ahead> months in the future. Returns the list of created partitions """
+    current = first_of_month(today or datetime.date.today())
+    existing = set(list_partitions())
+
+    return [
+        create_partition(month_add(current, offset))
+        for offset in range(0, ahead + 1)
+        if month_add(current, offset) not in existing
+    ]
+
+
+def detach_partitions(retain, drop=False, today=None):
+    """
+    Detach partitions that are entirely older than <retain> months before the current month.
+    Detached partitions are moved to the archive schema, or dropped if <drop> is set.
+    """
+    cutoff = month_add(first_of_month(today or datetime.date.today()), -retain)
+    detached = []
+
+    for month in list_partitions():
+        if month >= cutoff:
+            continue
+
+        name = partition_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+                log.info(f"Dropped heartbeat partition {name}")
+            else:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}')
+                cursor.execute(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}')
+                log.info(f"Archived heartbeat partition {name} to schema {ARCHIVE_SCHEMA}")
+        detached.append(name)
+
+    return detached
@@ -0,0 +1,89 @@
+import time
+import threading
+import logging
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+
+log = logging.getLogger(__name__)
+
+
+class StationRegistry():
+    """
+    Per-process map of station codes to primary keys, so that ingest and filtering by code do not
+    have to query or join the station table. Invalidated by Station signals in this process and
+    additionally expired after `ttl` seconds to pick up changes made by other worker processes.
+    A code that is not in the map reloads it once, so stations created elsewhere are found immediately,
+    and is then remembered as unknown until the map is loaded again. Inserts through `insert` detect ids
+    of stations deleted elsewhere.
+    """
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.codes = None
+        self.missing = set()
+        self.loaded = 0
+
+    def invalidate(self, *args, **kwargs):
+        with self.lock:
+            self.codes = None
+
+    def load(self):
+        Station = apps.get_model('stations', 'Station')
+        codes = dict(Station.objects.values_list('code', 'id'))
+        log.debug(f"Station registry loaded with {len(codes)} stations")
+        return codes
+
+    def get_codes(self, reload=False):
+        with self.lock:
+            if reload or self.codes is None or time.monotonic() - self.loaded > self.ttl:
+                self.codes = self.load()
+                self.missing = set()
+                self.loaded = time.monotonic()
+            return self.codes
+
+    def get_id(self, code):
+        """ Return the primary key of the station with the given code, or None if there is none """
+        loaded = self.loaded
+        codes = self.get_codes()
+        if code in codes or code in self.missing:
+            return codes.get(code)
+
+        # Do not load the map twice if it has just expired
+        if self.loaded == loaded:
+            codes = self.get_codes(reload=True)
+        if code not in codes:
+            with self.lock:
+                self.missing.add(code)
+        return codes.get(code)
+
+    def require_id(self, code):
+        """ Return the primary key of the station with the given code, raise Station.DoesNotExist if there is none """
+        station_id = self.get_id(code)
+        if station_id is None:
+            Station = apps.get_model('stations', 'Station')
+            raise Station.DoesNotExist(f"Station {code} does not exist")
+        return station_id
+
+    def insert(self, code, function):
+        """
+        Return function(station_id) that inserts rows for the station with <code>. The foreign keys of heartbeats
+        and sightings to stations are checked at the INSERT, so a station deleted or re-coded by another process
+        since the map was loaded fails the insert. Only then the map is reloaded and the insert retried
+        with the current id, or Station.DoesNotExist is raised like for an unknown code.
+        """
+        station_id = self.require_id(code)
+        try:
+            with transaction.atomic():
+                return function(station_id)
+        except IntegrityError:
+            current = self.get_codes(reload=True).get(code)
+            if current == station_id:
+                raise
+            log.warning(f"Station {code} was deleted or re-coded since the registry was loaded")
+
+        with transaction.atomic():
+            return function(self.require_id(code))
+
+
+station_registry = StationRegistry()
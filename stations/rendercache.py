@@ -0,0 +1,61 @@
+import os
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+# Increase whenever the rendering changes, so that neither the caches nor the clients serve images rendered the old way
+RENDER_VERSION = 1
+
+
+class RenderCache():
+    """
+    Store for rendered images, addressed by a key that fully determines the image.
+    Permanent images (of windows entirely in the past) are kept on disk under MEDIA_ROOT forever,
+    volatile images (of windows that still receive data) are kept in the Django cache for a limited time.
+    Digests of keys include the render version, they are used as file names, cache keys and ETags.
+    """
+    def __init__(self, prefix='render', extension='png', version=RENDER_VERSION):
+        self.prefix = prefix
+        self.extension = extension
+        self.version = version
+
+    def digest(self, key):
+        return hashlib.sha1(f'{self.version}:{key}'.encode()).hexdigest()
+
+    def path(self, key):
+        digest = self.digest(key)
+        return os.path.join(settings.MEDIA_ROOT, settings.GRAPH_CACHE_DIRECTORY, self.prefix, digest[:2], f'{digest}.{self.extension}')
+
+    def cache_key(self, key):
+        return f'{self.prefix}:{self.digest(key)}'
+
+    def get(self, key, permanent):
+        if permanent:
+            try:
+                with open(self.path(key), 'rb') as file:
+                    return file.read()
+            except FileNotFoundError:
+                return None
+        else:
+            return cache.get(self.cache_key(key))
+
+    def set(self, key, content, permanent):
+        if permanent:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so that concurrent readers never see a partial image
+            descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(content)
+            os.replace(temporary, path)
+            log.debug(f"Stored permanent render {path}")
+        else:
+            cache.set(self.cache_key(key), content, timeout=settings.GRAPH_CACHE_TIMEOUT)
+
+
+graph_cache = RenderCache('graphs')
@@ -0,0 +1,20 @@
+from celery import shared_task
+
+from django.conf import settings
+
+from stations import partitions
+from stations.models import HeartbeatRollup
+
+
+@shared_task
+def maintain_heartbeat_partitions():
+    created = partitions.ensure_partitions(settings.HEARTBEAT_PARTITIONS_AHEAD)
+    detached = []
+    if settings.HEARTBEAT_PARTITIONS_RETAIN is not None:
+        detached = partitions.detach_partitions(settings.HEARTBEAT_PARTITIONS_RETAIN)
+    return {'created': created, 'detached': detached}
+
+
+@shared_task
+def refresh_heartbeat_rollups():
+    return HeartbeatRollup.objects.refresh_all()
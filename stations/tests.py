@@ -1,3 +1,834 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+import pytz
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import BoolOr
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import core.database
+import core.loader
+from core import export
+from stations import decoder, partitions
+from stations.export import DATASETS
+from stations.models import Country, Subnetwork, Station, Heartbeat, HeartbeatRollup
+from stations.models.heartbeat import SensorBit
+from stations.ephemeris import ephemeris
+from stations.rendercache import graph_cache
+from stations.views.station import ScatterView
+from stations.registry import station_registry
+
+
+def heartbeat_report(second=0, **changes):
+    """ A heartbeat report as sent by a station, at <second> past 22:00 on 2021-08-12 """
+    report = {
+        'auto': True, 'time': f'2021-08-12T22:00:{second:02d}Z', 'st': 'D',
+        'dome': {'s': None, 't': None, 'z': None},
+        'disk': {'prim': {'a': 1, 't': 2}, 'perm': {'a': 3, 't': 4}},
+    }
+    report.update(changes)
+    return report
+
+
+def status_string(*positions, length=decoder.STATUS_WIDTH):
+    """ A status string of <length> characters with the flags at <positions> set """
+    return ''.join('x' if position in positions else '-' for position in range(length))
+
+
+class DecoderTest(SimpleTestCase):
+    """ Single and vectorized decoding of status strings must agree """
+    STATUSES = [
+        status_string(),
+        status_string(0, 1, 4, 9),
+        status_string(0, 5, 25),
+        status_string(14, 2, 11),
+        status_string(3, 7, 10),
+        status_string(6, length=decoder.STATUS_MIN_LENGTH),
+        status_string(2, length=decoder.STATUS_WIDTH - 1) + 'é',
+        'é' * decoder.STATUS_WIDTH,
+    ]
+
+    def test_single(self):
+        decoded = decoder.decode_status_string(status_string(0, 1, 4, 25))
+        self.assertEqual(decoded['cover_state'], 'o')
+        self.assertTrue(decoded['lens_heating'])
+        self.assertTrue(decoded['rain_emergency_closing'])
+        self.assertFalse(decoded['camera_heating'])
+
+        self.assertEqual(decoder.decode_status_string(status_string(0))['cover_state'], 'c')
+        self.assertEqual(decoder.decode_status_string(status_string(2, 14))['cover_state'], 'S')
+        self.assertEqual(decoder.decode_status_string(status_string(2))['cover_state'], 'O')
+        self.assertEqual(decoder.decode_status_string(status_string(3))['cover_state'], 'C')
+        self.assertEqual(decoder.decode_status_string(status_string())['cover_state'], 'P')
+
+    def test_missing_and_short(self):
+        self.assertEqual(set(decoder.decode_status_string(None).values()), {None})
+        with self.assertRaises(ValueError):
+            decoder.decode_status_string(status_string(length=decoder.STATUS_MIN_LENGTH - 1))
+
+    def test_pack(self):
+        self.assertEqual(decoder.pack_sensors({}), (0, 0))
+        bits, valid = decoder.pack_sensors({'lens_heating': True, 'fan_active': False, 'computer_power': None})
+        self.assertEqual(bits, decoder.SENSOR_BITS['lens_heating'])
+        self.assertEqual(valid, decoder.SENSOR_BITS['lens_heating'] | decoder.SENSOR_BITS['fan_active'])
+
+        bits, valid = decoder.pack_sensors(decoder.decode_status_string(status_string(*decoder.SENSORS.values())))
+        self.assertEqual((bits, valid), (decoder.ALL_SENSOR_BITS, decoder.ALL_SENSOR_BITS))
+
+    def test_vectorized(self):
+        statuses = self.STATUSES + [None, '', status_string(length=decoder.STATUS_MIN_LENGTH - 1)]
+        sensors, cover, valid = decoder.decode_status_strings(statuses)
+        bits, bits_valid = decoder.pack_sensor_arrays(sensors, valid)
+        self.assertEqual(valid.tolist(), [True] * len(self.STATUSES) + [False] * 3)
+
+        for index, status in enumerate(self.STATUSES):
+            decoded = decoder.decode_status_string(status)
+            self.assertEqual(chr(cover[index]), decoded['cover_state'])
+            self.assertEqual((bits[index], bits_valid[index]), decoder.pack_sensors(decoded))
+        self.assertEqual(cover[~valid].tolist(), [0, 0, 0])
+        self.assertEqual(bits_valid[~valid].tolist(), [0, 0, 0])
+
+
+class StationTestCase(TestCase):
+    """ A single station AGO in subnetwork SK """
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(name='Slovakia')
+        cls.subnetwork = Subnetwork.objects.create(code='SK', name='Slovakia', timezone='Europe/Bratislava')
+        cls.station = Station.objects.create(
+            code='AGO', name='Modra', subnetwork=cls.subnetwork, country=cls.country,
+            latitude=48.37, longitude=17.27, altitude=531, timezone='Europe/Bratislava', on=True,
+        )
+
+
+class DecodeHeartbeatsCommandTest(StationTestCase):
+    """ decode_heartbeats rewrites the packed sensors and the cover state from the stored status strings """
+    def test_decode(self):
+        # Stays within the column width whether the database counts characters or bytes
+        statuses = DecoderTest.STATUSES[:-2] + ['é' * 10]
+        Heartbeat.objects.bulk_create([
+            Heartbeat(station=self.station, status_string=status, sensors=0, sensors_valid=0, cover_state=None)
+            for status in statuses
+        ] + [Heartbeat(station=self.station, status_string=None, sensors=1, sensors_valid=1)])
+
+        call_command('decode_heartbeats', chunk_size=3, stdout=io.StringIO())
+
+        heartbeats = Heartbeat.objects.exclude(status_string=None).order_by('id')
+        for heartbeat, status in zip(heartbeats, statuses[:-1]):
+            decoded = decoder.decode_status_string(status)
+            self.assertEqual((heartbeat.sensors, heartbeat.sensors_valid), decoder.pack_sensors(decoded))
+            self.assertEqual(heartbeat.cover_state, decoded['cover_state'])
+
+        short = heartbeats.last()
+        self.assertEqual((short.sensors, short.sensors_valid, short.cover_state), (0, 0, None))
+        untouched = Heartbeat.objects.get(status_string=None)
+        self.assertEqual((untouched.sensors, untouched.sensors_valid), (1, 1))
+
+
+class SensorBitTest(StationTestCase):
+    """ Packed sensors read back through properties, SensorBit filters and BitOr aggregation as they were packed """
+    SENSORS = [
+        {},
+        {'lens_heating': True, 'fan_active': False},
+        {'lens_heating': False, 'fan_active': True, 'computer_power': True},
+        {name: True for name in decoder.SENSOR_BITS},
+        {name: False for name in decoder.SENSOR_BITS},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # All within a single minute of the last day, so that they fall into a single bucket of the graphs
+        now = timezone.now().replace(second=0, microsecond=0) - datetime.timedelta(hours=1)
+        heartbeats = []
+        for index, sensors in enumerate(cls.SENSORS):
+            bits, valid = decoder.pack_sensors(sensors)
+            heartbeats.append(Heartbeat(
+                station=cls.station, timestamp=now + datetime.timedelta(seconds=index), sensors=bits, sensors_valid=valid,
+            ))
+        cls.heartbeats = Heartbeat.objects.bulk_create(heartbeats)
+
+    def test_properties(self):
+        for heartbeat, sensors in zip(self.heartbeats, self.SENSORS):
+            for name in decoder.SENSOR_BITS:
+                self.assertEqual(getattr(heartbeat, name), sensors.get(name))
+
+        heartbeat = Heartbeat(sensors=0, sensors_valid=0)
+        for name, value in self.SENSORS[2].items():
+            setattr(heartbeat, name, value)
+        self.assertEqual((heartbeat.sensors, heartbeat.sensors_valid), decoder.pack_sensors(self.SENSORS[2]))
+        heartbeat.computer_power = None
+        self.assertIsNone(heartbeat.computer_power)
+        self.assertEqual(heartbeat.sensors_valid, decoder.SENSOR_BITS['lens_heating'] | decoder.SENSOR_BITS['fan_active'])
+
+    def test_with_sensor(self):
+        for name in decoder.SENSOR_BITS:
+            for value in [True, False, None]:
+                expected = {
+                    heartbeat.id for heartbeat, sensors in zip(self.heartbeats, self.SENSORS) if sensors.get(name) is value
+                }
+                found = set(Heartbeat.objects.with_sensor(name, value).values_list('id', flat=True))
+                self.assertEqual(found, expected, f"{name} = {value}")
+
+    def test_bit_or(self):
+        bits, valid = 0, 0
+        for sensors in self.SENSORS:
+            packed = decoder.pack_sensors(sensors)
+            bits, valid = bits | packed[0], valid | packed[1]
+
+        graph = list(Heartbeat.objects.as_sensors_graph())
+        self.assertEqual(len(graph), 1)
+        self.assertEqual((graph[0]['bits'], graph[0]['bits_valid']), (bits, valid))
+
+        aggregated = Heartbeat.objects.aggregate(**{name: BoolOr(SensorBit(name)) for name in decoder.SENSOR_BITS})
+        for name, value in aggregated.items():
+            self.assertEqual(value, any(sensors.get(name) for sensors in self.SENSORS), name)
+
+
+class PartitionTest(StationTestCase):
+    """ Monthly partitions of the heartbeat table: pruning by timestamp and their management """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for month in [datetime.date(2019, 1, 1), datetime.date(2019, 2, 1)]:
+            partitions.create_partition(month)
+            Heartbeat.objects.bulk_create([
+                Heartbeat(station=cls.station, timestamp=datetime.datetime(month.year, month.month, day, tzinfo=pytz.utc))
+                for day in range(1, 11)
+            ])
+        # Fire the deferred foreign key checks now, PostgreSQL refuses to drop a table with pending ones
+        connection.check_constraints()
+
+    def assertScansOnly(self, queryset, month):
+        plan = queryset.explain()
+        self.assertIn(partitions.partition_name(month), plan)
+        for other in [partitions.partition_name(datetime.date(2019, 2, 1)), partitions.DEFAULT]:
+            self.assertNotIn(other, plan)
+
+    def test_pruning(self):
+        start = datetime.datetime(2019, 1, 2, tzinfo=pytz.utc)
+        end = datetime.datetime(2019, 1, 5, tzinfo=pytz.utc)
+        january = datetime.date(2019, 1, 1)
+
+        self.assertEqual(Heartbeat.objects.as_scatter(start, end).count(), 4)
+        self.assertScansOnly(Heartbeat.objects.as_scatter(start, end), january)
+        self.assertScansOnly(Heartbeat.objects.for_floored_interval(start, end, 3600), january)
+        self.assertScansOnly(Heartbeat.objects.as_graph(start, end, 3600), january)
+
+    def test_move_from_default(self):
+        timestamp = datetime.datetime(2018, 6, 15, tzinfo=pytz.utc)
+        Heartbeat.objects.create(station=self.station, timestamp=timestamp)
+        self.assertEqual(self.count(partitions.DEFAULT), 1)
+
+        name = partitions.create_partition(datetime.date(2018, 6, 1))
+        self.assertEqual(self.count(partitions.DEFAULT), 0)
+        self.assertEqual(self.count(name), 1)
+        self.assertEqual(Heartbeat.objects.get(timestamp=timestamp).station, self.station)
+
+    def test_command_create(self):
+        current = partitions.first_of_month(datetime.date.today())
+        expected = [partitions.month_add(current, offset) for offset in range(0, 6)]
+        self.assertNotIn(expected[-1], partitions.list_partitions())
+
+        out = io.StringIO()
+        call_command('heartbeat_partitions', ahead=5, stdout=out)
+        self.assertIn(f"Created {partitions.partition_name(expected[-1])}", out.getvalue())
+        self.assertTrue(set(expected) <= set(partitions.list_partitions()))
+
+        out = io.StringIO()
+        call_command('heartbeat_partitions', ahead=5, stdout=out)
+        self.assertNotIn("Created", out.getvalue())
+
+    def test_command_detach(self):
+        # Retain everything from February 2019 on
+        today = datetime.date.today()
+        retain = (today.year - 2019) * 12 + today.month - 2
+        out = io.StringIO()
+        call_command('heartbeat_partitions', retain=retain, stdout=out)
+        self.assertIn(f"Archived {partitions.partition_name(datetime.date(2019, 1, 1))}", out.getvalue())
+
+        months = partitions.list_partitions()
+        self.assertNotIn(datetime.date(2019, 1, 1), months)
+        self.assertIn(datetime.date(2019, 2, 1), months)
+        self.assertEqual(Heartbeat.objects.filter(timestamp__year=2019).count(), 10)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {partitions.ARCHIVE_SCHEMA}.{partitions.partition_name(datetime.date(2019, 1, 1))}")
+            self.assertEqual(cursor.fetchone()[0], 10)
+
+    def test_command_drop(self):
+        call_command('heartbeat_partitions', retain=1, drop=True, stdout=io.StringIO())
+        self.assertEqual(Heartbeat.objects.filter(timestamp__year=2019).count(), 0)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [partitions.partition_name(datetime.date(2019, 1, 1))])
+            self.assertIsNone(cursor.fetchone()[0])
+
+    @staticmethod
+    def count(table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            return cursor.fetchone()[0]
+
+
+class HeartbeatRollupTest(StationTestCase):
+    """ Graphs from refreshed rollups must equal the same graphs aggregated from raw heartbeats """
+    START = datetime.datetime(2021, 8, 12, 22, 0, tzinfo=pytz.utc)
+    END = START + datetime.timedelta(hours=1)
+
+    def heartbeats(self, minutes, **values):
+        Heartbeat.objects.bulk_create([
+            Heartbeat(station=self.station, timestamp=self.START + datetime.timedelta(minutes=minute), **values)
+            for minute in minutes
+        ])
+
+    def assertGraphsEqual(self, interval):
+        raw = {row['time']: row for row in Heartbeat.objects.as_graph(self.START, self.END, interval)}
+        rolled = {row['time']: row for row in HeartbeatRollup.objects.as_graph(self.START, self.END, interval)}
+        self.assertEqual(rolled.keys(), raw.keys())
+        # Only the averages, the cover state of a rollup is modal rather than the maximum
+        for time, row in raw.items():
+            for key in ['t_env', 'h_env', 't_len', 't_CPU']:
+                if row[key] is None:
+                    self.assertIsNone(rolled[time][key], f"{key} at {time}")
+                else:
+                    self.assertAlmostEqual(rolled[time][key], row[key], msg=f"{key} at {time}")
+
+    def test_refresh(self):
+        # Humidity and the lens temperature are missing from most heartbeats of the first ten minutes
+        self.heartbeats(range(0, 9), temperature=10, t_cpu=40)
+        self.heartbeats([9], temperature=12, humidity=50, t_lens=5, t_cpu=42)
+        self.heartbeats(range(10, 13), temperature=20, humidity=80, t_lens=15, t_cpu=None)
+        self.heartbeats([30, 31])
+
+        self.assertEqual(HeartbeatRollup.objects.refresh(600), 3)
+        self.assertEqual(HeartbeatRollup.objects.refresh(60), 15)
+        self.assertGraphsEqual(600)
+        self.assertGraphsEqual(1200)
+        self.assertGraphsEqual(120)
+
+        # Only the bucket of a heartbeat received after the watermark is recomputed
+        Heartbeat.objects.update(received=self.START)
+        self.heartbeats([14], temperature=30, humidity=20, t_lens=25, t_cpu=50)
+        self.assertEqual(HeartbeatRollup.objects.refresh(600, since=self.END), 1)
+        self.assertEqual(HeartbeatRollup.objects.get(resolution=600, bucket=self.START + datetime.timedelta(minutes=10)).count, 4)
+        self.assertGraphsEqual(1200)
+
+
+class EphemerisTest(StationTestCase):
+    """ Cached positions of the Sun and the Moon follow changes of stations """
+    def setUp(self):
+        cache.clear()
+
+    def assertPositionAlmostEqual(self, position, expected):
+        # Positions move by a fraction of a degree within a bucket, in case the test crosses into the next one
+        self.assertAlmostEqual(position['alt'], expected['alt'], delta=1)
+        self.assertAlmostEqual((position['az'] - expected['az'] + 180) % 360 - 180, 0, delta=1)
+
+    def expected(self, station, body):
+        return ephemeris.compute(ephemeris.floor(timezone.now()))[station.id][body]
+
+    def test_cached(self):
+        ephemeris.get_positions()
+        with self.assertNumQueries(0):
+            ephemeris.get_positions()
+
+    def test_moved(self):
+        self.assertPositionAlmostEqual(self.station.sun_position(), self.expected(self.station, 'sun'))
+
+        # To the antipode, where the Sun is in the opposite direction
+        self.station.latitude, self.station.longitude = -self.station.latitude, self.station.longitude - 180
+        self.station.save()
+        station = Station.objects.get(id=self.station.id)
+        self.assertPositionAlmostEqual(station.sun_position(), self.expected(station, 'sun'))
+        self.assertPositionAlmostEqual(station.moon_position(), self.expected(station, 'moon'))
+
+    def test_added_and_deleted(self):
+        ephemeris.get_positions()
+        station = Station.objects.create(
+            code='ARBO', name='Arboretum', subnetwork=self.subnetwork, country=self.country,
+            latitude=48.32, longitude=18.32, altitude=200, timezone='Europe/Bratislava',
+        )
+        self.assertIn(station.id, ephemeris.get_positions())
+        self.assertPositionAlmostEqual(station.moon_position(), self.expected(station, 'moon'))
+
+        station_id = station.id
+        station.delete()
+        self.assertNotIn(station_id, ephemeris.get_positions())
+
+
+class ScatterViewTest(StationTestCase):
+    """ Rendered graphs are cached until new data arrive, and conditional requests are answered without rendering """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_user('observer')
+
+    def setUp(self):
+        # Permanent graphs are written to disk, keep them in a directory of their own
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('station-graph', kwargs={'code': self.station.code})
+        self.heartbeat(hours=1)
+
+    def heartbeat(self, **delta):
+        Heartbeat.objects.create(
+            station=self.station, timestamp=timezone.now() - datetime.timedelta(**delta),
+            temperature=15, humidity=60, t_lens=12, t_cpu=40,
+            storage_primary_available=2**30, storage_permanent_available=2**31,
+        )
+
+    def get(self, *args, **kwargs):
+        """ GET the graph, return the response and the number of renders it took """
+        with patch.object(ScatterView, 'load_dataframes', autospec=True, side_effect=ScatterView.load_dataframes) as load:
+            response = self.client.get(*args, **kwargs)
+        return response, load.call_count
+
+    def test_hit(self):
+        first, renders = self.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(renders, 1)
+
+        second, renders = self.get(self.url)
+        self.assertEqual(renders, 0)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, first.content)
+
+    def test_not_modified(self):
+        first, _ = self.get(self.url)
+        response, renders = self.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(renders, 0)
+
+    def test_new_heartbeat(self):
+        first, _ = self.get(self.url)
+        self.heartbeat(minutes=1)
+
+        response, renders = self.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_permanent(self):
+        window = {
+            'start': (timezone.now() - datetime.timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'end': (timezone.now() - datetime.timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        first, renders = self.get(self.url, window)
+        self.assertEqual(renders, 1)
+        self.assertIn('max-age=86400', first['Cache-Control'])
+
+        cache.clear()
+        second, renders = self.get(self.url, window)
+        self.assertEqual(renders, 0)
+        self.assertEqual(second.content, first.content)
+
+    def test_render_version(self):
+        first, _ = self.get(self.url)
+        with patch.object(graph_cache, 'version', graph_cache.version + 1):
+            response, renders = self.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class ExportTest(StationTestCase):
+    """ Streaming exports of heartbeats as CSV and Parquet """
+    START = datetime.datetime(2021, 8, 12, 22, 0, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_user('observer')
+        other = Station.objects.create(
+            code='ARBO', name='Arboretum', subnetwork=cls.subnetwork, country=cls.country,
+            latitude=48.32, longitude=18.32, altitude=200, timezone='Europe/Bratislava',
+        )
+        heartbeats = [
+            Heartbeat(station=station, timestamp=cls.START + datetime.timedelta(minutes=minute), temperature=minute or None)
+            for station in [cls.station, other] for minute in range(0, 10)
+        ]
+        heartbeats[1].lens_heating = True
+        heartbeats[2].lens_heating = False
+        Heartbeat.objects.bulk_create(heartbeats)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def download(self, format, **params):
+        response = self.client.get(reverse('export', kwargs={'dataset': 'heartbeats', 'format': format}), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, content = self.download('csv', station='AGO', start='2021-08-12T22:02:00', end='2021-08-12T22:08:00')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('heartbeats-AGO-20210812T220200-20210812T220800.csv', response['Content-Disposition'])
+
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0], DATASETS['heartbeats'].columns)
+        self.assertEqual(len(rows), 1 + 6)
+        self.assertEqual({row[3] for row in rows[1:]}, {'AGO'})
+        self.assertEqual([row[-8] for row in rows[1:]], [str(float(minute)) for minute in range(2, 8)])
+
+    def test_csv_chunks(self):
+        queryset = DATASETS['heartbeats'].get_queryset()
+        chunks = list(export.stream_csv(queryset, DATASETS['heartbeats'].columns, chunk_size=3))
+        self.assertEqual(len(chunks), 7)
+        self.assertEqual(len(list(csv.reader(io.StringIO(''.join(chunks))))), 1 + 20)
+
+    @skipUnless(export.pyarrow, "pyarrow is not installed")
+    def test_parquet(self):
+        response, content = self.download('parquet', station='AGO')
+        self.assertEqual(response['Content-Type'], export.CONTENT_TYPES['parquet'])
+
+        table = export.pyarrow.parquet.read_table(io.BytesIO(content))
+        self.assertEqual(table.column_names, DATASETS['heartbeats'].columns)
+        self.assertEqual(table.num_rows, 10)
+
+        data = table.to_pydict()
+        expected = list(Heartbeat.objects.filter(station=self.station).order_by('timestamp'))
+        self.assertEqual(data['id'], [heartbeat.id for heartbeat in expected])
+        self.assertEqual(data['timestamp'], [heartbeat.timestamp for heartbeat in expected])
+        self.assertEqual(data['temperature'], [heartbeat.temperature for heartbeat in expected])
+        self.assertEqual(data['lens_heating'][:3], [None, True, False])
+
+    @skipUnless(export.pyarrow, "pyarrow is not installed")
+    def test_parquet_row_groups(self):
+        content = b''.join(export.stream_parquet(DATASETS['heartbeats'].get_queryset(), ['id', 'timestamp'], chunk_size=8))
+        parquet = export.pyarrow.parquet.ParquetFile(io.BytesIO(content))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(parquet.metadata.num_rows, 20)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'heartbeats.csv')
+            call_command('export_data', 'heartbeats', subnetwork='SK', start='2021-08-12', chunk_size=4, output=path)
+            with open(path, newline='') as file:
+                self.assertEqual(len(list(csv.reader(file))), 1 + 20)
+
+        out = io.StringIO()
+        call_command('export_data', 'heartbeats', station='AGO', chunk_size=4, stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], DATASETS['heartbeats'].columns)
+        self.assertEqual(len(rows), 1 + 10)
+
+    def test_invalid(self):
+        url = reverse('export', kwargs={'dataset': 'heartbeats', 'format': 'csv'})
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'station': 'XXX'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export', kwargs={'dataset': 'nothing', 'format': 'csv'})).status_code, 404)
+
+
+class LoaderTest(StationTestCase):
+    """ Arrays loaded through COPY must hold the same values as the ORM returns """
+    START = datetime.datetime(2021, 8, 12, 22, 0, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        heartbeats = []
+        for index in range(30):
+            heartbeat = Heartbeat(
+                station=cls.station,
+                timestamp=cls.START + datetime.timedelta(seconds=47 * index, microseconds=123457 * index),
+                automatic=index % 3 == 0,
+                state=None if index % 5 == 0 else 'O',
+                cover_state=None if index % 4 == 0 else 'c',
+                cover_position=None if index % 2 else index * 100,
+                temperature=None if index % 3 == 1 else index / 7,
+                humidity=None if index % 6 == 0 else 50 + index / 3,
+                storage_primary_available=None if index == 5 else 2**40 + index,
+            )
+            heartbeat.lens_heating = None if index % 4 == 0 else index % 2 == 0
+            heartbeats.append(heartbeat)
+        Heartbeat.objects.bulk_create(heartbeats)
+
+    def assertLoaded(self, queryset, columns=None):
+        arrays = core.loader.load_arrays(queryset, columns)
+        rows = list(queryset.values_list(*arrays))
+        self.assertEqual(list(arrays), columns or core.loader.concrete_columns(queryset.model))
+
+        for index, (column, values) in enumerate(arrays.items()):
+            expected = [row[index] for row in rows]
+            self.assertEqual(len(values), len(expected), column)
+            if values.dtype.kind == 'M':
+                expected = [np.datetime64('NaT') if value is None else np.datetime64(value.replace(tzinfo=None), 'ns') for value in expected]
+                np.testing.assert_array_equal(values, np.array(expected, dtype='datetime64[ns]'), err_msg=column)
+            elif values.dtype.kind == 'f':
+                np.testing.assert_array_equal(values, np.array([np.nan if value is None else value for value in expected], dtype=float), err_msg=column)
+            else:
+                self.assertEqual(values.tolist(), expected, column)
+        return arrays
+
+    def test_all_columns(self):
+        arrays = self.assertLoaded(Heartbeat.objects.order_by('timestamp'))
+        self.assertEqual(arrays['timestamp'].dtype, np.dtype('datetime64[ns]'))
+        self.assertEqual(arrays['station_id'].dtype, np.dtype('int64'))
+        self.assertEqual(arrays['temperature'].dtype, np.dtype('float64'))
+        self.assertEqual(arrays['cover_position'].dtype, np.dtype('float64'))
+        self.assertEqual(arrays['automatic'].dtype, np.dtype('bool'))
+        self.assertIsNone(arrays['cover_state'][0])
+
+    def test_relations_and_annotations(self):
+        queryset = Heartbeat.objects.filter(temperature__isnull=False).annotate(lens=SensorBit('lens_heating')).order_by('-timestamp')
+        arrays = self.assertLoaded(queryset, ['lens', 'station__code', 'station', 'timestamp', 'storage_primary_available'])
+        self.assertEqual(set(arrays['station__code']), {'AGO'})
+
+    def test_grouped(self):
+        end = self.START + datetime.timedelta(hours=1)
+        columns = ['time', 't_env', 't_CPU', 't_len', 'h_env', 'cover']
+        self.assertLoaded(Heartbeat.objects.as_graph(self.START, end, 600).order_by('time'), columns)
+
+        HeartbeatRollup.objects.refresh(600)
+        arrays = self.assertLoaded(HeartbeatRollup.objects.as_graph(self.START, end, 1200).order_by('time'), columns)
+        self.assertEqual(len(arrays['time']), 2)
+
+    def test_empty(self):
+        for queryset in [Heartbeat.objects.none(), Heartbeat.objects.filter(timestamp__lt=self.START)]:
+            arrays = self.assertLoaded(queryset, ['timestamp', 'temperature', 'station__code'])
+            self.assertEqual(arrays['timestamp'].dtype, np.dtype('datetime64[ns]'))
+
+        frame = core.loader.load_dataframe(Heartbeat.objects.order_by('timestamp'), ['timestamp', 'temperature'], index='timestamp')
+        self.assertEqual(str(frame.index.tz), 'UTC')
+        self.assertEqual(frame.index[0], self.START)
+
+
+class StationRegistryTest(StationTestCase):
+    """ The registry answers known codes from memory and reloads on a miss or a change of a station """
+    def setUp(self):
+        station_registry.invalidate()
+        station_registry.get_codes()
+
+    def test_hit(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(station_registry.get_id('AGO'), self.station.id)
+            self.assertEqual(station_registry.require_id('AGO'), self.station.id)
+
+    def test_miss_reloads(self):
+        # Bulk creation sends no signals, like a station created by another process
+        other, = Station.objects.bulk_create([Station(
+            code='ARBO', name='Arboretum', subnetwork=self.subnetwork, country=self.country,
+            latitude=48.3, longitude=18.4, altitude=200, timezone='Europe/Bratislava', on=True,
+        )])
+        with self.assertNumQueries(1):
+            self.assertEqual(station_registry.get_id('ARBO'), other.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(station_registry.get_id('ARBO'), other.id)
+
+    def test_unknown(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(station_registry.get_id('XXX'))
+        # Remembered as unknown until the map expires or is invalidated
+        with self.assertNumQueries(0):
+            self.assertIsNone(station_registry.get_id('XXX'))
+            with self.assertRaises(Station.DoesNotExist):
+                station_registry.require_id('XXX')
+            self.assertEqual(list(Heartbeat.objects.for_station('XXX')), [])
+
+        station_registry.loaded -= station_registry.ttl + 1
+        with self.assertNumQueries(1):
+            self.assertIsNone(station_registry.get_id('XXX'))
+
+    def test_insert_queries(self):
+        # Only the INSERT in its savepoint, the station is neither queried nor checked separately
+        with CaptureQueriesContext(connection) as queries:
+            Heartbeat.objects.create_from_POST('AGO', **heartbeat_report())
+        statements = [query['sql'].split()[0].upper() for query in queries]
+        self.assertEqual(statements, ['SAVEPOINT', 'INSERT', 'RELEASE'])
+
+    def test_deleted_elsewhere(self):
+        # Deleted by another process: no signal, the registry still holds the id
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM stations_station WHERE id = %s", [self.station.id])
+        with self.assertRaises(Station.DoesNotExist):
+            Heartbeat.objects.create_from_POST('AGO', **heartbeat_report())
+        self.assertIsNone(station_registry.get_id('AGO'))
+
+    def test_recreated_elsewhere(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM stations_station WHERE id = %s", [self.station.id])
+        other, = Station.objects.bulk_create([Station(
+            code='AGO', name='Modra', subnetwork=self.subnetwork, country=self.country,
+            latitude=48.37, longitude=17.27, altitude=531, timezone='Europe/Bratislava', on=True,
+        )])
+        results = Heartbeat.objects.bulk_create_from_POST('AGO', [heartbeat_report()])
+        self.assertEqual(results[0][0].station_id, other.id)
+        self.assertEqual(Heartbeat.objects.get().station_id, other.id)
+
+    def test_signals(self):
+        self.station.code = 'MOD'
+        self.station.save()
+        self.assertIsNone(station_registry.codes)
+        self.assertEqual(station_registry.get_id('MOD'), self.station.id)
+        self.assertNotIn('AGO', station_registry.codes)
+
+        self.station.delete()
+        self.assertIsNone(station_registry.codes)
+        self.assertIsNone(station_registry.get_id('MOD'))
+
+
+class HeartbeatBatchTest(StationTestCase):
+    """ The batch endpoint stores every valid report and gives every item its own status """
+    def post(self, body, code='AGO'):
+        return self.client.post(reverse('station-receive-heartbeats', args=[code]), body, content_type='application/json')
+
+    def test_array(self):
+        response = self.post(json.dumps([heartbeat_report(second) for second in range(3)]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(Heartbeat.objects.filter(station=self.station).count(), 3)
+
+    def test_ndjson_bad_line(self):
+        lines = [json.dumps(heartbeat_report(0)), '{"auto": tru', '', json.dumps(heartbeat_report(1))]
+        response = self.post('\n'.join(lines))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item['status'] for item in response.json()['results']], [201, 400, 201])
+        self.assertEqual(Heartbeat.objects.count(), 2)
+
+    def test_bad_values(self):
+        reports = [
+            heartbeat_report(0),
+            heartbeat_report(1, time='garbage'),
+            heartbeat_report(2, st='X'),
+            heartbeat_report(3, disk={'prim': {'a': 2 ** 70, 't': 2}, 'perm': {'a': 3, 't': 4}}),
+            heartbeat_report(4),
+        ]
+        response = self.post(json.dumps(reports))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item['status'] for item in response.json()['results']], [201, 400, 400, 400, 201])
+        self.assertEqual(
+            sorted(Heartbeat.objects.values_list('timestamp__second', flat=True)), [0, 4],
+        )
+
+    def test_all_bad(self):
+        response = self.post(json.dumps([heartbeat_report(0, time='garbage')]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Heartbeat.objects.exists())
+
+    def test_unknown_station(self):
+        response = self.post(json.dumps([heartbeat_report(0)]), code='XXX')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Heartbeat.objects.exists())
+
+    def test_malformed(self):
+        self.assertEqual(self.post('[1, 2]').status_code, 400)
+
+    def test_empty(self):
+        for body in ['[]', '', '\n\n']:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(Heartbeat.objects.exists())
+
+
+class LastHeartbeatTest(TestCase):
+    """ The latest heartbeat per station must be found without scanning the history """
+    STATIONS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name='Slovakia')
+        subnetwork = Subnetwork.objects.create(code='SK', name='Slovakia', timezone='Europe/Bratislava')
+        for index in range(cls.STATIONS):
+            Station.objects.create(
+                code=f'S{index:02d}', name=f'Station {index}', subnetwork=subnetwork, country=country,
+                latitude=48, longitude=17, altitude=500, timezone='Europe/Bratislava', on=True,
+            )
+
+    def add_history(self, count):
+        """ Add <count> heartbeats per station, going back in time every 15 seconds """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO stations_heartbeat ("timestamp", received, station_id, sensors, sensors_valid, automatic)
+                SELECT NOW() - MAKE_INTERVAL(secs => 15 * g), NOW(), s.id, 0, 0, TRUE
+                FROM generate_series(1, %s) g CROSS JOIN stations_station s
+            """, [count])
+            cursor.execute("ANALYZE stations_heartbeat")
+
+    def test_plan(self):
+        self.add_history(5000)
+        plan = Heartbeat.objects.filter(id__in=Station.objects.latest_per_station(Heartbeat)).explain()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT tableoid::regclass::text FROM stations_heartbeat")
+            filled = [row[0] for row in cursor.fetchall()]
+
+        # Empty partitions may be scanned sequentially at no cost, those holding the history must not be
+        self.assertIn("Limit", plan)
+        self.assertRegex(plan, r"Index Cond: \(station_id = \w+\.id\)")
+        for partition in filled:
+            self.assertNotIn(f"Seq Scan on {partition} ", plan)
+            self.assertRegex(plan, rf"Index (Only )?Scan (Backward )?using \S+ on {partition} ")
+
+    def test_filtered(self):
+        self.add_history(10)
+        latest = Station.objects.filter(code__in=['S00', 'S01']).latest_per_station(Heartbeat)
+        self.assertEqual(
+            set(latest.values_list('latest', flat=True)),
+            {Heartbeat.objects.filter(station__code=code).latest().id for code in ['S00', 'S01']},
+        )
+
+    def test_query_count(self):
+        self.add_history(10)
+        with self.assertNumQueries(2):
+            stations = list(Station.objects.with_last_heartbeat())
+        for station in stations:
+            self.assertEqual(station.last_heartbeat[0], station.heartbeats.latest())
+
+
+class AsyncIngestTest(TransactionTestCase):
+    """ Heartbeats are received by async views that write through the database pool, concurrently """
+    def setUp(self):
+        country = Country.objects.create(name='Slovakia')
+        subnetwork = Subnetwork.objects.create(code='SK', name='Slovakia', timezone='Europe/Bratislava')
+        Station.objects.create(
+            code='AGO', name='Modra', subnetwork=subnetwork, country=country,
+            latitude=48.37, longitude=17.27, altitude=531, timezone='Europe/Bratislava', on=True,
+        )
+
+    def tearDown(self):
+        core.database.close_connections()
+
+    @staticmethod
+    def heartbeat(second):
+        return json.dumps(heartbeat_report(second))
+
+    async def post_all(self, client, code, count):
+        url = reverse('station-receive-heartbeat', args=[code])
+        return await asyncio.gather(*[
+            client.post(url, self.heartbeat(second), content_type='application/json') for second in range(count)
+        ])
+
+    def test_concurrent(self):
+        responses = asyncio.run(self.post_all(AsyncClient(), 'AGO', 20))
+        self.assertEqual([response.status_code for response in responses], [201] * 20)
+        self.assertEqual(Heartbeat.objects.count(), 20)
+
+    def test_unknown_station(self):
+        responses = asyncio.run(self.post_all(AsyncClient(), 'XXX', 1))
+        self.assertEqual(responses[0].status_code, 422)
+
+    def test_wsgi(self):
+        """ The async views also serve the synchronous WSGI site """
+        response = self.client.post(reverse('station-receive-heartbeat', args=['AGO']), self.heartbeat(0), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Heartbeat.objects.count(), 1)
@@ -1,7 +1,7 @@
 from django.urls import include, path
 from django.views.decorators.csrf import csrf_exempt
 
-from .views import station, subnetwork, heartbeat
+from .views import station, subnetwork, heartbeat, export
 
 urlpatterns = [
     path(
@@ -31,17 +31,26 @@ urlpatterns = [
         station.GraphViewJSON.as_view(),
         name='station-graph-json'
     ),
+    path(
+        'station/<slug:code>/graph-data',
+        station.GraphViewColumnar.as_view(),
+        name='station-graph-data'
+    ),
     path(
         'station/<slug:code>/json/',
         station.DetailViewJSON.as_view(),
         name='station-JSON'
     ),
     path('station/<slug:code>/heartbeat/',
-        station.APIViewHeartbeat.as_view(),
+        station.receive_heartbeat,
         name='station-receive-heartbeat',
     ),
+    path('station/<slug:code>/heartbeats/',
+        station.APIViewHeartbeatBatch.as_view(),
+        name='station-receive-heartbeats',
+    ),
     path('station/<slug:code>/sighting/',
-        station.APIViewSighting.as_view(),
+        station.receive_sighting,
         name='station-receive-sighting',
     ),
     path('stations/json/',
@@ -59,4 +68,9 @@ urlpatterns = [
         heartbeat.SingleView.as_view(),
         name='heartbeat'
     ),
+    path(
+        'export/<slug:dataset>.<slug:format>',
+        export.ExportView.as_view(),
+        name='export'
+    ),
 ]
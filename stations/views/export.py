@@ -0,0 +1,47 @@
+import django
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.http import StreamingHttpResponse, HttpResponseBadRequest, Http404
+from django.utils.decorators import method_decorator
+
+from core import export
+from core.utils import parse_time
+from stations.export import DATASETS, select_stations
+from stations.models import Station
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class ExportView(LoginRequiredMixin, django.views.View):
+    """
+    Stream a dataset as CSV or Parquet, e.g. /export/heartbeats.csv?station=AGO&start=2021-01-01&end=2021-07-01.
+    Rows are read with a server-side cursor and encoded chunk by chunk, so exports of any length use constant memory.
+    """
+    def get(self, request, dataset, format):
+        if dataset not in DATASETS:
+            raise Http404(f"Unknown dataset {dataset}")
+        if format not in export.available_formats():
+            raise Http404(f"Export format {format} is not available")
+
+        try:
+            start = parse_time(request.GET.get('start'))
+            end = parse_time(request.GET.get('end'))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        try:
+            stations = select_stations(request.GET.get('station'), request.GET.get('subnetwork'))
+        except Station.DoesNotExist as e:
+            raise Http404(str(e))
+
+        selection = request.GET.get('station') or request.GET.get('subnetwork') or 'all'
+        span = '-'.join(f"{time:%Y%m%dT%H%M%S}" for time in (start, end) if time is not None)
+        filename = '-'.join(filter(None, [dataset, selection, span])) + f'.{format}'
+
+        queryset = DATASETS[dataset].get_queryset(stations, start, end)
+        response = StreamingHttpResponse(
+            export.stream(queryset, DATASETS[dataset].columns, format),
+            content_type=export.CONTENT_TYPES[format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -7,16 +7,24 @@ import django
 import numpy as np
 import pandas as pd
 
+import core.database
 import core.views
 import core.http
+import core.columnar
+import core.loader
 
-from astropy.coordinates import get_sun, AltAz, EarthLocation
-from astropy.time import Time
+from core import astronomy
+
+from asgiref.sync import sync_to_async
 
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseBadRequest
+from django.db import transaction
+from django.db.models import Max
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 
 from matplotlib import pyplot
@@ -25,7 +33,10 @@ from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 from matplotlib.colors import LinearSegmentedColormap
 
-from stations.models import Station, Subnetwork, Heartbeat, LogEntry
+from stations import decoder
+from stations.rendercache import graph_cache
+from stations.models import Station, Subnetwork, Heartbeat, HeartbeatRollup, LogEntry
+from meteors import ufocapture
 from meteors.models import Sighting
 
 log = logging.getLogger(__name__)
@@ -70,25 +81,38 @@ class DataFrameView(core.views.LoginDetailView):
     slug_field = 'code'
     slug_url_kwarg = 'code'
     context_object_name = 'station'
+    heartbeat_fields = None     # all concrete fields
 
-    def get_object(self, **kwargs):
-        station = super().get_object(**kwargs)
+    def get_window(self):
+        now = datetime.datetime.now(tz=pytz.utc)
 
         try:
             self.start = datetime.datetime.strptime(self.request.GET.get('start', None), "%Y-%m-%dT%H:%M:%S").replace(tzinfo=pytz.utc)
         except (ValueError, TypeError):
-            self.start = datetime.datetime.now(tz=pytz.utc) - datetime.timedelta(days=1)
+            self.start = now - datetime.timedelta(days=1)
 
         try:
             self.end = datetime.datetime.strptime(self.request.GET.get('end', None), "%Y-%m-%dT%H:%M:%S").replace(tzinfo=pytz.utc)
         except (ValueError, TypeError):
-            self.end = datetime.datetime.now(tz=pytz.utc)
+            self.end = now
+
+        # A window is current if it can still receive new heartbeats
+        self.current = self.end >= now
+
+    def get_station(self):
+        return super().get_object()
 
+    def get_object(self, **kwargs):
+        station = self.get_station()
+        self.get_window()
+        return self.load_dataframes(station)
+
+    def load_dataframes(self, station):
         heartbeats = Heartbeat.objects.for_station(station.code).as_scatter(self.start, self.end)
-        station.df_heartbeat = pd.DataFrame(list(heartbeats.values()))
+        station.df_heartbeat = core.loader.load_dataframe(heartbeats, self.heartbeat_fields)
 
-        sightings = Sighting.objects.for_station(station.code).with_everything().as_scatter(self.start, self.end).values('timestamp', 'magnitude', 'avi_size')
-        station.df_sightings = pd.DataFrame(list(sightings.values()))
+        sightings = Sighting.objects.for_station(station.code).as_scatter(self.start, self.end)
+        station.df_sightings = core.loader.load_dataframe(sightings, ['timestamp', 'magnitude', 'avi_size'])
         return station
 
 
@@ -117,6 +141,12 @@ class ScatterView(DataFrameView):
         ],
     }, N=1024)
 
+    heartbeat_fields = [
+        'timestamp', 'state', 'cover_state', 'sensors', 'sensors_valid', 'automatic',
+        'temperature', 't_lens', 't_cpu', 'humidity',
+        'storage_primary_available', 'storage_permanent_available',
+    ]
+
     C_sighting = 'green'
 
     C_manual = '#F0E000'
@@ -276,49 +306,50 @@ class ScatterView(DataFrameView):
         start_floor = self.start.replace(second=0, microsecond=0)
         end_floor = self.end.replace(second=0, microsecond=0)
         full_xs = np.array([start_floor], dtype='datetime64[ns]') + np.arange(0, 1441) * 60 * 1000**3
-        frames = AltAz(obstime=full_xs, location=self.object.earth_location())
-        alts = get_sun(Time(full_xs)).transform_to(frames).alt
-
-
-        cov = self.object.df_heartbeat.cover_state.to_numpy()
-        cover = np.where(
-            cov == 'C', self.C_cover_closed, np.where(
-            cov == 'c', self.C_cover_closing, np.where(
-            cov == 'S', self.C_cover_safety, np.where(
-            cov == 'o', self.C_cover_opening, np.where(
-            cov == 'O', self.C_cover_open, self.C_none
-        )))))
-
-        sta = self.object.df_heartbeat.state.to_numpy()
-        state = np.where(
-            sta == Heartbeat.STATE_DAYLIGHT,            self.C_state_daylight, np.where(
-            sta == Heartbeat.STATE_OBSERVING,           self.C_state_observing, np.where(
-            sta == Heartbeat.STATE_NOT_OBSERVING,       self.C_state_not_observing, np.where(
-            sta == Heartbeat.STATE_MANUAL,              self.C_state_manual, np.where(
-            sta == Heartbeat.STATE_DOME_UNREACHABLE,    self.C_state_dome_unreachable, np.where(
-            sta == Heartbeat.STATE_RAIN_OR_HUMID,       self.C_state_rain_or_humid, self.C_state_unknown
-        ))))))
+        alts, _ = astronomy.sun_alt_az(full_xs, self.object.latitude, self.object.longitude, self.object.altitude or 0)
+
+
+        cover = decoder.colour_codes(self.object.df_heartbeat.cover_state.to_numpy(), {
+            Heartbeat.COVER_CLOSED:             self.C_cover_closed,
+            Heartbeat.COVER_CLOSING:            self.C_cover_closing,
+            Heartbeat.COVER_SAFETY:             self.C_cover_safety,
+            Heartbeat.COVER_OPENING:            self.C_cover_opening,
+            Heartbeat.COVER_OPEN:               self.C_cover_open,
+            Heartbeat.COVER_PROBLEM:            self.C_cover_problem,
+        }, self.C_none)
+
+        state = decoder.colour_codes(self.object.df_heartbeat.state.to_numpy(), {
+            Heartbeat.STATE_DAYLIGHT:           self.C_state_daylight,
+            Heartbeat.STATE_OBSERVING:          self.C_state_observing,
+            Heartbeat.STATE_NOT_OBSERVING:      self.C_state_not_observing,
+            Heartbeat.STATE_MANUAL:             self.C_state_manual,
+            Heartbeat.STATE_DOME_UNREACHABLE:   self.C_state_dome_unreachable,
+            Heartbeat.STATE_RAIN_OR_HUMID:      self.C_state_rain_or_humid,
+        }, self.C_state_unknown)
 
         self.ax_sensors.scatter(full_xs, np.ones(1441) * 14, s=self.S_sensor, c=alts, cmap=self.sunalt, marker='|', vmin=-90, vmax=90)
 
-        self.render_sensor(12.5, self.trivalue(self.object.df_heartbeat.automatic.to_numpy(), self.C_automatic, self.C_manual, self.C_none))
+        df = self.object.df_heartbeat
+        sensors = decoder.unpack_sensors(df.sensors.to_numpy(), df.sensors_valid.to_numpy())
+
+        self.render_sensor(12.5, self.trivalue(decoder.tristate(df.automatic.to_numpy()), self.C_automatic, self.C_manual, self.C_none))
         self.render_sensor(11.5, state)
         self.render_sensor(10.5, cover)
 
-        self.render_sensor( 9.0, self.trivalue(self.object.df_heartbeat.light_sensor_active.to_numpy(), self.C_light_active, self.C_light_not_active, self.C_none))
-        self.render_sensor( 8.0, self.trivalue(self.object.df_heartbeat.rain_sensor_active.to_numpy(), self.C_raining, self.C_not_raining, self.C_none))
-        self.render_sensor( 7.0, self.trivalue(self.object.df_heartbeat.rain_emergency_closing.to_numpy(), self.C_error_bit, self.C_no_error_bit, self.C_none))
+        self.render_sensor( 9.0, self.trivalue(sensors['light_sensor_active'], self.C_light_active, self.C_light_not_active, self.C_none))
+        self.render_sensor( 8.0, self.trivalue(sensors['rain_sensor_active'], self.C_raining, self.C_not_raining, self.C_none))
+        self.render_sensor( 7.0, self.trivalue(sensors['rain_emergency_closing'], self.C_error_bit, self.C_no_error_bit, self.C_none))
 
-        self.render_sensor( 5.5, self.trivalue(self.object.df_heartbeat.computer_power.to_numpy(), self.C_device_on, self.C_device_off, self.C_none))
-        self.render_sensor( 4.5, self.trivalue(self.object.df_heartbeat.intensifier_active.to_numpy(), self.C_device_on, self.C_device_off, self.C_none))
-        self.render_sensor( 3.5, self.trivalue(self.object.df_heartbeat.fan_active.to_numpy(), self.C_device_on, self.C_device_off, self.C_none))
+        self.render_sensor( 5.5, self.trivalue(sensors['computer_power'], self.C_device_on, self.C_device_off, self.C_none))
+        self.render_sensor( 4.5, self.trivalue(sensors['intensifier_active'], self.C_device_on, self.C_device_off, self.C_none))
+        self.render_sensor( 3.5, self.trivalue(sensors['fan_active'], self.C_device_on, self.C_device_off, self.C_none))
 
-        self.render_sensor( 2.0, self.trivalue(self.object.df_heartbeat.camera_heating.to_numpy(), self.C_heating_on, self.C_heating_off, self.C_none))
-        self.render_sensor( 1.0, self.trivalue(self.object.df_heartbeat.lens_heating.to_numpy(), self.C_heating_on, self.C_heating_off, self.C_none))
+        self.render_sensor( 2.0, self.trivalue(sensors['camera_heating'], self.C_heating_on, self.C_heating_off, self.C_none))
+        self.render_sensor( 1.0, self.trivalue(sensors['lens_heating'], self.C_heating_on, self.C_heating_off, self.C_none))
 
     @staticmethod
-    def trivalue(values, colour_on, colour_off, colour_none):
-        return np.where(values == None, colour_none, np.where(values, colour_on, colour_off))
+    def trivalue(codes, colour_on, colour_off, colour_none):
+        return decoder.colour_tristate(codes, colour_on, colour_off, colour_none)
 
     def render_sensor(self, ypos, colour, *args):
         self.ax_sensors.scatter(self.xs, self.ones * ypos, s=self.S_sensor, c=colour, marker='|', *args)
@@ -346,7 +377,57 @@ class ScatterView(DataFrameView):
             np.amax(self.object.df_heartbeat.storage_permanent_available)
         ) * 1.05 / 1024**3)
 
+    def get_watermark(self):
+        """ Identification of the latest data in the window: the graph only changes when the watermark does """
+        heartbeats = Heartbeat.objects.for_station(self.object.code).as_scatter(self.start, self.end).order_by().aggregate(
+            last_id=Max('id'),
+            last_received=Max('received'),
+        )
+        sightings = Sighting.objects.for_station(self.object.code).as_scatter(self.start, self.end).order_by().aggregate(
+            last_id=Max('id'),
+        )
+        return heartbeats['last_id'], heartbeats['last_received'], sightings['last_id']
+
+    def get_render_key(self, heartbeat_id, sighting_id):
+        if self.current:
+            # The current window slides with time, but is only re-rendered when new data arrive
+            duration = round((self.end - self.start).total_seconds())
+            window = f"current:{duration}"
+        else:
+            window = f"{self.start:%Y%m%dT%H%M%S}:{self.end:%Y%m%dT%H%M%S}"
+        return f"scatter:{self.object.code}:{window}:{heartbeat_id}:{sighting_id}"
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_station()
+        self.get_window()
+
+        heartbeat_id, last_received, sighting_id = self.get_watermark()
+        key = self.get_render_key(heartbeat_id, sighting_id)
+        etag = f'"{graph_cache.digest(key)}"'
+        last_modified = None if last_received is None else last_received.timestamp()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            content = graph_cache.get(key, permanent=not self.current)
+            if content is None:
+                self.load_dataframes(self.object)
+                content = core.http.figure_to_png(self.render_figure())
+                graph_cache.set(key, content, permanent=not self.current)
+            response = core.http.PNGResponse(content)
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        if self.current:
+            patch_cache_control(response, private=True, no_cache=True, max_age=0)
+        else:
+            patch_cache_control(response, private=True, max_age=86400)
+        return response
+
     def render_to_response(self, context, **response_kwargs):
+        return core.http.FigurePNGResponse(self.render_figure())
+
+    def render_figure(self):
         self.fig, self.axes = pyplot.subplots(5, 1, gridspec_kw={'height_ratios': [2, 4, 2, 2, 2]})
         (self.ax_sightings, self.ax_sensors, self.ax_temp, self.ax_humi, self.ax_storage) = self.axes
 
@@ -381,12 +462,67 @@ class ScatterView(DataFrameView):
             self.ax_temp.set_ylim(0, 20)
             self.ax_storage.set_ylim(0, 256)
 
-        return core.http.FigurePNGResponse(self.fig)
+        return self.fig
 
 
 class GraphViewJSON(core.views.JsonResponseMixin, DataFrameView):
     def get_context_data(self, **kwargs):
-        return self.object.df_heartbeat.to_dict(orient='index')
+        df = self.object.df_heartbeat
+        return df.astype(object).where(df.notna(), None).to_dict(orient='index')
+
+
+class GraphViewColumnar(DataFrameView):
+    """
+    Heartbeats and sightings in the window as compact parallel columns for client-side rendering
+    (static/js/graph.js), as JSON or, with ?format=binary, as raw little-endian arrays (see core.columnar).
+    """
+    HEARTBEAT_FIELDS = [
+        'timestamp', 'temperature', 't_lens', 't_cpu', 'humidity',
+        'storage_primary_available', 'storage_permanent_available',
+        'state', 'cover_state', 'sensors', 'sensors_valid', 'automatic',
+    ]
+
+    def get_heartbeats(self):
+        heartbeats = Heartbeat.objects.for_station(self.object.code).as_scatter(self.start, self.end)
+        hb = core.loader.load_arrays(heartbeats, self.HEARTBEAT_FIELDS)
+
+        return core.columnar.Table('heartbeats', base=self.start) \
+            .add('time', hb['timestamp'], 'time') \
+            .add('t_env', hb['temperature'], 'float32') \
+            .add('t_lens', hb['t_lens'], 'float32') \
+            .add('t_cpu', hb['t_cpu'], 'float32') \
+            .add('h_env', hb['humidity'], 'float32') \
+            .add('storage_primary', hb['storage_primary_available'].astype(float) / 1024**3, 'float32', unit='GiB') \
+            .add('storage_permanent', hb['storage_permanent_available'].astype(float) / 1024**3, 'float32', unit='GiB') \
+            .add('state', decoder.char_codes(hb['state']), 'uint8', encoding='char') \
+            .add('cover', decoder.char_codes(hb['cover_state']), 'uint8', encoding='char') \
+            .add('sensors', hb['sensors'], 'uint8', bits=decoder.SENSOR_BITS) \
+            .add('sensors_valid', hb['sensors_valid'], 'uint8', bits=decoder.SENSOR_BITS) \
+            .add('automatic', hb['automatic'], 'bool')
+
+    def get_sightings(self):
+        sightings = Sighting.objects.for_station(self.object.code).as_scatter(self.start, self.end)
+        sg = core.loader.load_arrays(sightings, ['timestamp', 'avi_size'])
+
+        return core.columnar.Table('sightings', base=self.start) \
+            .add('time', sg['timestamp'], 'time') \
+            .add('avi_size', sg['avi_size'].astype(float) / 2**20, 'float32', unit='MiB')
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_station()
+        self.get_window()
+
+        tables = [self.get_heartbeats(), self.get_sightings()]
+        meta = {
+            'station': self.object.code,
+            'start': core.columnar.to_milliseconds(self.start).item(),
+            'end': core.columnar.to_milliseconds(self.end).item(),
+        }
+
+        if request.GET.get('format') == 'binary':
+            return HttpResponse(core.columnar.encode_binary(tables, **meta), content_type='application/octet-stream')
+        else:
+            return HttpResponse(core.columnar.encode_json(tables, **meta), content_type='application/json')
 
 
 class DataFrameAggView(core.views.LoginDetailView):
@@ -396,7 +532,11 @@ class DataFrameAggView(core.views.LoginDetailView):
     context_object_name = 'station'
 
     def get_q(self):
-        return Heartbeat.objects.for_station(self.station.code).as_graph(self.start, self.end, self.interval)
+        rollups = HeartbeatRollup.objects.for_station(self.station.code).as_graph(self.start, self.end, self.interval)
+        if rollups is None:
+            return Heartbeat.objects.for_station(self.station.code).as_graph(self.start, self.end, self.interval)
+        else:
+            return rollups
 
     def get_object(self, **kwargs):
         self.station = super().get_object(**kwargs)
@@ -412,71 +552,146 @@ class DataFrameAggView(core.views.LoginDetailView):
         data = self.get_q()
 
         timestamps = pd.DataFrame(data=timestamps, columns=['time'], dtype='datetime64[ns, UTC]')
-        if data:
-            data = pd.DataFrame.from_records(data, index='time')
-        else:
-            data = pd.DataFrame(columns=['time', 't_env', 't_CPU', 't_len', 'h_env'])
-            data.set_index('time', inplace=True)
+        data = core.loader.load_dataframe(data, ['time', 't_env', 't_CPU', 't_len', 'h_env', 'cover'], index='time')
 
         self.station.df_heartbeat = timestamps.merge(data, how="left", on="time")
         self.station.df_heartbeat.set_index('time', inplace=True)
         return self.station
 
 
-@method_decorator(csrf_exempt, name='dispatch')
-class APIViewHeartbeat(django.views.View):
-    def get(self, request):
-        return django.http.JsonResponse({'ok': 'OK'})
+def async_ingest(view):
+    """
+    Mark an async ingest view: stations do not send CSRF tokens, and the view runs its own short transactions
+    in the database pool instead of being wrapped in one for the whole request, which ATOMIC_REQUESTS cannot do for async views
+    """
+    view.csrf_exempt = True
+    return transaction.non_atomic_requests(view)
 
-    def post(self, request, code):
-        log.info(f"Incoming heartbeat for station {code}")
-#        pp(request.headers)
-#        pp(request.body)
 
-        try:
-            data = json.loads(request.body)
+@async_ingest
+async def receive_heartbeat(request, code):
+    if request.method == 'GET':
+        return django.http.JsonResponse({'ok': 'OK'})
+    if request.method != 'POST':
+        return django.http.HttpResponseNotAllowed(['GET', 'POST'])
 
-            report = Heartbeat.objects.create_from_POST(code, **data)
-            report.save()
+    log.info(f"Incoming heartbeat for station {code}")
 
-            response = HttpResponse(f"Heartbeat received at {datetime.datetime.utcnow()}", status=201)
-            response['location'] = reverse('station-receive-heartbeat', args=[report.id])
-            return response
+    try:
+        data = json.loads(request.body)
+        report = await core.database.run_in_pool(transaction.atomic()(Heartbeat.objects.create_from_POST), code, **data)
 
-        except json.JSONDecodeError:
-            print("JSON decoding error")
-            return HttpResponseBadRequest()
-        except Station.DoesNotExist as e:
-            return HttpResponse(e, status=http.HTTPStatus.UNPROCESSABLE_ENTITY)
-#        except Exception as e:
-#            print(e)
-#            return HttpResponseBadRequest()
+        response = HttpResponse(f"Heartbeat received at {datetime.datetime.utcnow()}", status=201)
+        response['location'] = reverse('station-receive-heartbeat', args=[report.id])
+        return response
+
+    except json.JSONDecodeError:
+        log.warning(f"JSON decoding error in a heartbeat from station {code}")
+        return HttpResponseBadRequest()
+    except Station.DoesNotExist as e:
+        return HttpResponse(e, status=http.HTTPStatus.UNPROCESSABLE_ENTITY)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class APIViewSighting(django.views.View):
-    def post(self, request, code):
-        log.info(f"Incoming new sighting from station {code}")
+class APIViewHeartbeatBatch(django.views.View):
+    """
+    Accepts many heartbeats at once, either as a JSON array or as newline-delimited JSON.
+    Stations that were offline send their buffered reports through this endpoint.
+    """
+    @staticmethod
+    def decode(body):
+        text = body.decode('utf-8').strip()
+        if text.startswith('['):
+            items = json.loads(text)
+            if not all(isinstance(item, dict) for item in items):
+                raise json.JSONDecodeError("Every item of the array must be an object", text, 0)
+            return items
+
+        items = []
+        for line in text.splitlines():
+            if line.strip() == '':
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+        return items
 
+    def post(self, request, code):
         try:
-#            pp(request.content_type)
-#            pp(request.POST)
-#            pp(request.FILES)
+            items = self.decode(request.body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            log.warning(f"JSON decoding error in a heartbeat batch from station {code}")
+            return HttpResponseBadRequest()
 
-            data = {
-                'meta': json.loads(request.POST['meta']),
-                'files': request.FILES,
-            }
+        if not items:
+            log.warning(f"Empty heartbeat batch from station {code}")
+            return HttpResponseBadRequest("The batch contains no heartbeats")
 
-            sighting = Sighting.objects.create_from_POST(code, **data)
+        log.info(f"Incoming batch of {len(items)} heartbeats for station {code}")
 
-            response = HttpResponse(f"New sighting received (id {sighting.id})", status=201)
-            response['location'] = reverse('sighting', args=[sighting.id])
-            return response
+        try:
+            results = Heartbeat.objects.bulk_create_from_POST(code, items)
+        except Station.DoesNotExist as e:
+            return HttpResponse(e, status=http.HTTPStatus.UNPROCESSABLE_ENTITY)
+
+        statuses = []
+        for index, (heartbeat, error) in enumerate(results):
+            if error is None:
+                statuses.append({
+                    'index': index,
+                    'status': http.HTTPStatus.CREATED,
+                    'id': heartbeat.id,
+                })
+            else:
+                statuses.append({
+                    'index': index,
+                    'status': http.HTTPStatus.BAD_REQUEST,
+                    'error': f"{error.__class__.__name__}: {error}",
+                })
+
+        created = sum(1 for heartbeat, error in results if error is None)
+        if created == len(results):
+            status = http.HTTPStatus.CREATED
+        elif created == 0:
+            status = http.HTTPStatus.BAD_REQUEST
+        else:
+            status = http.HTTPStatus.MULTI_STATUS
+
+        return django.http.JsonResponse({
+            'received': len(results),
+            'created': created,
+            'results': statuses,
+        }, status=status)
 
-        except json.JSONDecodeError:
-            log.warning("JSON decoding error in the sighting")
-            return HttpResponseBadRequest()
 
-    def get(self, request, code):
+@async_ingest
+async def receive_sighting(request, code):
+    if request.method == 'GET':
         return HttpResponse('Nothing to see here', status=201)
+    if request.method != 'POST':
+        return django.http.HttpResponseNotAllowed(['GET', 'POST'])
+
+    log.info(f"Incoming new sighting from station {code}")
+
+    try:
+        # The ASGI handler has already received the body into a temporary file without blocking,
+        # parsing the multipart upload (large files are written to disk) is left to a thread
+        post, files = await sync_to_async(lambda: (request.POST, request.FILES), thread_sensitive=False)()
+        data = {
+            'meta': json.loads(post['meta']),
+            'files': files,
+        }
+
+        sighting = await core.database.run_in_pool(Sighting.objects.create_from_POST, code, **data)
+
+        response = HttpResponse(f"New sighting received (id {sighting.id})", status=201)
+        response['location'] = reverse('sighting', args=[sighting.id])
+        return response
+
+    except json.JSONDecodeError:
+        log.warning("JSON decoding error in the sighting")
+        return HttpResponseBadRequest()
+    except ufocapture.RecordError as e:
+        log.warning(f"Invalid XML record in the sighting: {e}")
+        return HttpResponseBadRequest(f"Invalid XML record: {e}")